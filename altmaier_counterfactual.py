@@ -0,0 +1,184 @@
+#!/usr/bin/python
+
+#
+# How much methane, and money, the Altmaier knick cost, for many
+# counterfactuals in one run. A counterfactual is a knick year each for
+# solar, onshore and offshore wind, and how the additions of the knick year
+# would have continued, one of altmaier_missing_capacity.growth_models.
+# Every knick year takes a single value, a comma separated list or a
+# start:stop:step range, as for simulate_sweep.py:
+#
+#   ./altmaier_counterfactual.py smard_generation.csv cegh_at_methane_day-ahead.csv \
+#       altmaier_counterfactual.csv --solar=2010:2014:1 --onshore=2015:2019:1
+#
+# The missing capacity fractions come straight from
+# altmaier_missing_capacity.capacity_missing(), rounded as in its csv, and
+# the methane offset from the functions of altmaier_methane_wasted.py, for a
+# block of counterfactuals at a time. Early knick years with growing
+# additions miss several times the installed capacity, so their offset
+# saturates, at the share of methane that renewables could offset at all.
+#
+# By default, the knick years are the ones of altmaier_missing_capacity.py,
+# 2012 for solar and 2017 for wind, with all growth models.
+#
+
+import sys
+import csv
+import time
+
+import numpy
+
+import altmaier_missing_capacity
+import altmaier_methane_wasted
+import simulate_sweep
+import run_metrics
+
+parameter_fieldnames = ['Solar knick',
+                        'Onshore knick',
+                        'Offshore knick',
+                        'Growth',
+]
+
+result_fieldnames = ['Methane offset [TWh]',
+                     'Methane used [TWh]',
+                     'Methane offset [%]',
+                     'Cost saved [B EUR]',
+                     'Cost [B EUR]',
+                     'Cost saved [%]',
+]
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    knick_texts = {'solar': "2012", 'onshore': "2017", 'offshore': "2017"}
+    models = altmaier_missing_capacity.growth_models
+
+    arguments = []
+    for argument in sys.argv:
+        if (argument.startswith("--solar=")):
+            knick_texts['solar'] = argument[len("--solar="):]
+        elif (argument.startswith("--onshore=")):
+            knick_texts['onshore'] = argument[len("--onshore="):]
+        elif (argument.startswith("--offshore=")):
+            knick_texts['offshore'] = argument[len("--offshore="):]
+        elif (argument.startswith("--growth=")):
+            models = argument[len("--growth="):].split(",")
+        else:
+            arguments.append(argument)
+
+    if (len(arguments) != 4):
+        print("Error: Wrong number of arguments.")
+        print("%s <generation csv> <day ahead methane pricing csv> <result csv> [--solar=<years>] "
+              "[--onshore=<years>] [--offshore=<years>] [--growth=<model>[,<model>...]]" % (arguments[0]))
+        sys.exit()
+
+    generation_filename = arguments[1]
+    price_filename = arguments[2]
+    result_filename = arguments[3]
+
+    for model in models:
+        if (model not in altmaier_missing_capacity.growth_models):
+            print("Error: Unknown growth model %s, use one of %s." %
+                  (model, ",".join(altmaier_missing_capacity.growth_models)))
+            sys.exit()
+
+    knicks = {}
+    for capacity, text in knick_texts.items():
+        knicks[capacity] = [int(year) for year in simulate_sweep.parameter_range(text)]
+        for year in knicks[capacity]:
+            if (year not in altmaier_missing_capacity.data_years):
+                print("Error: No %s capacity data for the knick year %d." % (capacity, year))
+                sys.exit()
+
+    grid = numpy.array(numpy.meshgrid(knicks['solar'], knicks['onshore'], knicks['offshore'],
+                                      [altmaier_missing_capacity.growth_models.index(model)
+                                       for model in models],
+                                      indexing='ij')).reshape(4, -1).T
+
+    run_metrics.stage("parse")
+    year_start = altmaier_methane_wasted.year_start
+
+    generation = altmaier_methane_wasted.generation_read(generation_filename, year_start)
+    if (generation == None):
+        print("Failed to find %d in %s.\n" % (year_start, generation_filename))
+        sys.exit()
+    run_metrics.rows_add(len(generation['Hour']))
+
+    price_days, price_values = altmaier_methane_wasted.prices_read(price_filename)
+
+    day_firsts, days, day_of_hour, complete, years = altmaier_methane_wasted.generation_days(generation['Hour'])
+    price_daily, priced, price_carried = altmaier_methane_wasted.prices_daily(price_days, price_values, days)
+
+    # the years with both generation and missing capacity data.
+    year_end = min(years[-1], altmaier_missing_capacity.data_years[-1])
+    selected = (years >= year_start) & (years <= year_end) & complete & priced
+
+    print("If the additions of renewables had carried on after the knick years, how much")
+    print("methane would we have been able to offset between %d and %d, and how much" % (year_start, year_end + 1))
+    print("would this methane have cost in day ahead pricing?")
+    print("")
+    print("%d counterfactuals, over %d days, %d of them without a price." %
+          (len(grid), numpy.count_nonzero(selected), numpy.count_nonzero(price_carried & selected)))
+    print("Writing results to %s" % result_filename)
+    print("")
+
+    time_start = time.time()
+
+    run_metrics.stage("dispatch")
+    fraction_year = altmaier_missing_capacity.data_years[0]
+    fractions = []
+    for capacity, column in [('solar', 0), ('onshore', 1), ('offshore', 2)]:
+        installed = getattr(altmaier_missing_capacity, 'data_' + capacity)
+        missing = altmaier_missing_capacity.capacity_missing(installed, grid[:, column], grid[:, 3])
+        # rounded as in altmaier_missing_capacity.csv, so that the default
+        # counterfactual matches altmaier_methane_wasted.py to the last digit.
+        fractions.append(numpy.round(altmaier_missing_capacity.fraction_missing(installed, missing), 5))
+
+    offset = numpy.zeros(len(grid))
+    cost_offset = numpy.zeros(len(grid))
+
+    # blocks of counterfactuals keep the hourly arrays at a few ten MB.
+    block = max(1, (1 << 22) // len(generation['Hour']))
+    for first in range(0, len(grid), block):
+        factors = altmaier_methane_wasted.factors_daily(fraction_year,
+                                                        [fraction[first:first + block] for fraction in fractions],
+                                                        days, years)
+        methane_offset_daily, methane_used_daily = altmaier_methane_wasted.methane_daily(generation, day_firsts,
+                                                                                         day_of_hour, factors)
+        offset[first:first + block] = methane_offset_daily[:, selected].sum(axis=1)
+        cost_offset[first:first + block] = (methane_offset_daily[:, selected] * price_daily[selected]).sum(axis=1)
+        run_metrics.rows_add(len(factors[0]) * len(generation['Hour']))
+
+    used = methane_used_daily[selected].sum()
+    cost_used = (methane_used_daily[selected] * price_daily[selected]).sum()
+
+    run_metrics.stage("report")
+    result_file = open(result_filename, mode='w')
+    result_writer = csv.DictWriter(result_file, fieldnames=parameter_fieldnames + result_fieldnames,
+                                   lineterminator='\n')
+    result_writer.writeheader()
+
+    print("Solar  Onshore  Offshore  Growth        Offset of %7.3fTWh    Saved of %5.2fB EUR" %
+          (used / 1000000, cost_used / 1000000000.0))
+    for i, (solar, onshore, offshore, model) in enumerate(grid.tolist()):
+        result_writer.writerow({'Solar knick': solar,
+                                'Onshore knick': onshore,
+                                'Offshore knick': offshore,
+                                'Growth': altmaier_missing_capacity.growth_models[model],
+                                'Methane offset [TWh]': round(offset[i] / 1000000, 3),
+                                'Methane used [TWh]': round(used / 1000000, 3),
+                                'Methane offset [%]': round(100 * offset[i] / used, 2),
+                                'Cost saved [B EUR]': round(cost_offset[i] / 1000000000.0, 3),
+                                'Cost [B EUR]': round(cost_used / 1000000000.0, 3),
+                                'Cost saved [%]': round(100 * cost_offset[i] / cost_used, 2)})
+
+        print("%5d  %7d  %8d  %-12s %7.3fTWh (%5.2f%%)  %5.2fB EUR (%5.2f%%)" %
+              (solar, onshore, offshore, altmaier_missing_capacity.growth_models[model],
+               offset[i] / 1000000, 100 * offset[i] / used,
+               cost_offset[i] / 1000000000.0, 100 * cost_offset[i] / cost_used))
+
+    result_file.close()
+
+    duration = time.time() - time_start
+    print("")
+    print("Ran %d counterfactuals in %.2fs (%.2f counterfactuals/s)." % (len(grid), duration, len(grid) / duration))
@@ -17,206 +17,249 @@
 # merit-order system the cost of electricity is the cost of all electricity
 # and import/export of electricity over the year is more or less in balance.
 #
+# The generation is read as hourly arrays, and the prices and the missing
+# capacity are looked up by date and year, so the three files do not have
+# to be kept in step row by row. Days without a price use the price of the
+# day before.
+#
+# The missing capacity of many counterfactuals can be run at once, with a
+# row of fractions each, see altmaier_counterfactual.py.
+#
 import sys
 import csv
 
-if (len(sys.argv) != 4):
-    print("Error: Wrong number of arguments.")
-    print("%s <generation csv> <day ahead methane pricing csv> "
-          "<capacity missing csv>" % (sys.argv[0]))
-    sys.exit()
+import numpy
 
-generation_filename = sys.argv[1]
-price_filename = sys.argv[2]
-missing_filename = sys.argv[3]
+import simulation_data
+import run_metrics
 
 year_start = 2017
 
-# open generation, and find the first entry of our requested year
-generation_file = open(generation_filename, mode='r')
-generation_reader = csv.DictReader(generation_file)
-generation_entry = None
+#
+# Year of each of an array of days since the unix epoch.
+#
+def day_years(days):
+    return days.astype('datetime64[D]').astype('datetime64[Y]').astype(numpy.int64) + 1970
 
-while True:
-    generation_entry = next(generation_reader, None)
-    if (generation_entry == None):
-        print("Failed to find %d in %s.\n" % (year_start, generation_filename))
-        sys.exit()
+#
+# The hourly methane, solar, onshore and offshore generation from the start
+# of year_start, up to the first hour without methane generation, as a dict
+# of numpy arrays with 'Hour' holding epoch hours. None if the file has no
+# data for year_start.
+#
+def generation_read(filename, year_start):
+    hour_start = simulation_data.epoch_hour("%d-01-01" % year_start, "00:00")
+    fieldnames = ['Fossil gas [MWh]', 'Photovoltaics [MWh]', 'Wind onshore [MWh]', 'Wind offshore [MWh]']
+    data = simulation_data.hourly_csv_read(filename, 'Start', fieldnames, hour_from=hour_start)
+
+    requested = data['Hour'] >= hour_start
+    generation = {'Hour': data['Hour'][requested]}
+    for name in fieldnames:
+        generation[name] = data[name][requested]
+
+    # could be bad data or end of data
+    missing = numpy.flatnonzero(numpy.isnan(generation['Fossil gas [MWh]']))
+    length = missing[0] if (len(missing) > 0) else len(generation['Hour'])
+    for name in generation:
+        generation[name] = numpy.nan_to_num(generation[name][:length])
+
+    if ((length == 0) or (day_years(generation['Hour'][0:1] // 24)[0] != year_start)):
+        return None
+    return generation
 
-    if (int(generation_entry['Date'][0:4]) == year_start):
-        break
+#
+# Days since the unix epoch and the prices of the day ahead pricing csv,
+# sorted by day.
+#
+def prices_read(filename):
+    with open(filename, mode='r') as price_file:
+        prices = numpy.loadtxt(price_file, delimiter=',', skiprows=1, ndmin=1,
+                               dtype=[('Date', 'datetime64[D]'), ('Price', numpy.float64)])
+    prices = prices[numpy.argsort(prices['Date'], kind='stable')]
+    return prices['Date'].astype(numpy.int64), prices['Price']
 
-# open methane day ahead pricing, and find the first entry of our requested year
-price_file = open(price_filename, mode='r')
-price_reader = csv.DictReader(price_file)
-price_entry = None
+#
+# The days of the hours: the row each day starts at, the days since the
+# unix epoch, the day of each hour, whether the day is complete and the
+# year of the day. A day is only complete once it has its 23:00 hour.
+#
+def generation_days(hours):
+    hour_days = hours // 24
+    day_firsts = numpy.flatnonzero(numpy.diff(hour_days, prepend=-1))
+    days = hour_days[day_firsts]
+    day_of_hour = numpy.searchsorted(days, hour_days)
+    complete = numpy.zeros(len(days), dtype=bool)
+    complete[day_of_hour[(hours % 24) == 23]] = True
+    return day_firsts, days, day_of_hour, complete, day_years(days)
 
-while True:
-    price_entry = next(price_reader, None)
-    if (price_entry == None):
-        print("Failed to find %d in %s.\n" % (year_start - 1, price_filename))
-        sys.exit()
+#
+# The price of each of the days, or of the last day before it that has one,
+# no more than price_carry_days before, whether there is such a price, and
+# whether it is one of a day before. Days further from a price, as past the
+# end of the pricing data, are left without one.
+#
+price_carry_days = 4
 
-    if (int(price_entry['Date'][0:4]) == year_start):
-        break
+def prices_daily(price_days, price_values, days):
+    price_index = numpy.maximum(numpy.searchsorted(price_days, days, side='right') - 1, 0)
+    carried = days - price_days[price_index]
+    priced = (carried >= 0) & (carried <= price_carry_days)
+    return price_values[price_index], priced, priced & (carried > 0)
 
-# open capacity missing csv, and find the entry of the previous year
-missing_file = open(missing_filename, mode='r')
-missing_reader = csv.DictReader(missing_file)
-missing_entry = None
+#
+# The solar, onshore and offshore factors of each of the days, from the
+# missing fractions of consecutive years from fraction_year on, arrays with
+# a row per counterfactual. The missing capacity ramps up linearly over a
+# year, from the fraction of the year before on its first day towards its
+# own fraction, one adjustment per day. Days of years without a fraction
+# for the year before get 0.
+#
+def factors_daily(fraction_year, fractions, days, years):
+    index = years - fraction_year
+    valid = (index >= 1) & (index < fractions[0].shape[1])
+    index = numpy.where(valid, index, 1)
+
+    year_length = numpy.where((years % 4) == 0, 366.0, 365.0)
+    day_of_year = days - (years - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(numpy.int64)
+
+    factors = []
+    for fraction in fractions:
+        fraction_next = fraction[:, index]
+        fraction = fraction[:, index - 1]
+        factors.append(numpy.where(valid, fraction + (fraction_next - fraction) / year_length * day_of_year,
+                                   0.0))
+    return factors
 
-while True:
-    missing_entry = next(missing_reader, None)
-    if (missing_entry == None):
-        print("Failed to find %d in %s.\n" % (year_start - 1, missing_filename))
+#
+# Methane that could have been offset each day, with a row per
+# counterfactual of the factors, and the methane used each day, in MWh.
+# Methane plants are assumed to be 50% efficient, so the methane is twice
+# the electricity.
+#
+def methane_daily(generation, day_firsts, day_of_hour, factors):
+    solar_factor, onshore_factor, offshore_factor = factors
+    methane = generation['Fossil gas [MWh]']
+
+    total = (generation['Photovoltaics [MWh]'] * solar_factor[:, day_of_hour] +
+             generation['Wind onshore [MWh]'] * onshore_factor[:, day_of_hour] +
+             generation['Wind offshore [MWh]'] * offshore_factor[:, day_of_hour])
+    offset = numpy.add.reduceat(2 * numpy.minimum(total, methane), day_firsts, axis=1)
+    used = numpy.add.reduceat(2 * methane, day_firsts)
+    return offset, used
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    if (len(sys.argv) != 4):
+        print("Error: Wrong number of arguments.")
+        print("%s <generation csv> <day ahead methane pricing csv> "
+              "<capacity missing csv>" % (sys.argv[0]))
         sys.exit()
 
-    if (int(missing_entry['Year'][0:4]) == (year_start - 1)):
-        break
-
-print("If the artificial neutering of renewables by the SPD and CDU/CSU had not")
-print("happened in 2012 (aka. Altmaier Knick), how much methane would we have been")
-print("able to offset, and how much would this methane have cost in day ahead pricing?")
-
-print("")
+    generation_filename = sys.argv[1]
+    price_filename = sys.argv[2]
+    missing_filename = sys.argv[3]
 
-methane_used_total = 0.0
-methane_offset_total = 0.0
-methane_used_cost_total = 0.0
-methane_offset_cost_total = 0.0
+    run_metrics.stage("parse")
 
-def methane_missing_yearly(year, solar_factor, solar_factor_adjustment,
-                           onshore_factor, onshore_factor_adjustment,
-                           offshore_factor, offshore_factor_adjustment):
-    global generation_entry
-    global price_entry
-    global methane_used_total
-    global methane_offset_total
-    global methane_used_cost_total
-    global methane_offset_cost_total
-
-    methane_used_yearly = 0.0
-    methane_offset_yearly = 0.0
-    methane_used_cost_yearly = 0.0
-    methane_offset_cost_yearly = 0.0
-
-    print("Calculating for %s:" % year)
-
-    while True:
-        day = generation_entry['Date']
-
-        methane_offset_day = 0.0
-        methane_used_day = 0.0
-
-        while True:
-            methane = float(generation_entry['Fossil gas [MWh]'])
-            solar = float(generation_entry['Photovoltaics [MWh]'])
-            onshore = float(generation_entry['Wind onshore [MWh]'])
-            offshore = float(generation_entry['Wind offshore [MWh]'])
-
-            #print("%s %s: %8.2fMWh + %8.2fMWh + %8.2fMWh vs %8.2fMWh" %
-            #      (day, generation_entry['Start'], solar, onshore, offshore, methane))
-
-            solar *= solar_factor
-            onshore *= onshore_factor
-            offshore *= offshore_factor
-
-            total = solar + onshore + offshore
-
-            if (total >= methane):
-                offset = methane
-            else:
-                offset = total
-
-            #print("\t%8.2fMWh + %8.2fMWh + %8.2fMWh = %8.2fMWh: %8.2fMWh offset" %
-            #      (solar, onshore, offshore, total, offset))
+    generation = generation_read(generation_filename, year_start)
+    if (generation == None):
+        print("Failed to find %d in %s.\n" % (year_start, generation_filename))
+        sys.exit()
+    run_metrics.rows_add(len(generation['Hour']))
 
-            methane_offset_day += 2 * offset
-            methane_used_day += 2 * methane
+    price_days, price_values = prices_read(price_filename)
+    if ((len(price_days) == 0) or (day_years(price_days[-1:])[0] < year_start)):
+        print("Failed to find %d in %s.\n" % (year_start, price_filename))
+        sys.exit()
 
-            if (generation_entry['Start'] == "23:00"):
-                cost = float(price_entry['Weighted Price EUR/MWh'])
-                cost_used = methane_used_day * cost
-                cost_offset = methane_offset_day * cost
+    # the missing capacity fractions, by year.
+    missing_fractions = {}
+    with open(missing_filename, mode='r') as missing_file:
+        for missing_entry in csv.DictReader(missing_file):
+            missing_fractions[int(missing_entry['Year'][0:4])] = (
+                float(missing_entry['Solar Missing Fraction']),
+                float(missing_entry['Wind onshore Missing Fraction']),
+                float(missing_entry['Wind offshore Missing Fraction']))
 
-                print("%s: %6.2fGWh of %6.2fGWh (%6.2f%%): %6.2fM EUR of %6.2fM EUR" %
-                      (day, methane_offset_day / 1000, methane_used_day / 1000,
-                       100.0 * methane_offset_day / methane_used_day,
-                       cost_offset / 1000000.0, cost_used / 1000000.0))
+    if ((year_start - 1) not in missing_fractions):
+        print("Failed to find %d in %s.\n" % (year_start - 1, missing_filename))
+        sys.exit()
 
-                methane_offset_yearly += methane_offset_day
-                methane_used_yearly += methane_used_day
-                methane_used_cost_yearly += cost_used
-                methane_offset_cost_yearly += cost_offset
+    run_metrics.stage("dispatch")
+    print("If the artificial neutering of renewables by the SPD and CDU/CSU had not")
+    print("happened in 2012 (aka. Altmaier Knick), how much methane would we have been")
+    print("able to offset, and how much would this methane have cost in day ahead pricing?")
 
-            generation_entry = next(generation_reader, None)
-            if (generation_entry == None):
-                break
-            if (generation_entry['Start'] == "00:00"):
-                break
+    print("")
 
-        if (generation_entry == None):
+    day_firsts, days, day_of_hour, complete, years = generation_days(generation['Hour'])
+    dates, times = simulation_data.epoch_hour_strings(days * 24)
+    price_daily, priced, price_carried = prices_daily(price_days, price_values, days)
+
+    fraction_year = min(missing_fractions)
+    fractions = [numpy.array([[missing_fractions.get(year, (0.0, 0.0, 0.0))[capacity]
+                               for year in range(fraction_year, max(missing_fractions) + 1)]])
+                 for capacity in range(3)]
+    factors = factors_daily(fraction_year, fractions, days, years)
+
+    methane_offset_daily, methane_used_daily = methane_daily(generation, day_firsts, day_of_hour, factors)
+    methane_offset_daily = methane_offset_daily[0]
+    cost_offset_daily = methane_offset_daily * price_daily
+    cost_used_daily = methane_used_daily * price_daily
+
+    methane_used_total = 0.0
+    methane_offset_total = 0.0
+    methane_used_cost_total = 0.0
+    methane_offset_cost_total = 0.0
+
+    year = year_start
+    while ((year in missing_fractions) and (year <= years[-1])):
+        selected = numpy.flatnonzero((years == year) & complete & priced)
+        # past the end of the pricing data.
+        if (len(selected) == 0):
             break
-        price_entry = next(price_reader, None)
-        if (price_entry == None):
-            break
-        if (int(generation_entry['Date'][0:4]) != year):
-            break
-
-        solar_factor += solar_factor_adjustment
-        onshore_factor += onshore_factor_adjustment
-        offshore_factor += offshore_factor_adjustment
 
-    print("")
-    print("%d:" % (year))
+        print("Calculating for %s:" % year)
+        for day in selected.tolist():
+            print("%s: %6.2fGWh of %6.2fGWh (%6.2f%%): %6.2fM EUR of %6.2fM EUR" %
+                  (dates[day], methane_offset_daily[day] / 1000, methane_used_daily[day] / 1000,
+                   100.0 * methane_offset_daily[day] / methane_used_daily[day],
+                   cost_offset_daily[day] / 1000000.0, cost_used_daily[day] / 1000000.0))
+
+        methane_offset_yearly = methane_offset_daily[selected].sum()
+        methane_used_yearly = methane_used_daily[selected].sum()
+        methane_offset_cost_yearly = cost_offset_daily[selected].sum()
+        methane_used_cost_yearly = cost_used_daily[selected].sum()
+
+        print("")
+        print("%d:" % (year))
+        carried = numpy.count_nonzero(price_carried[selected])
+        if (carried > 0):
+            print(" %d of %d days without a price, priced as the day before." % (carried, len(selected)))
+        print(" %7.3fTWh of %7.3fTWh of methane could have been offset (%5.2f%%)." %
+          (methane_offset_yearly / 1000000, methane_used_yearly / 1000000,
+           100 * methane_offset_yearly / methane_used_yearly))
+        print(" %5.2fB EUR of %5.2fB EUR at day-ahead market prices could have been saved (%5.2f%%)." %
+          (methane_offset_cost_yearly / 1000000000.0,
+           methane_used_cost_yearly / 1000000000.0,
+           100 * methane_offset_cost_yearly / methane_used_cost_yearly))
+        print("")
+
+        methane_used_total += methane_used_yearly
+        methane_offset_total += methane_offset_yearly
+        methane_used_cost_total += methane_used_cost_yearly
+        methane_offset_cost_total += methane_offset_cost_yearly
+
+        year += 1
+
+    run_metrics.stage("report")
+    print("Between %d and %d:" % (year_start, year))
     print(" %7.3fTWh of %7.3fTWh of methane could have been offset (%5.2f%%)." %
-      (methane_offset_yearly / 1000000, methane_used_yearly / 1000000,
-       100 * methane_offset_yearly / methane_used_yearly))
+          (methane_offset_total / 1000000, methane_used_total / 1000000,
+           100 * methane_offset_total / methane_used_total))
     print(" %5.2fB EUR of %5.2fB EUR at day-ahead market prices could have been saved (%5.2f%%)." %
-      (methane_offset_cost_yearly / 1000000000.0,
-       methane_used_cost_yearly / 1000000000.0,
-       100 * methane_offset_cost_yearly / methane_used_cost_yearly))
+          (methane_offset_cost_total / 1000000000.0,
+           methane_used_cost_total / 1000000000.0,
+           100 * methane_offset_cost_total / methane_used_cost_total))
     print("")
-
-    methane_used_total += methane_used_yearly
-    methane_offset_total += methane_offset_yearly
-    methane_used_cost_total += methane_used_cost_yearly
-    methane_offset_cost_total += methane_offset_cost_yearly
-
-year = year_start
-while True:
-    solar_factor = float(missing_entry['Solar Missing Fraction'])
-    onshore_factor = float(missing_entry['Wind onshore Missing Fraction'])
-    offshore_factor = float(missing_entry['Wind offshore Missing Fraction'])
-
-    missing_entry = next(missing_reader, None)
-    if (missing_entry == None):
-        break
-
-    solar_factor_next = float(missing_entry['Solar Missing Fraction'])
-    onshore_factor_next = float(missing_entry['Wind onshore Missing Fraction'])
-    offshore_factor_next = float(missing_entry['Wind offshore Missing Fraction'])
-
-    if ((year % 4) == 0):
-        days = 366.0
-    else:
-        days = 365.0
-
-    solar_factor_adjustment = (solar_factor_next - solar_factor) / days
-    onshore_factor_adjustment = (onshore_factor_next - onshore_factor) / days
-    offshore_factor_adjustment = (offshore_factor_next - offshore_factor) / days
-
-    methane_missing_yearly(year, solar_factor, solar_factor_adjustment,
-                           onshore_factor, onshore_factor_adjustment,
-                           offshore_factor, offshore_factor_adjustment)
-    year += 1
-
-print("Between %d and %d:" % (year_start, year))
-print(" %7.3fTWh of %7.3fTWh of methane could have been offset (%5.2f%%)." %
-      (methane_offset_total / 1000000, methane_used_total / 1000000,
-       100 * methane_offset_total / methane_used_total))
-print(" %5.2fB EUR of %5.2fB EUR at day-ahead market prices could have been saved (%5.2f%%)." %
-      (methane_offset_cost_total / 1000000000.0,
-       methane_used_cost_total / 1000000000.0,
-       100 * methane_offset_cost_total / methane_used_cost_total))
-print("")
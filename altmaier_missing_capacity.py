@@ -12,10 +12,18 @@
 # capacity. This will then scale the hourly generation values in our actual
 # analysis.
 #
+# capacity_missing() also calculates the missing capacity for other knick
+# years, and for additions that kept growing after the knick, for many
+# counterfactuals at once, see altmaier_counterfactual.py.
+#
 
 import sys
 import csv
 
+import numpy
+
+import run_metrics
+
 # The data from 2000-2021 is from
 # https://www.erneuerbare-energien.de/EE/Navigation/DE/Service/Erneuerbare_Energien_in_Zahlen/Zeitreihen/zeitreihen.html
 # Dated September 2022.
@@ -45,123 +53,181 @@ data_offshore = [    0,     0,     0,     0,     0,
                   3283,  4152,  5406,  6393,  7555,
                   7787,  7787,  8129]
 
-if (len(sys.argv) != 2):
-    print("Error: Wrong number of arguments.")
-    print("%s <result csv>" % (sys.argv[0]))
-    sys.exit()
-
-result_filename = sys.argv[1]
-
-print(
-"The CDU/CSU (catholics) and SPD (socialists) aka GroKo (Grosse Koalition),\nunder Angela Merkel, ruled Germany from 2013 til 2021. From 2005 til 2009,\nthe same GroKo ruled. And in the time between, they were joined by the\nliberals, a political party even more conducive to lobbying.")
-print("")
-print("During the 2000s, there was a massive boom in renewable installations, and a\nwhole new industry in germany had formed to create and install renewable\ncapacity. By around 2013, it was clear that renewable energy was not only\nearnest competition to fossil fuels, and the subsidies for new installed\ncapacity were starting to weigh heavily. So subsidies were massively reduced,\nand the industry was given quite a bit of uncertainty on the future of said\nsubsidies. The resulting 'Altmaier Knick' (Peter Altmaier, the responsible\nminister) saw new solar installations collapse almost immediately, and there\nis a clear similar trend with wind 5ys later.")
-print("")
-print("The collapse of onshore wind installations after 2017 is also attributable to\nthe actions of the Bavarian gouvernment, ruled by the CSU (catholics) and\nFreie Waehler (even more conservative than the CSU). Mainly the 10H rule (wind\nturbines need to be further away from populated areas than 10x the height of\nthe turbine) made it impossible to install new wind capacity.")
-print("")
-print("The result is the near total collapse of the renewable industry in germany,\nall solar producers and most of wind turbine construction collapsed, and their\nIP and remaining assets got gobbled up by foreign entities.")
-print("")
-print("This application calculates the capacity missing, if we flatline the peak new\ninstalled capacity in 2012 and 2017 respectively. Take note, the values are\nflatlined, and not extrapolated from previous growth ratios. This is the\nabsolute lowest estimate for what capacity is missing.")
-print("")
-
-year_solar_max = 2012
-year_onshore_max = 2017
-year_offshore_max = 2017
-
-solar_max = 0.0
-onshore_max = 0.0
-offshore_max = 0.0
-
-solar_missing = 0.0
-onshore_missing = 0.0
-offshore_missing = 0.0
-
-result_file = open(result_filename, mode='w')
-result_fieldnames = ['Year',
-                     'Solar Installed',
-                     'Solar Missing',
-                     'Solar Missing Fraction',
-                     'Wind onshore Installed',
-                     'Wind onshore Missing',
-                     'Wind onshore Missing Fraction',
-                     'Wind offshore Installed',
-                     'Wind offshore Missing',
-                     'Wind offshore Missing Fraction',
-]
-result_writer = csv.DictWriter(result_file, fieldnames=result_fieldnames,
-                               lineterminator='\n')
-result_writer.writeheader()
-
-for year in data_years:
-    i = data_years.index(year)
-
-    print("%d:" % (year))
-
-    solar = float(data_solar[i])
-    if (i):
-        diff = solar - data_solar[i - 1]
-    else:
-        diff = 0
-
-    if (year == year_solar_max):
-        print("  Solar:\t%5dMWp: +%4dMWp (Before the crash)" % (solar, diff))
-        solar_max = diff
-    elif (solar_max > 0):
-        solar_missing += solar_max - diff
-        print("  Solar:\t%5dMWp: +%4dMWp: %5dMWp missing (%5.2f%%)" %
-              (solar, diff, solar_missing, 100 * solar_missing / solar))
-    else:
-        print("  Solar:\t%5dMWp: +%4dMWp" % (solar, diff))
-
-    onshore = float(data_onshore[i])
-    if (i):
-        diff = onshore - data_onshore[i - 1]
-    else:
-        diff = 0
-
-    if (year == year_onshore_max):
-        print("  Onshore:\t%5dMWp: +%4dMWp (Before the crash)" %
-              (onshore, diff))
-        onshore_max = diff
-    elif (onshore_max > 0):
-        onshore_missing += onshore_max - diff
-        print("  Onshore:\t%5dMWp: +%4dMWp: %5dMWp missing (%5.2f%%)" %
-              (onshore, diff, onshore_missing, 100 * onshore_missing / onshore))
-    else:
-        print("  Onshore:\t%5dMWp: +%4dMWp" % (onshore, diff))
-
-    offshore = float(data_offshore[i])
-    if (i):
-        diff = offshore - data_offshore[i - 1]
-    else:
-        diff = 0
-
-    if (year == year_offshore_max):
-        print("  Offshore:\t%5dMWp: +%4dMWp (Before the crash)" % (offshore, diff))
-        offshore_max = diff
-    elif (offshore_max > 0):
-        offshore_missing += offshore_max - diff
-        print("  Offshore:\t%5dMWp: +%4dMWp: %5dMWp missing (%5.2f%%)" %
-              (offshore, diff, offshore_missing, 100 * offshore_missing / offshore))
-    else:
-        print("  Offshore:\t%5dMWp: +%4dMWp" % (offshore, diff))
-
-    result = {'Year' : year,
-              'Solar Installed': solar,
-              'Solar Missing': solar_missing,
-              'Solar Missing Fraction': 0.0,
-              'Wind onshore Installed': onshore,
-              'Wind onshore Missing': onshore_missing,
-              'Wind onshore Missing Fraction': 0.0,
-              'Wind offshore Installed': offshore,
-              'Wind offshore Missing': offshore_missing,
-              'Wind offshore Missing Fraction' : 0.0}
-
-    if (solar):
-        result['Solar Missing Fraction'] = round(solar_missing / solar, 5)
-    if (onshore):
-        result['Wind onshore Missing Fraction'] = round(onshore_missing / onshore, 5)
-    if (offshore):
-        result['Wind offshore Missing Fraction'] = round(offshore_missing / offshore, 5)
-
-    result_writer.writerow(result)
+#
+# How the yearly additions would have continued after the knick year: flat
+# at the additions of the knick year, linear along their average yearly
+# change over the growth_years before it, or exponential by their average
+# yearly growth ratio over those years. The growth is extrapolated no
+# further than it was measured, for growth_years after the knick year, and
+# the additions stay flat from there on. Even so, the boom years make for
+# steep growth, solar knicking in 2010 grows its additions about 1.7x a
+# year, and ends up missing about 9x the installed capacity.
+#
+growth_models = ['flat', 'linear', 'exponential']
+growth_years = 4
+
+#
+# Capacity missing in each of data_years, for the installed capacities of
+# data_years, as an array with a row per counterfactual, given by the arrays
+# of knick years and indices into growth_models. Counterfactual additions do
+# not go below zero, and neither does the missing capacity.
+#
+def capacity_missing(installed, knick_years, models):
+    installed = numpy.asarray(installed, dtype=numpy.float64)
+    knick_years = numpy.asarray(knick_years)
+    models = numpy.asarray(models)
+
+    additions = numpy.diff(installed, prepend=installed[0])
+    knick = numpy.searchsorted(data_years, knick_years)
+    peak = additions[knick][:, None]
+    before = additions[numpy.maximum(knick - growth_years, 0)][:, None]
+    after = numpy.array(data_years)[None, :] - knick_years[:, None]
+    growth = numpy.clip(after, 0, growth_years)
+
+    slope = (peak - before) / growth_years
+    # without additions on both ends, there is no ratio to grow by.
+    growing = (before > 0) & (peak > 0)
+    ratio = numpy.where(growing, peak / numpy.where(growing, before, 1.0), 1.0) ** (1.0 / growth_years)
+    counterfactual = numpy.select([models[:, None] == growth_models.index('linear'),
+                                   models[:, None] == growth_models.index('exponential')],
+                                  [peak + slope * growth, peak * ratio ** growth],
+                                  numpy.broadcast_to(peak, after.shape))
+    counterfactual = numpy.maximum(counterfactual, 0.0)
+
+    # nothing is missing without additions in the knick year to carry on.
+    missing = numpy.where((after > 0) & (peak > 0), counterfactual - additions, 0.0)
+    return numpy.maximum(numpy.cumsum(missing, axis=1), 0.0)
+
+#
+# Fraction of the installed capacity that is missing, 0 for none installed.
+#
+def fraction_missing(installed, missing):
+    installed = numpy.asarray(installed, dtype=numpy.float64)
+    return missing / numpy.where(installed > 0, installed, 1.0) * (installed > 0)
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    if (len(sys.argv) != 2):
+        print("Error: Wrong number of arguments.")
+        print("%s <result csv>" % (sys.argv[0]))
+        sys.exit()
+
+    result_filename = sys.argv[1]
+
+    print(
+    "The CDU/CSU (catholics) and SPD (socialists) aka GroKo (Grosse Koalition),\nunder Angela Merkel, ruled Germany from 2013 til 2021. From 2005 til 2009,\nthe same GroKo ruled. And in the time between, they were joined by the\nliberals, a political party even more conducive to lobbying.")
+    print("")
+    print("During the 2000s, there was a massive boom in renewable installations, and a\nwhole new industry in germany had formed to create and install renewable\ncapacity. By around 2013, it was clear that renewable energy was not only\nearnest competition to fossil fuels, and the subsidies for new installed\ncapacity were starting to weigh heavily. So subsidies were massively reduced,\nand the industry was given quite a bit of uncertainty on the future of said\nsubsidies. The resulting 'Altmaier Knick' (Peter Altmaier, the responsible\nminister) saw new solar installations collapse almost immediately, and there\nis a clear similar trend with wind 5ys later.")
+    print("")
+    print("The collapse of onshore wind installations after 2017 is also attributable to\nthe actions of the Bavarian gouvernment, ruled by the CSU (catholics) and\nFreie Waehler (even more conservative than the CSU). Mainly the 10H rule (wind\nturbines need to be further away from populated areas than 10x the height of\nthe turbine) made it impossible to install new wind capacity.")
+    print("")
+    print("The result is the near total collapse of the renewable industry in germany,\nall solar producers and most of wind turbine construction collapsed, and their\nIP and remaining assets got gobbled up by foreign entities.")
+    print("")
+    print("This application calculates the capacity missing, if we flatline the peak new\ninstalled capacity in 2012 and 2017 respectively. Take note, the values are\nflatlined, and not extrapolated from previous growth ratios. This is the\nabsolute lowest estimate for what capacity is missing.")
+    print("")
+
+    year_solar_max = 2012
+    year_onshore_max = 2017
+    year_offshore_max = 2017
+
+    solar_max = 0.0
+    onshore_max = 0.0
+    offshore_max = 0.0
+
+    flat = [growth_models.index('flat')]
+    solar_missing_yearly = capacity_missing(data_solar, [year_solar_max], flat)[0]
+    onshore_missing_yearly = capacity_missing(data_onshore, [year_onshore_max], flat)[0]
+    offshore_missing_yearly = capacity_missing(data_offshore, [year_offshore_max], flat)[0]
+
+    run_metrics.stage("report")
+    result_file = open(result_filename, mode='w')
+    result_fieldnames = ['Year',
+                         'Solar Installed',
+                         'Solar Missing',
+                         'Solar Missing Fraction',
+                         'Wind onshore Installed',
+                         'Wind onshore Missing',
+                         'Wind onshore Missing Fraction',
+                         'Wind offshore Installed',
+                         'Wind offshore Missing',
+                         'Wind offshore Missing Fraction',
+    ]
+    result_writer = csv.DictWriter(result_file, fieldnames=result_fieldnames,
+                                   lineterminator='\n')
+    result_writer.writeheader()
+
+    for year in data_years:
+        i = data_years.index(year)
+
+        print("%d:" % (year))
+
+        solar = float(data_solar[i])
+        if (i):
+            diff = solar - data_solar[i - 1]
+        else:
+            diff = 0
+
+        if (year == year_solar_max):
+            print("  Solar:\t%5dMWp: +%4dMWp (Before the crash)" % (solar, diff))
+            solar_max = diff
+        elif (solar_max > 0):
+            solar_missing = float(solar_missing_yearly[i])
+            print("  Solar:\t%5dMWp: +%4dMWp: %5dMWp missing (%5.2f%%)" %
+                  (solar, diff, solar_missing, 100 * solar_missing / solar))
+        else:
+            print("  Solar:\t%5dMWp: +%4dMWp" % (solar, diff))
+
+        onshore = float(data_onshore[i])
+        if (i):
+            diff = onshore - data_onshore[i - 1]
+        else:
+            diff = 0
+
+        if (year == year_onshore_max):
+            print("  Onshore:\t%5dMWp: +%4dMWp (Before the crash)" %
+                  (onshore, diff))
+            onshore_max = diff
+        elif (onshore_max > 0):
+            onshore_missing = float(onshore_missing_yearly[i])
+            print("  Onshore:\t%5dMWp: +%4dMWp: %5dMWp missing (%5.2f%%)" %
+                  (onshore, diff, onshore_missing, 100 * onshore_missing / onshore))
+        else:
+            print("  Onshore:\t%5dMWp: +%4dMWp" % (onshore, diff))
+
+        offshore = float(data_offshore[i])
+        if (i):
+            diff = offshore - data_offshore[i - 1]
+        else:
+            diff = 0
+
+        if (year == year_offshore_max):
+            print("  Offshore:\t%5dMWp: +%4dMWp (Before the crash)" % (offshore, diff))
+            offshore_max = diff
+        elif (offshore_max > 0):
+            offshore_missing = float(offshore_missing_yearly[i])
+            print("  Offshore:\t%5dMWp: +%4dMWp: %5dMWp missing (%5.2f%%)" %
+                  (offshore, diff, offshore_missing, 100 * offshore_missing / offshore))
+        else:
+            print("  Offshore:\t%5dMWp: +%4dMWp" % (offshore, diff))
+
+        result = {'Year' : year,
+                  'Solar Installed': solar,
+                  'Solar Missing': float(solar_missing_yearly[i]),
+                  'Solar Missing Fraction': 0.0,
+                  'Wind onshore Installed': onshore,
+                  'Wind onshore Missing': float(onshore_missing_yearly[i]),
+                  'Wind onshore Missing Fraction': 0.0,
+                  'Wind offshore Installed': offshore,
+                  'Wind offshore Missing': float(offshore_missing_yearly[i]),
+                  'Wind offshore Missing Fraction' : 0.0}
+
+        if (solar):
+            result['Solar Missing Fraction'] = round(solar_missing_yearly[i] / solar, 5)
+        if (onshore):
+            result['Wind onshore Missing Fraction'] = round(onshore_missing_yearly[i] / onshore, 5)
+        if (offshore):
+            result['Wind offshore Missing Fraction'] = round(offshore_missing_yearly[i] / offshore, 5)
+
+        result_writer.writerow(result)
+        run_metrics.rows_add(1)
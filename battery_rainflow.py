@@ -0,0 +1,211 @@
+#!/usr/bin/python
+
+#
+# Estimate the wear of the battery in a simulate.py run from its actual
+# hourly state of charge, instead of the one cycle a day that
+# lifepo4_grid_storage.py assumes:
+#
+#   ./simulate.py --output simulate_2045.npz ... 2.0 182.5 70 500 5400 32 110
+#   ./battery_rainflow.py simulate_2045.npz 5400 20
+#
+# The charge/discharge cycles of the state of charge are found by rainflow
+# counting, and counted by their depth of discharge, in the 5% steps of the
+# dod_cycles table. The capacity each of them costs gives the fade over the
+# simulated years, and the energy they cycle the cost per MWh cycled over
+# the life of the battery.
+#
+# The state of charge is streamed out of the .npz a block at a time. The
+# turning points of a block are found by numpy, and only those go through
+# the rainflow stack, which only holds the turning points of cycles that are
+# not closed yet. So memory does not grow with the number of hours.
+#
+
+import sys
+import zipfile
+
+import numpy
+
+import lifepo4_battery
+import run_metrics
+
+#
+# Shape and dtype of the .npy file, read up to its data.
+#
+def npy_header(array_file):
+    version = numpy.lib.format.read_magic(array_file)
+    if (version == (1, 0)):
+        shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(array_file)
+    else:
+        shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(array_file)
+    return shape, dtype
+
+#
+# Length of an array in an .npz, None if there is no such array.
+#
+def npz_length(filename, name):
+    with zipfile.ZipFile(filename) as archive:
+        if ((name + ".npy") not in archive.namelist()):
+            return None
+        with archive.open(name + ".npy") as array_file:
+            return npy_header(array_file)[0][0]
+
+#
+# The values of an array in an uncompressed .npz, a block at a time.
+#
+def npz_blocks(filename, name, block=1 << 16):
+    with zipfile.ZipFile(filename) as archive:
+        with archive.open(name + ".npy") as array_file:
+            shape, dtype = npy_header(array_file)
+
+            while True:
+                data = array_file.read(block * dtype.itemsize)
+                if (not data):
+                    break
+                yield numpy.frombuffer(data, dtype=dtype)
+
+#
+# The turning points of a series given in blocks: the first and last value,
+# and every value where the series changes direction. Flat stretches count
+# as a single value.
+#
+def turning_points(blocks):
+    last = None
+    direction = 0
+
+    for block in blocks:
+        if (last == None):
+            if (len(block) == 0):
+                continue
+            yield block[0:1]
+            values = block
+        else:
+            values = numpy.concatenate([[last], block])
+
+        steps = numpy.diff(values)
+        moving = numpy.flatnonzero(steps)
+        directions = numpy.sign(steps[moving])
+
+        before = numpy.concatenate([[direction], directions[:-1]])
+        turning = moving[(directions != before) & (before != 0)]
+        yield values[turning]
+
+        if (len(directions)):
+            direction = directions[-1]
+        last = values[-1]
+
+    if (direction != 0):
+        yield numpy.array([last])
+
+#
+# Rainflow counting (ASTM E1049, three point) of the given turning points,
+# into a histogram of cycles by DoD step (see lifepo4_battery.dod_step()) of
+# the capacity. Half cycles count as half.
+#
+# Returns the histogram and the energy cycled.
+#
+def rainflow_count(points, capacity):
+    histogram = numpy.zeros(len(lifepo4_battery.dod_loss))
+    cycled = 0.0
+
+    # the ranges of closed cycles, and how much each counts.
+    ranges = []
+    counts = []
+
+    stack = []
+    for block in points:
+        for point in block.tolist():
+            stack.append(point)
+
+            while (len(stack) >= 3):
+                current = abs(stack[-1] - stack[-2])
+                previous = abs(stack[-2] - stack[-3])
+                if (current < previous):
+                    break
+
+                ranges.append(previous)
+                if (len(stack) == 3):
+                    # the start of the series only closes half a cycle.
+                    counts.append(0.5)
+                    del stack[0]
+                else:
+                    counts.append(1.0)
+                    del stack[-3:-1]
+
+        if (ranges):
+            cycled += rainflow_histogram_add(histogram, ranges, counts, capacity)
+            ranges = []
+            counts = []
+
+    # what is left on the stack are half cycles.
+    for i in range(len(stack) - 1):
+        ranges.append(abs(stack[i + 1] - stack[i]))
+        counts.append(0.5)
+    if (ranges):
+        cycled += rainflow_histogram_add(histogram, ranges, counts, capacity)
+
+    return histogram, cycled
+
+def rainflow_histogram_add(histogram, ranges, counts, capacity):
+    ranges = numpy.array(ranges)
+    counts = numpy.array(counts)
+
+    dod = numpy.minimum(lifepo4_battery.dod_step(100.0 * ranges / capacity), 100.0)
+    numpy.add.at(histogram, (dod // 5).astype(int), counts)
+
+    return (ranges * counts).sum()
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    if ((len(sys.argv) != 3) and (len(sys.argv) != 4)):
+        print("Error: Wrong number of arguments.")
+        print("%s <hourly npz from simulate.py --output> <battery storage GWh> [life years]" % (sys.argv[0]))
+        sys.exit()
+
+    filename = sys.argv[1]
+    capacity = float(sys.argv[2]) * 1000.0
+    if (len(sys.argv) == 4):
+        duration = int(sys.argv[3])
+    else:
+        duration = 20
+
+    print("Counting the battery cycles in %s, for %.2fGWh of storage..." % (filename, capacity / 1000.0))
+    print("")
+
+    hours = npz_length(filename, 'storage_battery')
+    if (hours == None):
+        print("Error: No battery state of charge in %s." % (filename))
+        sys.exit()
+
+    run_metrics.stage("dispatch")
+    histogram, cycled = rainflow_count(turning_points(npz_blocks(filename, 'storage_battery')), capacity)
+    run_metrics.rows_add(hours)
+
+    run_metrics.stage("report")
+    years = hours / (365.25 * 24)
+
+    print(" DoD     Cycles   Capacity loss")
+    for step in range(1, len(histogram)):
+        if (histogram[step]):
+            print("%3d%% %10.1f %14.4f%%" %
+                  (step * 5, histogram[step], histogram[step] * lifepo4_battery.dod_loss[step]))
+    print("")
+
+    fade = (histogram * lifepo4_battery.dod_loss).sum()
+    print("Over %.2f years (%d hours), %.1f full charges, a total of %.2fGWh, were cycled through." %
+          (years, hours, cycled / capacity, cycled / 1000.0))
+    if ((fade == 0.0) or (cycled == 0.0)):
+        print("The battery was not cycled.")
+        sys.exit()
+
+    print("The capacity of these LiFePO4 batteries will have degraded by %.2f%%, %.3f%% per year," %
+          (fade, fade / years))
+    print("so they reach 80%% of their original capacity after %.1f years." % (20.0 * years / fade))
+    print("")
+
+    volume = cycled / years * duration
+    tesla, rack, raw = lifepo4_battery.cost_per_mwh_cycled(capacity, duration, volume)
+    print("Over %d years, cycling %.2fGWh, the cost per MWh cycled is" % (duration, volume / 1000.0))
+    print("\t%3.2fEUR for Tesla Megapacks," % tesla)
+    print("\t%3.2fEUR for server rack batteries," % rack)
+    print("\t%3.2fEUR for raw LiFePO4 cells." % raw)
@@ -0,0 +1,407 @@
+#!/usr/bin/python
+
+#
+# Benchmark the main scripts against synthetic data of the same shape as the
+# SMARD derived files, at the real size (8 years of hourly data from 2015)
+# and at multiples of it, for multi-decade horizons.
+#
+# The synthetic data is a deterministic mix of daily, weekly and seasonal
+# cycles with noise. It is not meant to be realistic, only to have the same
+# columns, sizes and value ranges, so that the scripts do the same work.
+# It is generated once per scale, into benchmark_data/<scale>x/.
+#
+# Every script is run as its own process with --profile (see run_metrics.py),
+# and the result is appended to the results file, together with the git
+# commit, so that runs can be compared over time. For each script, the
+# change against the previous result at the same scale is shown.
+#
+# Scripts that fail at a scale, for instance because they hardcode years,
+# are recorded as such.
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import subprocess
+
+import numpy
+
+import simulation_data
+
+data_dirname = "benchmark_data"
+results_filename_default = "benchmark_results.jsonl"
+
+# bumped whenever the generated data changes, to generate it again.
+data_version = 2
+
+years_real = 8
+forecast_extra_hours = 72
+
+#
+# The hourly shape of a synthetic dataset: 8 * scale years from 2015, plus
+# 3 days of forecast. The hours are UTC ones, from local midnight on.
+#
+def hours_create(scale):
+    start = simulation_data.epoch_hour("2015-01-01", "00:00")
+    end = simulation_data.epoch_hour("%04d-01-01" % (2015 + years_real * scale), "00:00")
+    start, end = simulation_data.epoch_hours_utc([start, end])
+    return numpy.datetime64(int(start), 'h'), int(end - start)
+
+#
+# Synthetic series for the hours [offset, offset + count) of the dataset.
+#
+def series_create(start, offset, count, seed):
+    rng = numpy.random.default_rng(seed)
+
+    stamps = start + numpy.arange(offset, offset + count)
+    hour = (stamps - stamps.astype('datetime64[D]')).astype(numpy.int64)
+    day = stamps.astype('datetime64[D]').astype(numpy.int64)
+    season = numpy.cos(2 * numpy.pi * (day % 365.25) / 365.25) # 1 in winter, -1 in summer
+    weekend = ((day + 3) % 7) >= 5
+
+    load = (55000.0 + 7000.0 * season -
+            10000.0 * numpy.cos(2 * numpy.pi * (hour - 3) / 24) -
+            8000.0 * weekend + rng.normal(0.0, 1500.0, count))
+
+    daylight = numpy.maximum(0.0, -numpy.cos(2 * numpy.pi * hour / 24) - 0.3 * season)
+    solar = numpy.clip(daylight * (0.55 - 0.25 * season) * rng.uniform(0.4, 1.0, count), 0.0, 1.0)
+
+    # slowly changing weather for wind, as a smoothed random walk.
+    weather = numpy.convolve(rng.normal(0.0, 1.0, count + 47), numpy.ones(48) / 48, mode='valid')
+    onshore = numpy.clip(0.2 + 0.1 * season + 0.6 * weather, 0.0, 0.95)
+    offshore = numpy.clip(0.4 + 0.1 * season + 0.8 * weather, 0.0, 0.98)
+
+    hydro = 1500.0 + 300.0 * season + rng.normal(0.0, 100.0, count)
+    gas = numpy.maximum(500.0, 9000.0 + 4000.0 * season - 6000.0 * solar - 8000.0 * onshore +
+                        rng.normal(0.0, 1000.0, count))
+
+    return {'stamps': stamps, 'load': load, 'solar': solar, 'onshore': onshore,
+            'offshore': offshore, 'hydro': hydro, 'gas': gas, 'noise': rng.normal(1.0, 0.05, count)}
+
+#
+# Date and Time of the hours in German local time, with the hour that
+# autumn has twice and the one spring skips, as SMARD has them.
+#
+def stamps_split(stamps):
+    stamps = simulation_data.epoch_hours_local(stamps.astype(numpy.int64)).astype('datetime64[h]')
+    strings = numpy.datetime_as_string(stamps, unit='h').tolist()
+    return [string[0:10] for string in strings], [string[11:13] + ":00" for string in strings]
+
+#
+# Installed capacity in MW: growing every local year, constant within a year.
+#
+def capacity_create(stamps):
+    stamps = simulation_data.epoch_hours_local(stamps.astype(numpy.int64)).astype('datetime64[h]')
+    years = stamps.astype('datetime64[Y]').astype(numpy.int64) + 1970 - 2015
+    return {'solar': 38000.0 + 6000.0 * years,
+            'onshore': 41000.0 + 2500.0 * years,
+            'offshore': 3300.0 + 900.0 * years}
+
+#
+# Write all hourly files, in chunks of a year, so that memory stays bounded.
+#
+def hourly_write(dirname, scale):
+    start, hours = hours_create(scale)
+    total = hours + forecast_extra_hours
+
+    files = {}
+    def file_open(name, header):
+        files[name] = open(os.path.join(dirname, name), mode='w')
+        files[name].write(header + "\n")
+
+    file_open('smard_consumption.csv', "Date,Time,Total (grid load) [MWh],Hydro pumped storage [MWh]")
+    file_open('smard_consumption_forecast.fixed.csv', "Date,Start,Total (grid load) [MWh],Residual load [MWh]")
+    file_open('smard_generation.csv',
+              "Date,Start,Biomass [MWh],Hydropower [MWh],Wind offshore [MWh],Wind onshore [MWh],"
+              "Photovoltaics [MWh],Other renewable [MWh],Nuclear [MWh],Lignite [MWh],Hard coal [MWh],"
+              "Fossil gas [MWh],Hydro pumped storage [MWh],Other conventional [MWh]")
+    file_open('smard_generation_forecast.fixed.csv',
+              "Date,Start,Total [MWh],Photovoltaics and wind [MWh],Wind offshore [MWh],Wind onshore [MWh],"
+              "Photovoltaics [MWh],Other [MWh]")
+    file_open('smard_generation_capacity.csv',
+              "Date,Time,Biomass [MW],Hydropower [MW],Wind offshore [MW],Wind onshore [MW],"
+              "Photovoltaics [MW],Other renewable [MW],Nuclear [MW],Lignite [MW],Hard coal [MW],"
+              "Fossil gas [MW],Hydro pumped storage [MW],Other conventional [MW]")
+    file_open('simulation_data_actual.csv', "Date,Time,Load,Hydropower,Wind onshore,Wind offshore,Photovoltaics")
+    file_open('simulation_data_forecast.csv', "Date,Time,Load,Hydropower,Wind onshore,Wind offshore,Photovoltaics")
+
+    chunk = 24 * 366
+    for offset in range(0, total, chunk):
+        count = min(chunk, total - offset)
+        series = series_create(start, offset, count, seed=offset)
+        capacity = capacity_create(series['stamps'])
+        dates, times = stamps_split(series['stamps'])
+        actual = [(offset + i) < hours for i in range(count)]
+
+        load = series['load'].tolist()
+        load_forecast = (series['load'] * series['noise']).tolist()
+        hydro = series['hydro'].tolist()
+        solar = series['solar'].tolist()
+        onshore = series['onshore'].tolist()
+        offshore = series['offshore'].tolist()
+        solar_forecast = numpy.clip(series['solar'] * series['noise'], 0.0, 1.0).tolist()
+        onshore_forecast = numpy.clip(series['onshore'] * series['noise'], 0.0, 1.0).tolist()
+        offshore_forecast = numpy.clip(series['offshore'] * series['noise'], 0.0, 1.0).tolist()
+        gas = series['gas'].tolist()
+        capacity_solar = capacity['solar'].tolist()
+        capacity_onshore = capacity['onshore'].tolist()
+        capacity_offshore = capacity['offshore'].tolist()
+
+        for i in range(count):
+            date = dates[i]
+            time = times[i]
+            solar_mwh = solar[i] * capacity_solar[i]
+            onshore_mwh = onshore[i] * capacity_onshore[i]
+            offshore_mwh = offshore[i] * capacity_offshore[i]
+            solar_forecast_mwh = solar_forecast[i] * capacity_solar[i]
+            onshore_forecast_mwh = onshore_forecast[i] * capacity_onshore[i]
+            offshore_forecast_mwh = offshore_forecast[i] * capacity_offshore[i]
+
+            files['smard_consumption_forecast.fixed.csv'].write(
+                "%s,%s,%.2f,%.2f\n" % (date, time, load_forecast[i],
+                                       load_forecast[i] - solar_forecast_mwh - onshore_forecast_mwh -
+                                       offshore_forecast_mwh))
+            files['smard_generation_forecast.fixed.csv'].write(
+                "%s,%s,%.2f,%.2f,%.2f,%.2f,%.2f,%.2f\n" %
+                (date, time, load_forecast[i] * 0.9,
+                 solar_forecast_mwh + onshore_forecast_mwh + offshore_forecast_mwh,
+                 offshore_forecast_mwh, onshore_forecast_mwh, solar_forecast_mwh, 20000.0))
+            files['smard_generation_capacity.csv'].write(
+                "%s,%s,8500.00,5600.00,%.2f,%.2f,%.2f,600.00,4000.00,18000.00,19000.00,31000.00,9800.00,5500.00\n" %
+                (date, time, capacity_offshore[i], capacity_onshore[i], capacity_solar[i]))
+            files['simulation_data_forecast.csv'].write(
+                "%s,%s,%.2f,%.2f,%.4f,%.4f,%.4f\n" %
+                (date, time, load_forecast[i], hydro[i], onshore_forecast[i], offshore_forecast[i],
+                 solar_forecast[i]))
+
+            if (not actual[i]):
+                continue
+
+            files['smard_consumption.csv'].write(
+                "%s,%s,%.2f,%.2f\n" % (date, time, load[i], 400.0 + 0.01 * load[i]))
+            files['smard_generation.csv'].write(
+                "%s,%s,4900.00,%.2f,%.2f,%.2f,%.2f,150.00,3000.00,11000.00,7000.00,%.2f,900.00,1200.00\n" %
+                (date, time, hydro[i], offshore_mwh, onshore_mwh, solar_mwh, gas[i]))
+            files['simulation_data_actual.csv'].write(
+                "%s,%s,%.2f,%.2f,%.4f,%.4f,%.4f\n" %
+                (date, time, load[i], hydro[i], onshore[i], offshore[i], solar[i]))
+
+    for data_file in files.values():
+        data_file.close()
+
+#
+# The daily and yearly files: consumption cycles, methane prices and the
+# missing capacity fractions.
+#
+def daily_write(dirname, scale):
+    start, hours = hours_create(scale)
+    days = hours // 24
+    rng = numpy.random.default_rng(scale)
+
+    day_stamps = numpy.datetime64("2015-01-01", 'D') + numpy.arange(days)
+    dates = numpy.datetime_as_string(day_stamps, unit='D').tolist()
+    season = numpy.cos(2 * numpy.pi * (day_stamps.astype(numpy.int64) % 365.25) / 365.25)
+    total = (1300000.0 + 170000.0 * season + rng.normal(0.0, 60000.0, days)).tolist()
+    cycle = (80000.0 + 15000.0 * season + rng.normal(0.0, 10000.0, days)).tolist()
+
+    with open(os.path.join(dirname, 'consumption_cycles.csv'), mode='w') as cycles_file:
+        cycles_file.write("Date,Total Consumption [MWh],Average Consumption [MW],Storage Cycle [MWh]\n")
+        for i in range(days):
+            cycles_file.write("%s,%.2f,%.2f,%.2f\n" % (dates[i], total[i], total[i] / 24, cycle[i]))
+
+    price = numpy.clip(20.0 + 5.0 * season + numpy.cumsum(rng.normal(0.0, 0.5, days)) % 150.0, 5.0, 300.0)
+    price = price.tolist()
+    with open(os.path.join(dirname, 'cegh_at_methane_day-ahead.csv'), mode='w') as price_file:
+        price_file.write("Date,Weighted Price EUR/MWh\n")
+        for i in range(days):
+            if (dates[i] >= "2016-12-02"):
+                price_file.write("%s,%.2f\n" % (dates[i], price[i]))
+
+    year_end = 2015 + years_real * scale
+    with open(os.path.join(dirname, 'altmaier_missing_capacity.csv'), mode='w') as missing_file:
+        missing_file.write("Year,Solar Installed,Solar Missing,Solar Missing Fraction,Wind onshore Installed,"
+                           "Wind onshore Missing,Wind onshore Missing Fraction,Wind offshore Installed,"
+                           "Wind offshore Missing,Wind offshore Missing Fraction\n")
+        for year in range(2000, year_end):
+            ramp = max(0, year - 2012)
+            missing_file.write("%d,%.1f,%.1f,%.5f,%.1f,%.1f,%.5f,%.1f,%.1f,%.5f\n" %
+                               (year, 40000.0, 3000.0 * ramp, min(0.08 * ramp, 5.0),
+                                50000.0, 1500.0 * ramp, min(0.03 * ramp, 5.0),
+                                5000.0, 200.0 * ramp, min(0.04 * ramp, 5.0)))
+
+def dataset_dirname(scale):
+    return os.path.join(data_dirname, "%dx" % scale)
+
+#
+# Generate the dataset for scale, unless it is already there, of the
+# current data_version.
+#
+def dataset_create(scale):
+    dirname = dataset_dirname(scale)
+    stamp_filename = os.path.join(dirname, "complete")
+    if (os.path.isfile(stamp_filename)):
+        with open(stamp_filename, mode='r') as stamp_file:
+            if (stamp_file.read().split(" ")[0] == str(data_version)):
+                return dirname
+
+    print("Generating %dx dataset in %s..." % (scale, dirname))
+    time_start = time.time()
+
+    shutil.rmtree(dirname, ignore_errors=True)
+    os.makedirs(dirname)
+    hourly_write(dirname, scale)
+    daily_write(dirname, scale)
+
+    with open(stamp_filename, mode='w') as stamp_file:
+        stamp_file.write("%d %s\n" % (data_version, datetime.datetime.now().isoformat(timespec='seconds')))
+
+    print("Generated %dx dataset in %.2fs." % (scale, time.time() - time_start))
+    return dirname
+
+#
+# The benchmarked entry points: name, script, arguments relative to the
+# dataset directory (None is replaced by an output file), and a preparation
+# step.
+#
+def entries_create(dirname, scale):
+    def path(name):
+        return os.path.join(dirname, name)
+
+    def output(name):
+        return os.path.join(dirname, "output", name)
+
+    def cache_remove():
+        for name in ['simulation_data_forecast.csv', 'simulation_data_actual.csv']:
+            shutil.rmtree(path(name) + ".cache", ignore_errors=True)
+
+    return [
+        ('simulation_data_prepare', 'simulation_data_prepare.py',
+         [path('smard_consumption_forecast.fixed.csv'), path('smard_consumption.csv'),
+          path('smard_generation_capacity.csv'), path('smard_generation_forecast.fixed.csv'),
+          path('smard_generation.csv'), output('simulation_data_forecast.csv'),
+          output('simulation_data_actual.csv')], None),
+        ('simulate', 'simulate.py',
+         [path('simulation_data_forecast.csv'), path('simulation_data_actual.csv'),
+          "2.0", "182.5", "70", "500", "5400", "32", "110"], cache_remove),
+        ('simulate_cached', 'simulate.py',
+         [path('simulation_data_forecast.csv'), path('simulation_data_actual.csv'),
+          "2.0", "182.5", "70", "500", "5400", "32", "110"], None),
+        ('consumption_cycles', 'consumption_cycles.py',
+         [path('smard_consumption.csv'), output('consumption_cycles.csv')], None),
+        ('lifepo4_grid_storage', 'lifepo4_grid_storage.py',
+         [path('consumption_cycles.csv'), "100", str(years_real * scale)], None),
+        ('altmaier_methane_wasted', 'altmaier_methane_wasted.py',
+         [path('smard_generation.csv'), path('cegh_at_methane_day-ahead.csv'),
+          path('altmaier_missing_capacity.csv')], None),
+    ]
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    if (dirty):
+        commit += "-dirty"
+    return commit
+
+#
+# Run a single entry point, and return its record.
+#
+def entry_run(name, script, arguments, scale, metrics_filename):
+    if (os.path.isfile(metrics_filename)):
+        os.remove(metrics_filename)
+
+    time_start = time.time()
+    process = subprocess.run([sys.executable, script] + arguments + ["--profile=" + metrics_filename],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.time() - time_start
+
+    record = {'entry': name, 'scale': scale, 'wall': round(wall, 6),
+              'exit': process.returncode}
+
+    if (os.path.isfile(metrics_filename)):
+        with open(metrics_filename, mode='r') as metrics_file:
+            metrics = json.loads(metrics_file.readline())
+        for key in ['stages', 'rows', 'rows_per_second', 'peak_rss_kb']:
+            record[key] = metrics[key]
+
+    if (process.returncode):
+        record['error'] = process.stderr.strip().splitlines()[-1:]
+
+    return record
+
+def results_previous(results_filename):
+    previous = {}
+    if (not os.path.isfile(results_filename)):
+        return previous
+
+    with open(results_filename, mode='r') as results_file:
+        for line in results_file:
+            record = json.loads(line)
+            if (record['exit'] == 0):
+                previous[(record['entry'], record['scale'])] = record
+    return previous
+
+if __name__ == "__main__":
+    if (len(sys.argv) > 3):
+        print("Error: Wrong number of arguments.")
+        print("%s [scales, default 1,10,100] [results jsonl, default %s]" %
+              (sys.argv[0], results_filename_default))
+        sys.exit()
+
+    if (len(sys.argv) >= 2):
+        scales = [int(scale) for scale in sys.argv[1].split(",")]
+    else:
+        scales = [1, 10, 100]
+
+    if (len(sys.argv) == 3):
+        results_filename = sys.argv[2]
+    else:
+        results_filename = results_filename_default
+
+    previous = results_previous(results_filename)
+    commit = git_commit()
+    started = datetime.datetime.now().isoformat(timespec='seconds')
+
+    for scale in scales:
+        dirname = dataset_create(scale)
+        os.makedirs(os.path.join(dirname, "output"), exist_ok=True)
+        metrics_filename = os.path.join(dirname, "output", "run_metrics.jsonl")
+
+        print("")
+        print("%dx (%d years, %d hours):" % (scale, years_real * scale, hours_create(scale)[1]))
+
+        for name, script, arguments, prepare in entries_create(dirname, scale):
+            if (prepare != None):
+                prepare()
+
+            record = entry_run(name, script, arguments, scale, metrics_filename)
+            record['commit'] = commit
+            record['started'] = started
+
+            with open(results_filename, mode='a') as results_file:
+                results_file.write(json.dumps(record) + "\n")
+
+            if (record['exit']):
+                print("  %-24s failed: %s" % (name, " ".join(record['error'])))
+                continue
+
+            comparison = ""
+            before = previous.get((name, scale))
+            if (before != None):
+                comparison = "  (%5.2fx of %8.3fs at %s)" % (record['wall'] / before['wall'], before['wall'],
+                                                             before['commit'])
+
+            print("  %-24s %8.3fs %12.0f rows/s %8dkB%s" %
+                  (name, record['wall'], record.get('rows_per_second', 0.0),
+                   record.get('peak_rss_kb', 0), comparison))
+
+    print("")
+    print("Results appended to %s" % results_filename)
@@ -3,26 +3,49 @@
 # DO NOT RUN THIS.
 #
 # ... Unless you absolutely need to.
-# It floods your working dir with 2000+ little html files, and it slightly
+# It fills the cache dir with 2000+ little html files, and it slightly
 # hammers the good people at cegh.at
 #
+# The html of every trading day is kept in the cache dir (the working dir by
+# default) as cegh_YYYYMMDD.html, and only the days missing there are
+# downloaded, a few at a time (--downloads=<count>, 4 by default, please keep
+# it low).
+#
+# The delivery days and prices parsed from every file are kept in
+# cegh_parsed.json in the cache dir, by trading date, along with the size
+# and modification time of the file. So a rerun only parses new files,
+# spread over a pool of processes, with the html.parser of the standard
+# library.
+#
+# With --url=<url>, the trading date as YYYYMMDD is appended to that url
+# instead, to fetch from a local server for testing. test_pages holds two
+# stand-in pages to serve, which cegh_test_pages.py checks the parsing
+# against:
+#
+#   cd test_pages && python3 -m http.server 8000 &
+#   ./cegh_at_methane_day-ahead.py test.csv --url=http://localhost:8000/cegh_ \
+#       --cache=test_cache --start=2022-12-01 --stop=2022-12-03
 #
 
+import os
 import sys
-from bs4 import BeautifulSoup
-import re
-import datetime
-from pathlib import Path
-import subprocess
 import csv
+import json
+import datetime
+import html.parser
+import multiprocessing
+import multiprocessing.pool
+import urllib.request
 
-csv_filename = "cegh_at_methane_day-ahead.csv"
-cegh_table = []
+import simulation_data
+import run_metrics
 
 date_delta = datetime.timedelta(days=1)
 date_start = datetime.date.fromisoformat("2016-12-01")
 date_stop = datetime.date.fromisoformat("2023-01-01")
 
+url_cegh = "https://www.cegh.at/umbraco/surface/MarketDataSurface/GetDayAheadSingleDay?lngIsoCode=en-US&marketId=0&stringDate="
+
 def date_from_weekday(date, weekday):
     day_list = ["Monday",
                 "Tuesday",
@@ -47,45 +70,83 @@ def date_from_weekday(date, weekday):
 
         date += date_delta
 
-def data_table_add_html(html):
-    global cegh_table
-    table = []
-
-    soup = BeautifulSoup(html, "html.parser")
-
-    text = soup.get_text()
-
-    #strip suffix
-    text = re.sub("[\n]*[ ]*VWAP \.\.\..*\n  \n\n", "", text, 0, re.M)
-    entries = re.split("\n\n\n", text)[3:]
+#
+# Collects the text of the cells of every table row of a html page, cells
+# and rows left open are closed by the next one.
+#
+class TableRows(html.parser.HTMLParser):
+    def __init__(self):
+        html.parser.HTMLParser.__init__(self)
+        self.rows = []
+        self.row = None
+        self.cell = None
+
+    def cell_end(self):
+        if (self.cell != None):
+            self.row.append("".join(self.cell).strip())
+            self.cell = None
+
+    def row_end(self):
+        self.cell_end()
+        if (self.row != None):
+            self.rows.append(self.row)
+            self.row = None
+
+    def handle_starttag(self, tag, attrs):
+        if (tag == "tr"):
+            self.row_end()
+            self.row = []
+        elif ((tag == "td") or (tag == "th")):
+            if (self.row == None):
+                return
+            self.cell_end()
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        if ((tag == "td") or (tag == "th")):
+            if (self.row != None):
+                self.cell_end()
+        elif ((tag == "tr") or (tag == "table")):
+            self.row_end()
+
+    def handle_data(self, data):
+        if (self.cell != None):
+            self.cell.append(data)
 
-    for line in entries:
-        row = re.split("\n", line)
+#
+# The delivery dates, as ISO date strings, and the weighted average prices
+# of the day ahead table of a html file, sorted by date, with the holes
+# filled with the price of the day before.
+#
+def html_table(html_filename):
+    parser = TableRows()
+    with open(html_filename, mode='r', errors='replace') as html_file:
+        parser.feed(html_file.read())
+    parser.close()
+    parser.row_end()
 
-        if (row[8] == "-" or
-            row[7] == "-"):
+    table = []
+    for row in parser.rows:
+        # the header and the VWAP summary have no contract date.
+        if ((len(row) < 9) or (row[8] == "-") or (row[7] == "-")):
+            continue
+        try:
+            contract_date = datetime.datetime.strptime(row[0], "%d.%m.%Y").date()
+            price = float(row[8])
+        except ValueError:
             continue
 
-        contract_date = datetime.datetime.strptime(row[0], "%d.%m.%Y").date()
         delivery_date = date_from_weekday(contract_date, row[1])
 
         if (delivery_date == None):
             continue
 
-        data = (delivery_date, float(row[8]))
-        table.append(data)
-        #print(data)
+        table.append((delivery_date, price))
 
         if (row[1] == "Weekend"): #add sunday as well
-            delivery_date += date_delta
-
-            data = (delivery_date, float(row[8]))
-            table.append(data)
-            #print(data)
+            table.append((delivery_date + date_delta, price))
 
-    table.sort(key=lambda t: t[0].isoformat())
-
-    #print(table)
+    table.sort(key=lambda t: t[0])
 
     # fixup holes.
     if len(table) > 1:
@@ -97,7 +158,7 @@ def data_table_add_html(html):
                 date = last[0]
                 while True:
                     date += date_delta
-                    if (date == t[0]):
+                    if (date >= t[0]):
                         break
                     new.append((date, last[1]))
 
@@ -105,60 +166,161 @@ def data_table_add_html(html):
             last = t
         table = new
 
-    # add, and filter out days already there.
-    if (len(cegh_table) < 1):
-        cegh_table.extend(table)
-    else:
-        date_last = cegh_table[-1][0]
-
-        for t in table:
-            if (t[0] > date_last):
-                cegh_table.append(t)
+    return [(t[0].isoformat(), t[1]) for t in table]
 
+#
+# Download a url to a file, which only appears once it is complete.
+# Returns the filename and None, or the error.
+#
+def html_fetch(url_filename):
+    url, html_filename = url_filename
 
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            html = response.read()
+    except (OSError, ValueError) as error:
+        return html_filename, error
 
-def html_file_parse(filename):
-    html_file = open(html_filename, 'r')
+    with open(html_filename + ".part", mode='wb') as html_file:
+        html_file.write(html)
+    os.replace(html_filename + ".part", html_filename)
 
-    html = html_file.read()
+    return html_filename, None
 
-    data_table_add_html(html)
+#
+# The parsed tables, by trading date, empty if there is no usable cache.
+#
+def parsed_read(parsed_filename):
+    try:
+        with open(parsed_filename, mode='r') as parsed_file:
+            return json.load(parsed_file)
+    except (OSError, ValueError):
+        return {}
+
+def parsed_write(parsed_filename, parsed):
+    with open(parsed_filename + ".part", mode='w') as parsed_file:
+        json.dump(parsed, parsed_file, sort_keys=True)
+    os.replace(parsed_filename + ".part", parsed_filename)
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    cache_dirname = "."
+    url = url_cegh
+    downloads = 4
+    processes = os.cpu_count()
+
+    arguments = []
+    for argument in sys.argv:
+        if (argument.startswith("--cache=")):
+            cache_dirname = argument[len("--cache="):]
+        elif (argument.startswith("--url=")):
+            url = argument[len("--url="):]
+        elif (argument.startswith("--start=")):
+            date_start = datetime.date.fromisoformat(argument[len("--start="):])
+        elif (argument.startswith("--stop=")):
+            date_stop = datetime.date.fromisoformat(argument[len("--stop="):])
+        elif (argument.startswith("--downloads=")):
+            downloads = int(argument[len("--downloads="):])
+        elif (argument.startswith("--processes=")):
+            processes = int(argument[len("--processes="):])
+        else:
+            arguments.append(argument)
+
+    if (len(arguments) > 2):
+        print("Error: Wrong number of arguments.")
+        print("%s [result csv] [--cache=<dir>] [--url=<url>] [--start=<date>] [--stop=<date>] "
+              "[--downloads=<count>] [--processes=<count>]" % (arguments[0]))
+        sys.exit()
+
+    if (len(arguments) == 2):
+        csv_filename = arguments[1]
+    else:
+        csv_filename = "cegh_at_methane_day-ahead.csv"
+
+    os.makedirs(cache_dirname, exist_ok=True)
+
+    trading_dates = []
+    trading_date = date_start
+    while (trading_date < date_stop):
+        trading_dates.append(trading_date.strftime("%Y%m%d"))
+        trading_date += date_delta
+
+    html_filenames = {}
+    for trading_date in trading_dates:
+        html_filenames[trading_date] = os.path.join(cache_dirname, "cegh_" + trading_date + ".html")
+
+    run_metrics.stage("fetch")
+    fetches = []
+    for trading_date in trading_dates:
+        html_filename = html_filenames[trading_date]
+        # failed downloads of wget left empty files behind.
+        if ((not os.path.isfile(html_filename)) or (os.path.getsize(html_filename) == 0)):
+            fetches.append((url + trading_date, html_filename))
+
+    if (fetches):
+        print("Fetching %d of %d days from %s, %d at a time." %
+              (len(fetches), len(trading_dates), url, downloads))
+        pool = multiprocessing.pool.ThreadPool(downloads)
+        for html_filename, error in pool.imap_unordered(html_fetch, fetches):
+            if (error != None):
+                print("Failed to fetch %s: %s" % (html_filename, error))
+        pool.close()
+        pool.join()
+
+    run_metrics.stage("parse")
+    parsed_filename = os.path.join(cache_dirname, "cegh_parsed.json")
+    parsed = parsed_read(parsed_filename)
+
+    stamps = {}
+    parses = []
+    for trading_date in trading_dates:
+        html_filename = html_filenames[trading_date]
+        if (not os.path.isfile(html_filename)):
+            print("File %s not found." % (html_filename))
+            continue
 
-    html_file.close()
+        stamps[trading_date] = simulation_data.cache_stamp(html_filename)
+        if ((trading_date not in parsed) or (parsed[trading_date]['stamp'] != stamps[trading_date])):
+            parses.append(trading_date)
 
-trading_date = date_start
-while True:
-    #print("Contract date %s: %s" % (trading_date.strftime("%Y%m%d"),
-    #                           trading_date.strftime('%A')))
+    print("Parsing %d of %d days, the rest from %s." % (len(parses), len(stamps), parsed_filename))
 
-    html_filename = "cegh_" + trading_date.strftime("%Y%m%d") + ".html"
-    html_file = Path(html_filename)
+    filenames = [html_filenames[trading_date] for trading_date in parses]
+    if ((processes > 1) and (len(parses) > 1)):
+        pool = multiprocessing.Pool(processes)
+        tables = pool.map(html_table, filenames, chunksize=max(1, len(filenames) // (4 * processes)))
+        pool.close()
+        pool.join()
+    else:
+        tables = map(html_table, filenames)
 
-    if not html_file.is_file():
-        print("File %s not found." % (html_file))
-        command = "wget \"https://www.cegh.at/umbraco/surface/MarketDataSurface/GetDayAheadSingleDay?lngIsoCode=en-US&marketId=0&stringDate=\""
-        command += trading_date.strftime("%Y%m%d")
-        command += " -O " + html_filename
-        print ("\t%s" % command)
-        subprocess.Popen(command, shell=True).wait()
+    for trading_date, table in zip(parses, tables):
+        parsed[trading_date] = {'stamp': stamps[trading_date], 'table': table}
+    if (parses):
+        parsed_write(parsed_filename, parsed)
+    run_metrics.rows_add(len(parses))
 
-    html_file_parse(html_filename)
+    run_metrics.stage("report")
 
-    trading_date += date_delta
-    if (trading_date == date_stop):
-        break
+    # add, and filter out days already there.
+    cegh_table = []
+    for trading_date in trading_dates:
+        if (trading_date not in stamps):
+            continue
 
-csv_table = []
+        for t in parsed[trading_date]['table']:
+            if ((len(cegh_table) < 1) or (t[0] > cegh_table[-1][0])):
+                cegh_table.append(t)
 
-for t in cegh_table:
-    csv_table.append({"Delivery Date" : t[0].isoformat(),
-                      "Weighted Average Price EUR/MWh" : t[1]})
+    print("Writing %d days to %s" % (len(cegh_table), csv_filename))
 
-fieldnames = ['Delivery Date', 'Weighted Average Price EUR/MWh']
+    fieldnames = ['Date', 'Weighted Price EUR/MWh']
 
-with open(csv_filename, mode='w') as csv_file:
-    csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames,
-                                lineterminator='\n')
+    with open(csv_filename, mode='w') as csv_file:
+        csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames,
+                                    lineterminator='\n')
 
-    csv_writer.writeheader()
-    csv_writer.writerows(csv_table)
+        csv_writer.writeheader()
+        for t in cegh_table:
+            csv_writer.writerow({'Date': t[0], 'Weighted Price EUR/MWh': t[1]})
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+#
+# Check the parsing of cegh_at_methane_day-ahead.py against the stand-in
+# pages in test_pages, which are laid out the way html_table() reads the
+# day ahead tables of cegh.at: the trading date in row[0], the delivery day
+# in row[1], the volume in row[7] and the weighted average price in row[8],
+# with '-' where nothing was traded. The second page leaves its cells and
+# rows open, as TableRows has to cope with.
+#
+#   ./cegh_test_pages.py [pages dir]
+#
+# The same pages can be served to the script itself, see the header of
+# cegh_at_methane_day-ahead.py.
+#
+
+import os
+import sys
+import importlib
+
+import run_metrics
+
+cegh = importlib.import_module("cegh_at_methane_day-ahead")
+
+# The table html_table() has to come up with for each page.
+pages_expected = {
+    'cegh_20221201': [('2022-12-01', 144.339),
+                      ('2022-12-02', 145.235)],
+    # the weekend covers sunday, and the untraded days are left out.
+    'cegh_20221202': [('2022-12-03', 131.583),
+                      ('2022-12-04', 131.583)],
+}
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    if (len(sys.argv) > 2):
+        print("Error: Wrong number of arguments.")
+        print("%s [pages dir]" % (sys.argv[0]))
+        sys.exit()
+
+    if (len(sys.argv) == 2):
+        pages_dirname = sys.argv[1]
+    else:
+        pages_dirname = "test_pages"
+
+    run_metrics.stage("parse")
+    failed = 0
+    for page, expected in pages_expected.items():
+        html_filename = os.path.join(pages_dirname, page)
+
+        parser = cegh.TableRows()
+        with open(html_filename, mode='r') as html_file:
+            parser.feed(html_file.read())
+        parser.close()
+        parser.row_end()
+
+        # every row but the VWAP summary has all the columns.
+        widths = [len(row) for row in parser.rows]
+        if (widths[:-1] != [9] * (len(widths) - 1)):
+            print("%s: Rows of %s cells, not 9." % (html_filename, widths))
+            failed += 1
+
+        table = cegh.html_table(html_filename)
+        if (table != expected):
+            print("%s: Parsed %s, not %s." % (html_filename, table, expected))
+            failed += 1
+        else:
+            print("%s: %d days." % (html_filename, len(table)))
+        run_metrics.rows_add(len(parser.rows))
+
+    if (failed):
+        print("Error: %d checks failed." % (failed))
+        sys.exit(1)
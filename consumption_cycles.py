@@ -6,19 +6,90 @@
 # This cycle area is a measure for how much grid level storage is needed
 # to flatten intra-day fluctuations in the electricity grid.
 #
+# With --matrix=<csv>, it also calculates that area for windows starting at
+# every hour of the day, for each of the window lengths given with
+# --windows=<hours>,... (12h, 24h, 48h and 7 days by default), rolling a day
+# at a time, and writes the largest area of each window length and start
+# hour as a matrix. That shows which cycle phase needs the least storage,
+# and how much more multi-day cycles need.
+#
+# With --exact[=<round trip efficiency>], the storage is what a store needs
+# to flatten the load of a window, the range of its cumulative difference to
+# the average, instead of the area above the average. The csv then also
+# holds the power the store needs.
+#
+# The windows are calculated together, by storage_windows.py.
+#
 
 import sys
 import csv
 
-if (len(sys.argv) != 3):
+import numpy
+
+import simulation_data
+import storage_windows
+import run_metrics
+
+run_metrics.setup(sys.argv)
+
+filename_matrix = None
+windows = [12, 24, 48, 168]
+efficiency = None
+
+arguments = []
+for argument in sys.argv:
+    if (argument.startswith("--matrix=")):
+        filename_matrix = argument[len("--matrix="):]
+    elif (argument.startswith("--windows=")):
+        windows = [int(hours) for hours in argument[len("--windows="):].split(",")]
+    elif (argument == "--exact"):
+        efficiency = 1.0
+    elif (argument.startswith("--exact=")):
+        efficiency = float(argument[len("--exact="):])
+    else:
+        arguments.append(argument)
+
+if (len(arguments) != 3):
     print("Error: Wrong number of arguments.")
-    print("%s <input csv> <output csv>" % (sys.argv[0]))
+    print("%s <input csv> <output csv> [--matrix=<matrix csv>] [--windows=<hours>[,<hours>...]] "
+          "[--exact[=<round trip efficiency>]]" % (arguments[0]))
     sys.exit()
 
-filename_input = sys.argv[1]
-filename_output = sys.argv[2]
+filename_input = arguments[1]
+filename_output = arguments[2]
+
+#
+# Total, average, storage and storage power of the windows, the power only
+# with --exact.
+#
+def window_storage(load, starts, lengths):
+    if (efficiency == None):
+        return storage_windows.window_storage(load, starts, lengths) + (None,)
+    return storage_windows.window_storage_exact(load, starts, lengths, efficiency)
+
+print("Reading data from %s" % filename_input)
+run_metrics.stage("parse")
+
+data = simulation_data.hourly_csv_read(filename_input, 'Time', ['Total (grid load) [MWh]'])
+load = data['Total (grid load) [MWh]']
+
+# could be bad data or end of data
+missing = numpy.flatnonzero(numpy.isnan(load))
+if (len(missing) > 0):
+    load = load[:missing[0]]
+hours = data['Hour'][:len(load)] % 24
+dates, times = simulation_data.epoch_hour_strings(data['Hour'][:len(load)])
+run_metrics.rows_add(len(load))
+
+run_metrics.stage("dispatch")
+
+# a cycle ends where the next starts, at 22:00, and is named after the day
+# it ends on. The first takes the hours before the first 22:00.
+ends = numpy.flatnonzero(hours == 22)
+ends = ends[ends > 0]
+starts = numpy.concatenate([[0], ends[:-1]])
+totals, averages, storages, powers = window_storage(load, starts, ends - starts)
 
-intraday = []
 cycles = [ ]
 
 storage_max = 0
@@ -28,76 +99,99 @@ yearly_daily = 0.0
 yearly_storage = 0.0
 yearly_days = 0
 
-print("Reading data from %s" % filename_input)
-
-with open(filename_input, mode='r') as csv_file:
-    csv_reader = csv.DictReader(csv_file)
-    for row in csv_reader:
-        date = row['Date']
-        time = row['Time']
-        load = row['Total (grid load) [MWh]']
+for i in range(len(ends)):
+    date = dates[ends[i]]
+    total = float(totals[i])
+    average = float(averages[i])
+    storage = float(storages[i])
+
+    cycle = { 'Date' : date,
+              'Total Consumption [MWh]' : total,
+              'Average Consumption [MW]' : round(average, 2),
+              'Storage Cycle [MWh]' : round(storage,2) }
+    if (efficiency != None):
+        cycle['Storage Power [MW]'] = round(float(powers[i]), 2)
+    cycles.append(cycle)
+
+    if (storage_max < storage):
+        storage_max = storage
+        storage_max_day = date
+
+    print("%s: %5.2fMW / %7.2fMWh : %06.2fMWh needed" %
+          (date, average, total, storage))
+
+    yearly_days += 1
+    yearly_daily += total
+    yearly_storage += storage
+
+    if (date.endswith("-12-31")):
+        yearly_daily /= yearly_days
+        yearly_storage /= yearly_days
+        print("%s average (%ddays): %5.2fMW / %7.2fMWh :  %06.2fMWh needed"
+              % (date[0:4], yearly_days, yearly_daily / 24, yearly_daily,
+                 yearly_storage))
+        yearly_daily = 0.0
+        yearly_storage = 0.0
+        yearly_days = 0
 
-        # could be bad data or end of data
-        if (load == '-'):
-            break
-
-        load = float(load)
+print("Maximum intra-day storage needed: %6.2fMWh (%s)" %
+      (storage_max, storage_max_day))
+if (efficiency != None):
+    print("Maximum intra-day storage power needed: %6.2fMW (%s)" %
+          (powers.max(), dates[ends[powers.argmax()]]))
 
-        if (time != "22:00"):
-            intraday.append(load)
+#
+# Every row is the start of a window, at the hour of the day of that row,
+# so one pass per window length covers all start hours.
+#
+matrix = []
+if (filename_matrix != None):
+    print("")
+    for window in windows:
+        starts = numpy.arange(max(len(load) - window + 1, 0))
+        if (len(starts) == 0):
+            print("%3dh windows: not enough data" % window)
             continue
 
-        total = sum(intraday)
-        if (date == "2015-01-01"):
-            average = total / 22
-        else:
-            average = total / 24
-
-        storage = 0
-        for value in intraday:
-            # Compared to average, only one side is needed
-            # take the curve above as the first day cycle misses 2h
-            if (value > average):
-                storage += value - average
-        intraday = [load]
-
-        cycle = { 'Date' : date,
-                  'Total Consumption [MWh]' : total,
-                  'Average Consumption [MW]' : round(average, 2),
-                  'Storage Cycle [MWh]' : round(storage,2) }
-        cycles.append(cycle)
-
-        if (storage_max < storage):
-            storage_max = storage
-            storage_max_day = date
-
-        print("%s: %5.2fMW / %7.2fMWh : %06.2fMWh needed" %
-              (date, average, total, storage))
-
-        yearly_days += 1
-        yearly_daily += total
-        yearly_storage += storage
-
-        if (date.endswith("-12-31")):
-            yearly_daily /= yearly_days
-            yearly_storage /= yearly_days
-            print("%s average (%ddays): %5.2fMW / %7.2fMWh :  %06.2fMWh needed"
-                  % (date[0:4], yearly_days, yearly_daily / 24, yearly_daily,
-                     yearly_storage))
-            yearly_daily = 0.0
-            yearly_storage = 0.0
-            yearly_days = 0
+        totals, averages, storages, powers = window_storage(load, starts,
+                                                            numpy.full(len(starts), window))
 
-print("Maximum intra-day storage needed: %6.2fMWh (%s)" %
-      (storage_max, storage_max_day))
+        row = {'Window [h]' : window}
+        best_hour = None
+        for hour in range(24):
+            hour_storages = storages[hours[starts] == hour]
+            if (len(hour_storages) == 0):
+                continue
+            row["%02d:00" % hour] = round(float(hour_storages.max()), 2)
+            if ((best_hour == None) or (row["%02d:00" % hour] < row["%02d:00" % best_hour])):
+                best_hour = hour
+                best_average = float(hour_storages.mean())
+        matrix.append(row)
+
+        print("%3dh windows: least storage needed starting at %02d:00, %06.2fMWh (%06.2fMWh on average)" %
+              (window, best_hour, row["%02d:00" % best_hour], best_average))
 
 print("Writing data to %s" % filename_output)
+run_metrics.stage("report")
 
 with open(filename_output, mode='w') as csv_file:
     fieldnames = ['Date', 'Total Consumption [MWh]',
                   'Average Consumption [MW]', 'Storage Cycle [MWh]']
+    if (efficiency != None):
+        fieldnames.append('Storage Power [MW]')
     csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames,
 				lineterminator='\n')
 
     csv_writer.writeheader()
     csv_writer.writerows(cycles)
+
+if (filename_matrix != None):
+    print("Writing storage matrix to %s" % filename_matrix)
+
+    with open(filename_matrix, mode='w') as csv_file:
+        fieldnames = ['Window [h]'] + ["%02d:00" % hour for hour in range(24)]
+        csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames,
+                                    lineterminator='\n')
+
+        csv_writer.writeheader()
+        csv_writer.writerows(matrix)
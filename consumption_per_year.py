@@ -1,7 +1,17 @@
 #!/usr/bin/python
 
+#
+# The yearly consumption, from the grouped sums of hourly_aggregate.py.
+# Years the data does not have a value for every hour of are marked as
+# partial, with the number of hours it does have one for.
+#
+
 import sys
-import csv
+
+import hourly_aggregate
+import run_metrics
+
+run_metrics.setup(sys.argv)
 
 if (len(sys.argv) != 2):
     print("Error: Wrong number of arguments.")
@@ -10,19 +20,20 @@ if (len(sys.argv) != 2):
 
 consumption_filename = sys.argv[1]
 
-year = 0
-consumption = 0.0
-
-with open(consumption_filename, mode='r') as consumption_file:
-    consumption_reader = csv.DictReader(consumption_file)
-    for row in consumption_reader:
-        if (row['Date'].endswith("-01-01") and
-            row['Time'] == "00:00"):
-            year = int(row['Date'][0:4])
-            consumption = float(row['Total (grid load) [MWh]'])
-        elif (row['Date'].endswith("-12-31") and
-            row['Time'] == "23:00"):
-            consumption += float(row['Total (grid load) [MWh]'])
-            print("%d: %7.3fTWh" % (year, consumption / 1000000.0))
-        else:
-            consumption += float(row['Total (grid load) [MWh]'])
+run_metrics.stage("parse")
+data, fieldnames = hourly_aggregate.hourly_read(consumption_filename, ['Total (grid load) [MWh]'])
+run_metrics.rows_add(len(data['Hour']))
+
+run_metrics.stage("dispatch")
+result = hourly_aggregate.aggregate(data, fieldnames, ['year'], [])['year']
+complete = hourly_aggregate.periods_complete(result, 'Total (grid load) [MWh]')
+totals = result['columns']['Total (grid load) [MWh]']['total']
+counts = result['columns']['Total (grid load) [MWh]']['count']
+
+run_metrics.stage("report")
+for i, year in enumerate(result['labels']):
+    if (complete[i]):
+        print("%s: %7.3fTWh" % (year, totals[i] / 1000000.0))
+    else:
+        print("%s: %7.3fTWh (partial, %d of %d hours)" %
+              (year, totals[i] / 1000000.0, counts[i], result['hours_expected'][i]))
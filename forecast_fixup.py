@@ -0,0 +1,187 @@
+#!/usr/bin/python
+
+#
+# SMARD forecast data has holes, marked with '-'. Patch the holes in the
+# given columns with the actual data of the same hour, or with --interpolate,
+# linearly interpolate what the actual data cannot fill, from the values
+# around the hole. An actual input of '-' means interpolation only.
+#
+#   ./forecast_fixup.py smard_consumption_forecast.csv smard_consumption.csv \
+#       smard_consumption_forecast.fixed.csv "Total (grid load) [MWh]"
+#
+# Both inputs are read in a single pass, matched by Date and Start/Time, and
+# every row is written as soon as it is complete. Every actual row matches
+# one forecast row, so of the hour that autumn has twice, the first matches
+# the first and the second the second. Only the rows of a hole that is
+# waiting for interpolation are held back, so memory does not grow with the
+# size of the files, and neither does it care whether they hold hourly or 15
+# minute data.
+#
+
+import sys
+import csv
+import collections
+
+import run_metrics
+
+run_metrics.setup(sys.argv)
+
+interpolate = False
+
+arguments = []
+for argument in sys.argv:
+    if (argument == "--interpolate"):
+        interpolate = True
+    else:
+        arguments.append(argument)
+
+if (len(arguments) != 5):
+    print("Error: Wrong number of arguments.")
+    print("%s <forecast input csv> <actual input csv or -> <output csv> <column>[,<column>...] "
+          "[--interpolate]" % (arguments[0]))
+    sys.exit()
+
+filename_forecast_input = arguments[1]
+filename_actual_input = arguments[2]
+filename_output = arguments[3]
+columns_fixup = arguments[4].split(",")
+
+#
+# SMARD names the time column Start in some exports, and Time in others.
+#
+def time_column(fieldnames):
+    if ('Start' in fieldnames):
+        return fieldnames.index('Start')
+    return fieldnames.index('Time')
+
+print("Reading forecast data from %s" % filename_forecast_input)
+
+run_metrics.stage("parse")
+file_forecast = open(filename_forecast_input, mode='r')
+reader_forecast = csv.reader(file_forecast)
+fieldnames_forecast = next(reader_forecast)
+forecast_date = fieldnames_forecast.index('Date')
+forecast_time = time_column(fieldnames_forecast)
+
+for column in columns_fixup:
+    if (column not in fieldnames_forecast):
+        print("Error: No column %s in %s." % (column, filename_forecast_input))
+        sys.exit()
+fixup = [fieldnames_forecast.index(column) for column in columns_fixup]
+
+if (filename_actual_input != "-"):
+    print("Reading actual data from %s" % filename_actual_input)
+
+    file_actual = open(filename_actual_input, mode='r')
+    reader_actual = csv.reader(file_actual)
+    fieldnames_actual = next(reader_actual)
+    actual_date = fieldnames_actual.index('Date')
+    actual_time = time_column(fieldnames_actual)
+    actual_columns = [fieldnames_actual.index(column) for column in columns_fixup]
+    actual = next(reader_actual, None)
+else:
+    actual = None
+
+print("Writing fixed forecast data to %s" % filename_output)
+
+file_output = open(filename_output, mode='w')
+writer_output = csv.writer(file_output, lineterminator='\n')
+writer_output.writerow(fieldnames_forecast)
+
+#
+# Rows held back for interpolation, as [row number, row], and per fixed up
+# column the last value before the hole with its row number, and the rows
+# of the hole.
+#
+pending = collections.deque()
+value_last = [None] * len(fixup)
+holes = [[] for column in fixup]
+
+#
+# Write the held back rows up to the first that still has a hole.
+#
+def pending_flush():
+    waiting = [hole[0] for hole in holes if hole]
+    if (waiting):
+        first = min(waiting)
+    else:
+        first = None
+
+    while (pending and ((first == None) or (pending[0][0] < first))):
+        writer_output.writerow(pending.popleft()[1])
+
+#
+# Interpolate the hole of column i up to the value at row number. When the
+# data ends in a hole, it keeps the value before it, when it starts with
+# one, it takes the value after it.
+#
+def hole_fill(i, number, value):
+    if (value_last[i] != None):
+        number_last, last = value_last[i]
+    else:
+        number_last, last = None, value
+
+    rows = dict(pending)
+    for hole in holes[i]:
+        row = rows[hole]
+        if (last == None):
+            print("Not fixing up %s for %s %s, no data" %
+                  (columns_fixup[i], row[forecast_date], row[forecast_time]))
+            continue
+
+        if ((number_last != None) and (number != None)):
+            filled = last + (value - last) * (hole - number_last) / (number - number_last)
+        else:
+            filled = last
+        row[fixup[i]] = "%.2f" % filled
+        print("Interpolated %s for %s %s" % (columns_fixup[i], row[forecast_date], row[forecast_time]))
+
+    holes[i] = []
+
+run_metrics.stage("dispatch")
+number = 0
+for forecast in reader_forecast:
+    date = forecast[forecast_date]
+    time = forecast[forecast_time]
+
+    # the actual data is sorted the same way, so skip ahead to this row.
+    while ((actual != None) and ((actual[actual_date], actual[actual_time]) < (date, time))):
+        actual = next(reader_actual, None)
+    if ((actual != None) and ((actual[actual_date], actual[actual_time]) == (date, time))):
+        matched = actual
+        actual = next(reader_actual, None)
+    else:
+        matched = None
+
+    for i, column in enumerate(fixup):
+        if (forecast[column] == '-'):
+            if ((matched != None) and (matched[actual_columns[i]] != '-')):
+                print("Fixing up %s for %s %s" % (columns_fixup[i], date, time))
+                forecast[column] = matched[actual_columns[i]]
+            elif (interpolate):
+                holes[i].append(number)
+                continue
+            else:
+                print("Not fixing up %s for %s %s, no actual data" % (columns_fixup[i], date, time))
+                continue
+
+        if (holes[i]):
+            hole_fill(i, number, float(forecast[column]))
+        value_last[i] = (number, float(forecast[column]))
+
+    if (pending or any(holes)):
+        pending.append([number, forecast])
+        pending_flush()
+    else:
+        writer_output.writerow(forecast)
+
+    number += 1
+    run_metrics.rows_add(1)
+
+# holes at the end keep the last value.
+for i in range(len(fixup)):
+    if (holes[i]):
+        hole_fill(i, None, None)
+pending_flush()
+
+file_output.close()
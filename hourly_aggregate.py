@@ -0,0 +1,289 @@
+#!/usr/bin/python
+
+#
+# Summaries of every numeric column of a SMARD style hourly csv, by year,
+# month, ISO week, day and hour of the day, in one scan of the data:
+#
+#   ./hourly_aggregate.py smard_consumption.csv consumption_aggregate.csv
+#
+# For every period, the csv holds the number of hours, whether the period
+# is complete, and per column the total, mean, maximum and percentiles
+# (5%, 50% and 95% by default, --percentiles=<percent>,...) of the values.
+# Missing values are left out. A period counts as complete when every
+# column has a value for all of its hours. The hour the clocks skip in
+# spring may be there or not, as for data in UTC.
+#
+# Each row gets the keys of its periods from its epoch hour, and every
+# granularity is a grouped reduction over those keys. The time ordered keys
+# need no sorting for that, only the hour of the day does.
+#
+# A csv with a valid simulation_data.py cache is read from the memory
+# mapped cache instead.
+#
+
+import sys
+import csv
+
+import numpy
+
+import simulation_data
+import run_metrics
+
+granularities = ['year', 'month', 'week', 'day', 'hour']
+percentiles_default = [5.0, 50.0, 95.0]
+
+#
+# The hourly data of a csv, as simulation_data.hourly_csv_read() returns it,
+# and the numeric columns, all but the Date and time columns by default.
+#
+def hourly_read(filename, fieldnames=None):
+    with open(filename, mode='r') as data_file:
+        header = next(csv.reader([data_file.readline()]))
+
+    if ('Start' in header):
+        time_fieldname = 'Start'
+    else:
+        time_fieldname = 'Time'
+
+    if (fieldnames == None):
+        fieldnames = [name for name in header if (name not in ['Date', time_fieldname])]
+
+    if (simulation_data.cache_valid(filename)):
+        data = simulation_data.cache_read(filename, fieldnames)
+        if (data != None):
+            return data, fieldnames
+
+    return simulation_data.hourly_csv_read(filename, time_fieldname, fieldnames), fieldnames
+
+#
+# The key of the period of the given granularity of every epoch hour: years
+# and months since the epoch, the epoch day of the monday of the ISO week,
+# the epoch day, and the hour of the day.
+#
+def time_keys(hours, granularity):
+    days = hours // 24
+
+    if (granularity == 'year'):
+        return days.astype('datetime64[D]').astype('datetime64[Y]').astype(numpy.int64)
+    elif (granularity == 'month'):
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(numpy.int64)
+    elif (granularity == 'week'):
+        # the epoch was a thursday.
+        return days - (days + 3) % 7
+    elif (granularity == 'day'):
+        return days
+    else:
+        return hours % 24
+
+#
+# Names of the periods of the keys of a granularity.
+#
+def key_labels(keys, granularity):
+    if (granularity == 'year'):
+        return [str(year + 1970) for year in keys.tolist()]
+    elif (granularity == 'month'):
+        return numpy.datetime_as_string(keys.astype('datetime64[M]')).tolist()
+    elif (granularity == 'week'):
+        # the ISO year is the one of the thursday.
+        years = (keys + 3).astype('datetime64[D]').astype('datetime64[Y]')
+        weeks = (keys + 3 - years.astype('datetime64[D]').astype(numpy.int64)) // 7 + 1
+        return ["%04d-W%02d" % (year + 1970, week)
+                for year, week in zip(years.astype(numpy.int64).tolist(), weeks.tolist())]
+    elif (granularity == 'day'):
+        return numpy.datetime_as_string(keys.astype('datetime64[D]')).tolist()
+    else:
+        return ["%02d:00" % hour for hour in keys.tolist()]
+
+#
+# Hours in each of the periods of the keys of a granularity. For the hours
+# of the day, that is the number of days the data spans.
+#
+def key_hours(keys, granularity, days_spanned):
+    if (granularity == 'year'):
+        starts = keys.astype('datetime64[Y]')
+        return ((starts + 1).astype('datetime64[D]') - starts.astype('datetime64[D]')).astype(numpy.int64) * 24
+    elif (granularity == 'month'):
+        starts = keys.astype('datetime64[M]')
+        return ((starts + 1).astype('datetime64[D]') - starts.astype('datetime64[D]')).astype(numpy.int64) * 24
+    elif (granularity == 'week'):
+        return numpy.full(len(keys), 168)
+    elif (granularity == 'day'):
+        return numpy.full(len(keys), 24)
+    else:
+        return numpy.full(len(keys), days_spanned)
+
+#
+# Local hours the clocks skip in spring in each of the periods of the keys.
+# For the hours of the day, that is over the days the data spans.
+#
+def key_skipped(keys, granularity, hours):
+    if (len(hours) == 0):
+        return numpy.zeros(len(keys), dtype=numpy.int64)
+
+    if (granularity == 'hour'):
+        first = hours.min() // 24 * 24
+        last = (hours.max() // 24 + 1) * 24
+    else:
+        # whole years, and the weeks that reach into the ones around them.
+        years = numpy.array([hours.min(), hours.max()]).astype('datetime64[h]').astype('datetime64[Y]')
+        first = years[0].astype('datetime64[h]').astype(numpy.int64) - 7 * 24
+        last = (years[1] + 1).astype('datetime64[h]').astype(numpy.int64) + 7 * 24
+
+    skipped_keys = numpy.sort(time_keys(simulation_data.epoch_hours_skipped(first, last), granularity))
+    return numpy.searchsorted(skipped_keys, keys, side='right') - numpy.searchsorted(skipped_keys, keys)
+
+#
+# Group the rows by their keys: the keys of the groups, the order of the
+# rows by group (None if they already are) and the row each group starts
+# at in that order.
+#
+def groups_find(keys):
+    if ((len(keys) > 1) and (numpy.diff(keys) < 0).any()):
+        order = numpy.argsort(keys, kind='stable')
+        keys = keys[order]
+    else:
+        order = None
+
+    starts = numpy.flatnonzero(numpy.diff(keys, prepend=keys[0] - 1))
+    return keys[starts], order, starts
+
+#
+# Number of values, total, mean, maximum and the percentiles of a column
+# for the groups, leaving out missing values. Groups without values get
+# NaN, but for a total and count of 0.
+#
+def group_reduce(values, order, starts, percentiles):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if (order is not None):
+        values = values[order]
+
+    counts = numpy.diff(numpy.append(starts, len(values)))
+    group_index = numpy.repeat(numpy.arange(len(starts)), counts)
+
+    valid = ~numpy.isnan(values)
+    valid_counts = numpy.add.reduceat(valid, starts)
+    totals = numpy.add.reduceat(numpy.where(valid, values, 0.0), starts)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        stats = {'count': valid_counts,
+                 'total': totals,
+                 'mean': totals / valid_counts,
+                 'max': numpy.fmax.reduceat(values, starts)}
+
+    # sorted by group, and by value within a group, with missing values last.
+    ordered = values[numpy.lexsort((values, group_index))]
+    for percentile in percentiles:
+        position = starts + percentile / 100.0 * numpy.maximum(valid_counts - 1, 0)
+        low = numpy.floor(position).astype(numpy.int64)
+        high = numpy.ceil(position).astype(numpy.int64)
+        result = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+        stats[percentile] = numpy.where(valid_counts > 0, result, numpy.nan)
+
+    return stats
+
+#
+# The summaries of all columns for the given granularities: a dict by
+# granularity of the period labels, hours, expected hours, hours skipped in
+# spring and a dict by column of the group_reduce() results.
+#
+def aggregate(data, fieldnames, granularities=granularities, percentiles=percentiles_default):
+    hours = numpy.asarray(data['Hour'])
+    days_spanned = int(hours.max() // 24 - hours.min() // 24 + 1) if (len(hours) > 0) else 0
+
+    results = {}
+    for granularity in granularities:
+        keys, order, starts = groups_find(time_keys(hours, granularity))
+
+        results[granularity] = {'labels': key_labels(keys, granularity),
+                                'hours': numpy.diff(numpy.append(starts, len(hours))),
+                                'hours_expected': key_hours(keys, granularity, days_spanned),
+                                'hours_skipped': key_skipped(keys, granularity, hours),
+                                'columns': {}}
+        for name in fieldnames:
+            results[granularity]['columns'][name] = group_reduce(data[name], order, starts, percentiles)
+
+    return results
+
+#
+# Whether the periods are complete: whether the column, or every column,
+# has a value for each of their hours, but for those skipped in spring.
+#
+def periods_complete(result, name=None):
+    if (name == None):
+        complete = numpy.ones(len(result['labels']), dtype=bool)
+        for name in result['columns']:
+            complete &= periods_complete(result, name)
+        return complete
+
+    return result['columns'][name]['count'] >= (result['hours_expected'] - result['hours_skipped'])
+
+def stat_fieldname(name, stat):
+    if (isinstance(stat, float)):
+        return "%s P%g" % (name, stat)
+    return "%s %s" % (name, stat.capitalize())
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    percentiles = percentiles_default
+    selected = granularities
+
+    arguments = []
+    for argument in sys.argv:
+        if (argument.startswith("--percentiles=")):
+            percentiles = [float(percent) for percent in argument[len("--percentiles="):].split(",")]
+        elif (argument.startswith("--by=")):
+            selected = argument[len("--by="):].split(",")
+        else:
+            arguments.append(argument)
+
+    if (len(arguments) != 3):
+        print("Error: Wrong number of arguments.")
+        print("%s <hourly csv> <result csv> [--by=<granularity>[,<granularity>...]] "
+              "[--percentiles=<percent>[,<percent>...]]" % (arguments[0]))
+        sys.exit()
+
+    for granularity in selected:
+        if (granularity not in granularities):
+            print("Error: Unknown granularity %s, use any of %s." % (granularity, ",".join(granularities)))
+            sys.exit()
+
+    filename_input = arguments[1]
+    filename_output = arguments[2]
+
+    print("Reading data from %s" % filename_input)
+    run_metrics.stage("parse")
+    data, fieldnames = hourly_read(filename_input)
+    run_metrics.rows_add(len(data['Hour']))
+
+    run_metrics.stage("dispatch")
+    results = aggregate(data, fieldnames, selected, percentiles)
+
+    print("Aggregated %d hours of %d columns by %s." % (len(data['Hour']), len(fieldnames), ", ".join(selected)))
+
+    print("Writing data to %s" % filename_output)
+    run_metrics.stage("report")
+
+    stats = ['count', 'total', 'mean', 'max'] + percentiles
+    with open(filename_output, mode='w') as csv_file:
+        csv_writer = csv.writer(csv_file, lineterminator='\n')
+        csv_writer.writerow(['Granularity', 'Period', 'Hours', 'Complete'] +
+                            [stat_fieldname(name, stat) for name in fieldnames for stat in stats])
+
+        for granularity in selected:
+            result = results[granularity]
+            complete = periods_complete(result)
+
+            columns = []
+            for name in fieldnames:
+                for stat in stats:
+                    columns.append(numpy.round(result['columns'][name][stat], 3).tolist())
+
+            for i, label in enumerate(result['labels']):
+                csv_writer.writerow([granularity, label, int(result['hours'][i]), int(complete[i])] +
+                                    [column[i] for column in columns])
+
+            partial = [label for label, whole in zip(result['labels'], complete.tolist()) if (not whole)]
+            if ((granularity != 'hour') and partial):
+                print("%d partial %s periods: %s%s" % (len(partial), granularity, ", ".join(partial[0:5]),
+                                                       ", ..." if (len(partial) > 5) else ""))
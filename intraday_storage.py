@@ -1,9 +1,39 @@
 #!/usr/bin/python
 
-import csv
+#
+# Storage needed to flatten the load of every day in smard_consumption.csv,
+# and what the largest of those would cost in batteries.
+#
+# The storage is the area above the average of the day, or with
+# --exact[=<round trip efficiency>], what a store needs to flatten the
+# load of the day, and the power it needs. See storage_windows.py.
+#
 
-day = 0
-intraday = []
+import sys
+
+import numpy
+
+import simulation_data
+import storage_windows
+import run_metrics
+
+run_metrics.setup(sys.argv)
+
+efficiency = None
+
+arguments = []
+for argument in sys.argv:
+    if (argument == "--exact"):
+        efficiency = 1.0
+    elif (argument.startswith("--exact=")):
+        efficiency = float(argument[len("--exact="):])
+    else:
+        arguments.append(argument)
+
+if (len(arguments) != 1):
+    print("Error: Wrong number of arguments.")
+    print("%s [--exact[=<round trip efficiency>]]" % (arguments[0]))
+    sys.exit()
 
 storage_max = 0
 storage_max_day = ''
@@ -31,45 +61,48 @@ battery_cost_serverrack = 286000
 # Eve LF-280K, 5000+ pieces, delivered with customs to germany: 93.80EUR
 battery_cost_raw_cells = 104687
 
-with open('smard_consumption.csv', mode='r') as csv_file:
-    csv_reader = csv.DictReader(csv_file)
-    for row in csv_reader:
-        new_day = row['Date']
-
-        load = row['Total (grid load) [MWh]']
-        if (load == '-'):
-            break
-        load = float(load)
-
-        if (new_day == day):
-            intraday.append(load)
-            continue
-
-        if (day):
-            total = sum(intraday)
-            average = total / 24
-
-            storage = 0
-            for value in intraday:
-                # Compared to average, only one side is needed
-                if (value > average):
-                    storage += value - average
-
-            storage_hours = storage / average
-
-            if (storage_max < storage):
-                storage_max = storage
-                storage_max_day = day
-                storage_max_hours = storage_hours
-
-            print("%s: %5.2fMW / %7.2fMWh : %06.2fMWh needed (%1.2fh)" %
-                  (day, average, total, storage, storage_hours))
-
-        day = new_day
-        intraday = [load]
-
+run_metrics.stage("parse")
+data = simulation_data.hourly_csv_read('smard_consumption.csv', 'Time', ['Total (grid load) [MWh]'])
+load = data['Total (grid load) [MWh]']
+
+missing = numpy.flatnonzero(numpy.isnan(load))
+if (len(missing) > 0):
+    load = load[:missing[0]]
+days = data['Hour'][:len(load)] // 24
+dates, times = simulation_data.epoch_hour_strings(data['Hour'][:len(load)])
+run_metrics.rows_add(len(load))
+
+run_metrics.stage("dispatch")
+starts = numpy.flatnonzero(numpy.diff(days, prepend=-1))
+lengths = numpy.diff(starts, append=len(load))
+if (efficiency == None):
+    totals, averages, storages = storage_windows.window_storage(load, starts, lengths)
+    powers = None
+else:
+    totals, averages, storages, powers = storage_windows.window_storage_exact(load, starts, lengths,
+                                                                              efficiency)
+
+for i in range(len(starts)):
+    day = dates[starts[i]]
+    storage_hours = storages[i] / averages[i]
+
+    if (storage_max < storages[i]):
+        storage_max = storages[i]
+        storage_max_day = day
+        storage_max_hours = storage_hours
+
+    if (powers is None):
+        print("%s: %5.2fMW / %7.2fMWh : %06.2fMWh needed (%1.2fh)" %
+              (day, averages[i], totals[i], storages[i], storage_hours))
+    else:
+        print("%s: %5.2fMW / %7.2fMWh : %06.2fMWh needed (%1.2fh), %5.2fMW" %
+              (day, averages[i], totals[i], storages[i], storage_hours, powers[i]))
+
+run_metrics.stage("report")
 print("")
 print("Maximum intra-day storage needed:  %6.2fMWh (%s, %1.2fh)" % (storage_max, storage_max_day, storage_max_hours))
+if (powers is not None):
+    print("Maximum intra-day storage power needed:  %6.2fMW (%s)" % (powers.max(), dates[starts[powers.argmax()]]))
 
 print("  Pumped Hydro Storage available: %6.2fMWh (%6.2fMWh@%.2f%% efficiency)" % (storage_pumped * storage_pumped_efficiency, storage_pumped, storage_pumped_efficiency))
 
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+
+#
+# LiFePO4 degradation and battery prices, as used by lifepo4_grid_storage.py
+# and battery_rainflow.py.
+#
+# Energy is in MWh, and the costs of a capacity come out in thousands of
+# EUR, so that cost * 1000 / MWh cycled is EUR per MWh.
+#
+
+import numpy
+
+#
+# https://www.powertechsystems.eu/home/tech-corner/lithium-iron-phosphate-lifepo4/
+# has a chart which estimates the number of cycles a lifepo4 battery has compared
+# to depth of discharge.
+#
+# We assume that .25C is a good enough charge/discharge rate for 10s of GWh scale grid level storage.
+#
+# The values were manually guesstimated from the chart.
+#
+dod_cycles = {100:    6000.0,
+               95:    6700.0,
+               90:    7000.0,
+               85:    8000.0,
+               80:    8900.0,
+               75:   10000.0,
+               70:   13000.0,
+               65:   16000.0,
+               60:   19000.0,
+               55:   24000.0,
+               50:   31000.0,
+               45:   40000.0,
+               40:   52000.0,
+               35:   73000.0,
+               30:  100000.0,
+               25:  160000.0,
+               20:  240000.0,
+               15:  370000.0,
+               10:  650000.0,
+                5: 1000000.0} # guess, no more data
+
+#
+# After 6000.0 100% cycles the battery will have degraded to 80% original capacity.
+#
+# So 20 divided by each value is a very rough estimate for the percentage that
+# a lifepo4 battery degrades for each depth of discharge.
+#
+# The loss is looked up by dod / 5, a 0% DoD loses nothing.
+#
+dod_loss = numpy.zeros(21)
+for dod in dict.keys(dod_cycles):
+    dod_loss[dod // 5] = 20.0 / float(dod_cycles[dod])
+
+#
+# Depth of discharge percentages rounded up to the 5% steps of dod_cycles.
+#
+def dod_step(percentage):
+    dod = 5 * numpy.floor(percentage / 5)
+    return numpy.where(dod < percentage, dod + 5, dod)
+
+# Status 20230831: https://www.tesla.com/megapack/design
+capacity_known_tesla = 3854400.0 # kWh
+cost_known_tesla = 1593272170.0 # usd
+usd_to_eur = 0.92
+# annual maintenance cost $4,966,480
+# price escalates at 2% per year
+maintenance_cost_tesla = 4966480
+maintenance_cost_increase_tesla = .02
+cost_per_kwh_tesla = cost_known_tesla * usd_to_eur / capacity_known_tesla
+
+# Status 20230829: https://www.gobelpower.com/gobel-power-gpsr1pc200-512v-280ah-lifepo4-battery_p114.html
+capacity_known_rack = 51.2 * .28 # kWh
+cost_known_rack = 2431.0 # eur
+cost_per_kwh_rack = cost_known_rack / capacity_known_rack
+
+# Status 20230831: https://qiso.en.alibaba.com/
+# Eve LF-280K, 500+ pieces, delivered from within the EU: 73.02EUR
+capacity_known_raw = 3.2 * .28 # kWh
+cost_known_raw = 73.02 # eur
+cost_per_kwh_raw = cost_known_raw / capacity_known_raw
+
+#
+# The cost inputs above, and how much each can be off, as the low and high
+# end of a triangular distribution around them, for Monte Carlo runs.
+# cycle_life scales the number of cycles in dod_cycles.
+#
+cost_inputs = {'cost_known_tesla': cost_known_tesla,
+               'usd_to_eur': usd_to_eur,
+               'maintenance_cost_increase_tesla': maintenance_cost_increase_tesla,
+               'cost_known_rack': cost_known_rack,
+               'cost_known_raw': cost_known_raw,
+               'cycle_life': 1.0}
+
+cost_inputs_spread = {'cost_known_tesla': (0.85 * cost_known_tesla, 1.15 * cost_known_tesla),
+                      'usd_to_eur': (0.85, 1.00),
+                      'maintenance_cost_increase_tesla': (0.0, 0.05),
+                      'cost_known_rack': (0.80 * cost_known_rack, 1.25 * cost_known_rack),
+                      'cost_known_raw': (0.70 * cost_known_raw, 1.30 * cost_known_raw),
+                      'cycle_life': (0.6, 1.4)}
+
+#
+# count samples of each of the cost inputs.
+#
+def cost_inputs_sample(generator, count):
+    samples = {}
+    for name, value in cost_inputs.items():
+        low, high = cost_inputs_spread[name]
+        samples[name] = generator.triangular(low, value, high, count)
+    return samples
+
+#
+# Megapack maintenance of the capacities over the years, the sum of the
+# geometric series of the yearly cost. All arguments may be arrays.
+#
+def maintenance_tesla(capacity, years, usd_to_eur=usd_to_eur,
+                      maintenance_cost_increase_tesla=maintenance_cost_increase_tesla):
+    maintenance_cost_base = (maintenance_cost_tesla * usd_to_eur / capacity_known_tesla * capacity)
+
+    growth = 1 + numpy.asarray(maintenance_cost_increase_tesla, dtype=numpy.float64)
+    flat = (growth == 1.0)
+    factor = numpy.where(flat, years, (growth ** years - 1) / numpy.where(flat, 1.0, growth - 1))
+    return maintenance_cost_base * factor
+
+#
+# EUR per MWh cycled of Megapacks, server rack batteries and raw cells of
+# the capacities, which cycle volume MWh over the years. inputs replaces
+# the cost inputs, with single values or arrays of samples.
+#
+def cost_per_mwh_cycled(capacity, years, volume, inputs=cost_inputs):
+    cost_per_kwh_tesla = inputs['cost_known_tesla'] * inputs['usd_to_eur'] / capacity_known_tesla
+    maintenance = maintenance_tesla(capacity, years, inputs['usd_to_eur'],
+                                    inputs['maintenance_cost_increase_tesla'])
+
+    tesla = (cost_per_kwh_tesla * capacity + maintenance) * 1000 / volume
+    rack = inputs['cost_known_rack'] / capacity_known_rack * capacity * 1000 / volume
+    raw = inputs['cost_known_raw'] / capacity_known_raw * capacity * 1000 / volume
+    return tesla, rack, raw
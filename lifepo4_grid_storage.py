@@ -8,77 +8,95 @@
 #
 # Finally, it produces a cost analysis based on some 3 existing batteries.
 #
+# Capacity and life years each also take a comma separated list, or a
+# start:stop:step range, as for simulate_sweep.py. All combinations are then
+# run side by side, in one pass over the days, and the result is a table of
+# the cost per MWh cycled of each:
+#
+#   ./lifepo4_grid_storage.py consumption_cycles.csv 10:500:10 10,20
+#
+# With --samples=<count>, the costs are a Monte Carlo estimate instead: each
+# scenario is run with count samples of the battery prices, the exchange
+# rate, the maintenance cost increase and the cycle life (see
+# lifepo4_battery.py), all side by side, and the result is a table of the
+# 5%, 50% and 95% percentiles of the cost per MWh cycled. --seed=<number>
+# picks other samples.
+#
 
 import sys
 import csv
-from decimal import Decimal
+
+import numpy
+
+import simulate_sweep
+import lifepo4_battery
+import run_metrics
+
+run_metrics.setup(sys.argv)
 
 verbose = False
+samples = None
+seed = 1
+
+arguments = []
+for argument in sys.argv:
+    if (argument.startswith("--samples=")):
+        samples = int(argument[len("--samples="):])
+    elif (argument.startswith("--seed=")):
+        seed = int(argument[len("--seed="):])
+    else:
+        arguments.append(argument)
+sys.argv = arguments
 
 if (len(sys.argv) != 4):
     print("Error: Wrong number of arguments.")
-    print("%s <daily consumption csv> <capacity GWh> <life years>" % (sys.argv[0]))
+    print("%s <daily consumption csv> <capacity GWh>[,...|start:stop:step] <life years>[,...|start:stop:step] "
+          "[--samples=<count> [--seed=<number>]]" % (sys.argv[0]))
     sys.exit()
 
 consumption_filename = sys.argv[1]
-capacity_original = float(sys.argv[2]) * 1000.0
-duration = int(sys.argv[3])
 
-capacity = capacity_original
-volume_total = 0.0
-days = 0
-days_short = 0
-years = 0
+# every capacity with every life time, as arrays with a value per scenario.
+capacities, durations = numpy.meshgrid(numpy.array(simulate_sweep.parameter_range(sys.argv[2])) * 1000.0,
+                                       numpy.array(simulate_sweep.parameter_range(sys.argv[3]), dtype=int),
+                                       indexing='ij')
+capacity_original = capacities.flatten()
+duration = durations.flatten()
+scenarios = len(capacity_original)
 
-#
-# https://www.powertechsystems.eu/home/tech-corner/lithium-iron-phosphate-lifepo4/
-# has a chart which estimates the number of cycles a lifepo4 battery has compared
-# to depth of discharge.
-#
-# We assume that .25C is a good enough charge/discharge rate for 10s of GWh scale grid level storage.
-#
-# The values were manually guesstimated from the chart.
-#
-dod_cycles = {100:    6000.0,
-               95:    6700.0,
-               90:    7000.0,
-               85:    8000.0,
-               80:    8900.0,
-               75:   10000.0,
-               70:   13000.0,
-               65:   16000.0,
-               60:   19000.0,
-               55:   24000.0,
-               50:   31000.0,
-               45:   40000.0,
-               40:   52000.0,
-               35:   73000.0,
-               30:  100000.0,
-               25:  160000.0,
-               20:  240000.0,
-               15:  370000.0,
-               10:  650000.0,
-                5: 1000000.0} # guess, no more data
+# the cost inputs, and the batteries of every scenario, with a column per
+# cycle life. Only the cycle life changes how the batteries degrade, and it
+# does so smoothly, so the samples are interpolated from a range of them.
+if (samples != None):
+    cost_inputs = lifepo4_battery.cost_inputs_sample(numpy.random.default_rng(seed), samples)
+    cycle_life = numpy.linspace(*lifepo4_battery.cost_inputs_spread['cycle_life'], 41)
+else:
+    cost_inputs = lifepo4_battery.cost_inputs
+    cycle_life = numpy.ones(1)
 
-#
-# After 6000.0 100% cycles the battery will have degraded to 80% original capacity.
-#
-# So 20 divided by each value is a very rough estimate for the percentage that
-# a lifepo4 battery degrades for each depth of discharge.
-#
-for dod in dict.keys(dod_cycles):
-    if (verbose == True):
-        print("%3s%% DoD: %f%% capacity loss" % (dod, 20.0 / float(dod_cycles[dod])))
-    dod_cycles[dod] = 20.0 / float(dod_cycles[dod])
+capacity = numpy.repeat(capacity_original[:, None], len(cycle_life), axis=1)
+volume_total = numpy.zeros(capacity.shape)
+days_short = numpy.zeros(capacity.shape, dtype=int)
+
+if (verbose == True):
+    for dod in dict.keys(lifepo4_battery.dod_cycles):
+        print("%3s%% DoD: %f%% capacity loss" % (dod, 20.0 / float(lifepo4_battery.dod_cycles[dod])))
 
 print("")
-print("Analysing the effect of %4.2fGWh of grid scale battery storage over a period of %d years..." %
-      (capacity_original / 1000.0, duration))
+if ((scenarios == 1) and (samples == None)):
+    print("Analysing the effect of %4.2fGWh of grid scale battery storage over a period of %d years..." %
+          (capacity_original[0] / 1000.0, duration[0]))
+else:
+    print("Analysing the effect of %d sizes of grid scale battery storage over %d periods of years..." %
+          (len(capacities), len(durations[0])))
+if (samples != None):
+    print("Sampling %d costs and cycle lives for each." % (samples))
 print("")
 
 #
 # Calculates depth-of-discharge, keeps track of volume shifted, and
-# then degrades the battery capacity accordingly.
+# then degrades the battery capacity accordingly, for all scenarios and
+# samples.
 #
 def cycle(date, cycle_volume):
     global capacity
@@ -94,53 +112,138 @@ def cycle(date, cycle_volume):
     # https://electrek.co/2022/09/14/tesla-megapack-update-specs-price/
     cycle_percentage = 100.0 * cycle_volume / (capacity * 0.95)
 
-    dod = 5 * int(cycle_percentage / 5)
-    if (dod < cycle_percentage):
-        dod += 5
+    dod = lifepo4_battery.dod_step(cycle_percentage)
 
-    missing = 0.0
-    if (dod > 100.0):
-        missing = cycle_volume - (capacity * 0.95)
-        days_short += 1
-        dod = 100.0
+    short = (dod > 100.0)
+    missing = numpy.where(short, cycle_volume - (capacity * 0.95), 0.0)
+    days_short += short
+    dod = numpy.minimum(dod, 100.0)
 
     volume_total += cycle_volume - missing
 
-    reduction = dod_cycles[dod]
-    capacity -= reduction * capacity_original / 100.0
+    reduction = lifepo4_battery.dod_loss[(dod // 5).astype(int)] / cycle_life
+    capacity -= reduction * capacity_original[:, None] / 100.0
 
     if (verbose == False):
         return
 
-    if (cycle_percentage > 100.0):
-        print("%s: %9.2fMWh: %6.2f%% cycle : %4.2fGWh capacity remaining (%2.2fMWh short)" %
-              (date, cycle_volume, cycle_percentage, capacity / 1000.0, missing))
-    else:
-        print("%s: %9.2fMWh: %6.2f%% cycle : %4.2fGWh capacity remaining" %
-              (date, cycle_volume, cycle_percentage, capacity / 1000.0))
+    for i in range(scenarios):
+        if (cycle_percentage[i, 0] > 100.0):
+            print("%s: %9.2fMWh: %6.2f%% cycle : %4.2fGWh capacity remaining (%2.2fMWh short)" %
+                  (date, cycle_volume, cycle_percentage[i, 0], capacity[i, 0] / 1000.0, missing[i, 0]))
+        else:
+            print("%s: %9.2fMWh: %6.2f%% cycle : %4.2fGWh capacity remaining" %
+                  (date, cycle_volume, cycle_percentage[i, 0], capacity[i, 0] / 1000.0))
+
+run_metrics.stage("parse")
+with open(consumption_filename, mode='r') as consumption_file:
+    consumption_reader = csv.DictReader(consumption_file)
+    consumption = [(row['Date'], float(row['Storage Cycle [MWh]'])) for row in consumption_reader]
+
+run_metrics.stage("dispatch")
+
+#
+# Cycles through the available consumption data until the longest requested
+# number of years is reached. The state of every scenario is kept at the end
+# of its number of years.
+#
+result_capacity = numpy.zeros(capacity.shape)
+result_volume_total = numpy.zeros(capacity.shape)
+result_days_short = numpy.zeros(capacity.shape, dtype=int)
+result_days = numpy.zeros(scenarios, dtype=int)
+
+days = 0
+years = 0
+while (years < duration.max()):
+    for date, cycle_volume in consumption:
+        if (date.endswith("-01-01") and (scenarios == 1) and (samples == None)):
+            print("year %2d: using data from %s..." % (years, date[0:4]))
+
+        cycle(date, cycle_volume)
+        run_metrics.rows_add(1)
+
+        days += 1
+        if (date.endswith("-12-31")):
+            years += 1
+
+            done = (duration == years)
+            result_capacity[done] = capacity[done]
+            result_volume_total[done] = volume_total[done]
+            result_days_short[done] = days_short[done]
+            result_days[done] = days
+
+            if (years >= duration.max()):
+                break
+
+capacity = result_capacity
+volume_total = result_volume_total
+days_short = result_days_short
+days = result_days
+years = duration
+
+run_metrics.stage("report")
+
+if (samples != None):
+    capacity = numpy.array([numpy.interp(cost_inputs['cycle_life'], cycle_life, capacity[i])
+                            for i in range(scenarios)])
+    volume_total = numpy.array([numpy.interp(cost_inputs['cycle_life'], cycle_life, volume_total[i])
+                                for i in range(scenarios)])
+
+    tesla, rack, raw = lifepo4_battery.cost_per_mwh_cycled(capacity_original[:, None], duration[:, None],
+                                                           volume_total, cost_inputs)
+    percentiles = [5, 50, 95]
+
+    print("Capacity   Years   Degraded to    Cost per MWh cycled [EUR], 5%, 50% and 95% percentiles")
+    print("   [GWh]           [GWh, 50%]          Megapack           Server rack             Raw cells")
+    for i in range(scenarios):
+        print("%8.2f   %5d %9.2f (%5.2f%%) %s  %s  %s" %
+              (capacity_original[i] / 1000.0, years[i], numpy.median(capacity[i]) / 1000.0,
+               100.0 * numpy.median(capacity[i]) / capacity_original[i],
+               " ".join(["%6.2f" % value for value in numpy.percentile(tesla[i], percentiles)]),
+               " ".join(["%6.2f" % value for value in numpy.percentile(rack[i], percentiles)]),
+               " ".join(["%6.2f" % value for value in numpy.percentile(raw[i], percentiles)])))
+    sys.exit()
+
+capacity = capacity[:, 0]
+volume_total = volume_total[:, 0]
+days_short = days_short[:, 0]
 
 #
-# Cycles through the available consumption data until the requested number
-# of years is reached.
+# Costs of the three batteries, for every scenario.
 #
-while True:
-    with open(consumption_filename, mode='r') as consumption_file:
-        consumption_reader = csv.DictReader(consumption_file)
-        for consumption in consumption_reader:
-            date = consumption['Date']
+cost_total_tesla = lifepo4_battery.cost_per_kwh_tesla * capacity_original
+maintenance_cost_tesla_total = lifepo4_battery.maintenance_tesla(capacity_original, duration)
+cost_per_kwh_delivered_tesla = (cost_total_tesla + maintenance_cost_tesla_total) * 100 / volume_total
 
-            if (date.endswith("-01-01")):
-                print("year %2d: using data from %s..." % (years, date[0:4]))
+cost_total_rack = lifepo4_battery.cost_per_kwh_rack * capacity_original
+cost_per_kwh_delivered_rack = cost_total_rack * 100 / volume_total
 
-            cycle(date, float(consumption['Storage Cycle [MWh]']))
+cost_total_raw = lifepo4_battery.cost_per_kwh_raw * capacity_original
+cost_per_kwh_delivered_raw = cost_total_raw * 100 / volume_total
+
+if (scenarios > 1):
+    print("Capacity   Years   Cycled    Short   Degraded to    Cost per MWh cycled [EUR]")
+    print("   [GWh]            [GWh]   [days]      [GWh]      Megapack  Server rack  Raw cells")
+    for i in range(scenarios):
+        print("%8.2f   %5d %9.2f   %6d   %7.2f (%5.2f%%) %9.2f  %11.2f  %9.2f" %
+              (capacity_original[i] / 1000.0, years[i], volume_total[i] / 1000.0, days_short[i],
+               capacity[i] / 1000.0, 100.0 * capacity[i] / capacity_original[i],
+               cost_per_kwh_delivered_tesla[i] * 10, cost_per_kwh_delivered_rack[i] * 10,
+               cost_total_raw[i] * 1000 / volume_total[i]))
+    sys.exit()
 
-            days += 1
-            if (date.endswith("-12-31")):
-                years += 1
-                if (years >= duration):
-                    break
-    if (years >= duration):
-        break
+# the report of a single scenario.
+capacity_original = capacity_original[0]
+duration = duration[0]
+capacity = capacity[0]
+volume_total = volume_total[0]
+days_short = days_short[0]
+days = days[0]
+years = years[0]
+maintenance_cost_tesla_total = maintenance_cost_tesla_total[0]
+cost_per_kwh_delivered_tesla = cost_per_kwh_delivered_tesla[0]
+cost_per_kwh_delivered_rack = cost_per_kwh_delivered_rack[0]
+cost_per_kwh_delivered_raw = cost_per_kwh_delivered_raw[0]
 
 print("")
 
@@ -164,77 +267,49 @@ print("")
 print("Cost analysis...")
 print("")
 
-# Status 20230831: https://www.tesla.com/megapack/design
 print("Tesla Megapacks (LiFePO4, 2022): status 20230831")
-capacity_known = 3854400.0 # kWh
-cost_known = 1593272170.0 # usd
-usd_to_eur = 0.92
-# annual maintenance cost $4,966,480
-# price escalates at 2% per year
 print("\tInstalling 1000 4h duration Megapacks (%.2fMWh) costs %.2fM usd." %
-      (capacity_known / 1000.0, cost_known / 1000000.0))
-cost_per_kwh_tesla = cost_known * usd_to_eur / capacity_known
+      (lifepo4_battery.capacity_known_tesla / 1000.0, lifepo4_battery.cost_known_tesla / 1000000.0))
 print("\tThe cost per GWh is %5.2fM EUR." %
-      (cost_per_kwh_tesla))
-cost_total = cost_per_kwh_tesla * capacity_original
+      (lifepo4_battery.cost_per_kwh_tesla))
 print("\t%5.2fGWh of grid level storage costs %2.2fB EUR." %
-      (capacity_original / 1000.0, cost_total / 1000000.0))
-maintenance_cost_tesla = 4966480
-maintenance_cost_increase_tesla = .02
+      (capacity_original / 1000.0, cost_total_tesla[0] / 1000000.0))
 print("\tMaintaining 1000 Megapacks costs %1.2fM usd yearly, with an increase of %1.1f%% per year." %
-      (maintenance_cost_tesla / 1000000.0, maintenance_cost_increase_tesla * 100))
-maintenance_cost_base = (maintenance_cost_tesla * usd_to_eur / capacity_known * capacity_original)
-maintenance_cost_tesla_total = 0.0
-for year in range(0, duration):
-    maintenance_cost_tesla_total += (maintenance_cost_base * ((1 + maintenance_cost_increase_tesla) ** year))
+      (lifepo4_battery.maintenance_cost_tesla / 1000000.0, lifepo4_battery.maintenance_cost_increase_tesla * 100))
 print("\tMaintaining %5.2fGWh over %d years costs %3.2fM EUR in maintenance" %
       (capacity_original / 1000.0, duration, maintenance_cost_tesla_total / 1000))
-cost_per_kwh_delivered_tesla = (cost_total + maintenance_cost_tesla_total) * 100 / volume_total
 print("\tOver %d years, the cost per MWh cycled is %3.2fEUR, or %3.2fcents per kWh." %
       (years, cost_per_kwh_delivered_tesla * 10, cost_per_kwh_delivered_tesla))
 print("")
 
 
-# Status 20230829: https://www.gobelpower.com/gobel-power-gpsr1pc200-512v-280ah-lifepo4-battery_p114.html
-capacity_known = 51.2 * .28 # kWh
-cost_known = 2431.0 # eur
-print("Server rack batteries (Gobel Power, %.3fkWh): status 20230829" % capacity_known)
+print("Server rack batteries (Gobel Power, %.3fkWh): status 20230829" % lifepo4_battery.capacity_known_rack)
 print("\tA single %2.2fkWh server rack battery costs %.2fk EUR, when bought online in china." %
-      (capacity_known, cost_known / 1000.0))
-cost_per_kwh_rack = cost_known / capacity_known
+      (lifepo4_battery.capacity_known_rack, lifepo4_battery.cost_known_rack / 1000.0))
 print("\tThe cost per GWh is %5.2fM EUR." %
-      (cost_per_kwh_rack))
-cost_total = cost_per_kwh_rack * capacity_original
+      (lifepo4_battery.cost_per_kwh_rack))
 print("\t%5.2fGWh of grid level storage costs %2.2fB EUR." %
-      (capacity_original / 1000.0, cost_total / 1000000.0))
-cost_per_kwh_delivered_rack = cost_total * 100 / volume_total
+      (capacity_original / 1000.0, cost_total_rack[0] / 1000000.0))
 print("\tOver %d years, the cost per MWh cycled is %3.2fEUR, or %3.2fcents per kWh." %
       (years, cost_per_kwh_delivered_rack * 10, cost_per_kwh_delivered_rack))
 print("")
 
-# Status 20230831: https://qiso.en.alibaba.com/
-# Eve LF-280K, 500+ pieces, delivered from within the EU: 73.02EUR
-capacity_known = 3.2 * .28 # kWh
-cost_known = 73.02 # eur
 print("Raw LiFePO4 cells (Eve LF-280k, 280Ah, from Qiso): status 20230831")
 print("\tA single %3.2fWh raw LiFePO4 cell costs %.2f EUR, for a minimum of 500 units, shipped from within the EU." %
-      (capacity_known * 1000.0, cost_known))
-cost_per_kwh_raw = cost_known / capacity_known
+      (lifepo4_battery.capacity_known_raw * 1000.0, lifepo4_battery.cost_known_raw))
 print("\tThe cost per GWh is %5.2fM EUR." %
-      (cost_per_kwh_raw))
-cost_total = cost_per_kwh_raw * capacity_original
+      (lifepo4_battery.cost_per_kwh_raw))
 print("\t%5.2fGWh of grid level storage costs %2.2fB EUR." %
-      (capacity_original / 1000.0, cost_total / 1000000.0))
-cost_per_kwh_delivered_raw = cost_total * 100 / volume_total
+      (capacity_original / 1000.0, cost_total_raw[0] / 1000000.0))
 print("\tOver %d years, the cost per MWh cycled is %3.2fEUR, or %3.2fcents per kWh." %
-      (years, cost_total * 1000 / volume_total, cost_total * 100 / volume_total))
+      (years, cost_total_raw[0] * 1000 / volume_total, cost_total_raw[0] * 100 / volume_total))
 
 print("")
 print("While the server rack batteries and raw cells might at first not seem relevant,")
 print("their overal cost and cost per kWh cycled are good future cost datapoints.")
 print("")
 print("Tesla Megapacks are sold out 2 years into the future, and the margins are going")
-print("to be enormous. Yet they still only cost %3.2fEUR per kWh of storage, or" % (cost_per_kwh_tesla))
+print("to be enormous. Yet they still only cost %3.2fEUR per kWh of storage, or" % (lifepo4_battery.cost_per_kwh_tesla))
 print("%3.2fcents per kWh delivered for a %5.2fGWh install over %d years." %
       (cost_per_kwh_delivered_tesla, capacity_original / 1000.0, duration))
 print("")
@@ -245,7 +320,7 @@ print("")
 print("Raw LiFePO4 cells are astoundingly good value, even with customs and shipping to")
 print("germany included. And yet, the actual price, today, for manufacturing such cells is")
 print("going to be half still. At %5.2fEUR per kWh of capacity, and a cycle cost of %3.2fcents"
-      % (cost_per_kwh_raw, cost_per_kwh_delivered_raw))
+      % (lifepo4_battery.cost_per_kwh_raw, cost_per_kwh_delivered_raw))
 print("per kWh delivered, it is where the cost of grid level storage will be, all in,")
 print("several years in the future, when supply matches demand more closely.")
 
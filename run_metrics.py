@@ -0,0 +1,126 @@
+#
+# Run metrics for the analysis scripts.
+#
+# A script calls setup() with its sys.argv first thing, which takes the
+# following options out of sys.argv:
+#
+#   --profile[=<jsonl file>]   append a record of this run to the file,
+#                              run_metrics.jsonl by default.
+#   --cprofile=<file>          also dump cProfile statistics to the file,
+#                              for use with pstats or snakeviz.
+#
+# Then stage("parse"), stage("dispatch"), ... mark where each stage of the
+# script starts, which also ends the previous stage, and rows_add() counts
+# the rows a script processed. The record is written when the script exits:
+#
+#   {"script": "simulate.py", "argv": [...], "start": "2023-09-05T12:00:00",
+#    "wall": 0.31, "stages": {"setup": 0.01, "parse": 0.02, ...},
+#    "rows": 140328, "rows_per_second": 452670.9,
+#    "peak_rss_kb": 81234, "peak_rss_children_kb": 0}
+#
+# Without --profile, stage() and rows_add() do nothing but return.
+#
+
+import os
+import json
+import time
+import atexit
+import resource
+import datetime
+
+enabled = False
+metrics_filename = "run_metrics.jsonl"
+cprofile_filename = None
+profiler = None
+
+time_start = 0.0
+time_stage = 0.0
+stage_name = None
+stages = {}
+rows = 0
+argv = []
+
+def setup(arguments):
+    global enabled
+    global metrics_filename
+    global cprofile_filename
+    global profiler
+    global time_start
+    global time_stage
+    global stage_name
+    global argv
+
+    remaining = []
+    for argument in arguments:
+        if (argument == "--profile"):
+            enabled = True
+        elif (argument.startswith("--profile=")):
+            enabled = True
+            metrics_filename = argument[len("--profile="):]
+        elif (argument.startswith("--cprofile=")):
+            enabled = True
+            cprofile_filename = argument[len("--cprofile="):]
+        else:
+            remaining.append(argument)
+    arguments[:] = remaining
+
+    if (not enabled):
+        return
+
+    argv = list(remaining)
+    time_start = time.time()
+    time_stage = time.perf_counter()
+    stage_name = "setup"
+
+    if (cprofile_filename != None):
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    atexit.register(finish)
+
+#
+# End the current stage, and start the named one. Stages that are entered
+# more than once accumulate their time.
+#
+def stage(name):
+    global time_stage
+    global stage_name
+
+    if (not enabled):
+        return
+
+    now = time.perf_counter()
+    stages[stage_name] = stages.get(stage_name, 0.0) + (now - time_stage)
+    time_stage = now
+    stage_name = name
+
+def rows_add(count):
+    global rows
+
+    if (not enabled):
+        return
+
+    rows += count
+
+def finish():
+    stage(None)
+
+    if (profiler != None):
+        profiler.disable()
+        profiler.dump_stats(cprofile_filename)
+
+    wall = time.time() - time_start
+
+    record = {'script': os.path.basename(argv[0]),
+              'argv': argv[1:],
+              'start': datetime.datetime.fromtimestamp(time_start).isoformat(timespec='seconds'),
+              'wall': round(wall, 6),
+              'stages': dict([(name, round(value, 6)) for name, value in stages.items()]),
+              'rows': rows,
+              'rows_per_second': round(rows / wall, 1) if (wall > 0.0) else 0.0,
+              'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              'peak_rss_children_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+
+    with open(metrics_filename, mode='a') as metrics_file:
+        metrics_file.write(json.dumps(record) + "\n")
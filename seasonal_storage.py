@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+#
+# Size the methane storage a capacity mix needs, without running the hourly
+# dispatch of simulate.py. Every parameter takes a single value, a comma
+# separated list or a start:stop:step range, as for simulate_sweep.py:
+#
+#   ./seasonal_storage.py simulation_data_actual.csv seasonal_storage.csv \
+#       2.0 100:200:10 20:80:10 200:500:50 32
+#
+# screens 539 mixes around the 2045 scenario of simulate_2045.txt, with
+# double the load, in a few seconds.
+#
+# The methane storage works as in simulate.py: biomethane flows in at a
+# constant rate, and the methane power plants burn what the renewables and
+# hydropower leave of the load. Surplus generation is wasted. Left out is
+# the battery, which only shifts hours, and the limit on methane power, the
+# power needed is reported instead.
+#
+# The stored methane then follows the cumulative sum of inflow minus burned
+# methane. The smallest storage that never runs short is the largest drop
+# of that sum from an earlier high, its running maximum minus itself: a
+# full store at the high has to last until the low. The smallest initial
+# fill is the lowest the sum goes below its start. Both are one pass of
+# prefix sums over the hours, for a block of mixes at once.
+#
+# With --loop=<count>, the weather years are run count times in a row, so
+# the storage also has to refill over the years for the next round.
+#
+
+import sys
+import csv
+import time
+
+import numpy
+
+import simulate
+import simulate_sweep
+import simulation_data
+import run_metrics
+
+parameter_fieldnames = ['Load factor',
+                        'Onshore [GW]',
+                        'Offshore [GW]',
+                        'Solar [GW]',
+                        'Biomethane [GW]',
+]
+
+storage_fieldnames = ['Methane storage [TWh]',
+                      'Initial fill [TWh]',
+                      'Methane power [GW]',
+                      'Methane burned [TWh/year]',
+                      'Balance [TWh/year]',
+]
+
+#
+# Storage, initial fill, methane power and the totals of methane burned and
+# methane balance for a block of configs, as arrays with a value per config.
+#
+def seasonal_storage_size(configs, load, hydro, onshore, offshore, solar, loops=1):
+    column = lambda name: numpy.array([getattr(config, name) for config in configs])[:, None]
+
+    residual = load[None, :] * column('load_factor') - hydro[None, :]
+    residual -= column('capacity_onshore') * onshore[None, :]
+    residual -= column('capacity_offshore') * offshore[None, :]
+    residual -= column('capacity_solar') * solar[None, :]
+
+    power = residual.max(axis=1)
+    burned = numpy.maximum(residual, 0.0) / column('capacity_methane_efficiency')
+    flow = numpy.cumsum(column('capacity_biomethane_factor') * column('capacity_biomethane') - burned,
+                        axis=1)
+
+    level = numpy.zeros(len(configs))
+    high = numpy.zeros(len(configs))
+    low = numpy.zeros(len(configs))
+    storage = numpy.zeros(len(configs))
+
+    # a loop starts where the previous one left the sum and its high.
+    for i in range(loops):
+        stored = level[:, None] + flow
+        highs = numpy.maximum(numpy.maximum.accumulate(stored, axis=1), high[:, None])
+
+        storage = numpy.maximum(storage, (highs - stored).max(axis=1))
+        low = numpy.minimum(low, stored.min(axis=1))
+        high = highs[:, -1]
+        level = stored[:, -1]
+
+    return storage, -low, power, burned.sum(axis=1), flow[:, -1]
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    loops = 1
+
+    arguments = []
+    for argument in sys.argv:
+        if (argument.startswith("--loop=")):
+            loops = int(argument[len("--loop="):])
+        else:
+            arguments.append(argument)
+
+    if (len(arguments) != 8):
+        print("Error: Wrong number of arguments.")
+        print("%s <actual data csv> <result csv> <load factor> <onshore wind GW> <offshore wind GW> "
+              "<solar GW> <biomethane GW> [--loop=<count>]" % (arguments[0]))
+        sys.exit()
+
+    data_actual_filename = arguments[1]
+    result_filename = arguments[2]
+
+    ranges = [simulate_sweep.parameter_range(text) for text in arguments[3:8]]
+    grid = numpy.array(numpy.meshgrid(*ranges, indexing='ij')).reshape(len(ranges), -1).T
+
+    run_metrics.stage("parse")
+    data_actual = simulation_data.simulation_data_load(data_actual_filename)
+    load = numpy.asarray(data_actual['Load'])
+    hydro = numpy.asarray(data_actual['Hydropower'])
+    onshore = numpy.asarray(data_actual['Wind onshore'])
+    offshore = numpy.asarray(data_actual['Wind offshore'])
+    solar = numpy.asarray(data_actual['Photovoltaics'])
+    years = len(load) / (365.25 * 24)
+
+    print("Sizing methane storage for %d mixes over %.1f years of weather, looped %d times." %
+          (len(grid), years, loops))
+    print("Writing results to %s" % result_filename)
+
+    time_start = time.time()
+
+    run_metrics.stage("dispatch")
+    result_file = open(result_filename, mode='w')
+    result_writer = csv.DictWriter(result_file, fieldnames=parameter_fieldnames + storage_fieldnames,
+                                   lineterminator='\n')
+    result_writer.writeheader()
+
+    # blocks of mixes keep the hourly arrays at a few ten MB.
+    block = max(1, (1 << 22) // len(load))
+    default = simulate.SimulationConfig()
+    fitting = 0
+
+    for first in range(0, len(grid), block):
+        parameters_list = grid[first:first + block].tolist()
+        configs = [simulate.simulation_config_create(*(parameters[0:4] + [0.0, parameters[4], 0.0]))
+                   for parameters in parameters_list]
+
+        storage, initial, power, burned, balance = seasonal_storage_size(configs, load, hydro, onshore,
+                                                                         offshore, solar, loops)
+
+        for i, parameters in enumerate(parameters_list):
+            row = dict(zip(parameter_fieldnames, parameters))
+            row.update(zip(storage_fieldnames,
+                           [round(storage[i] / 1000000.0, 3),
+                            round(initial[i] / 1000000.0, 3),
+                            round(power[i] / 1000.0, 3),
+                            round(burned[i] / years / 1000000.0, 3),
+                            round(balance[i] / years / 1000000.0, 3)]))
+            result_writer.writerow(row)
+
+            if ((storage[i] <= default.capacity_storage_methane) and
+                (initial[i] <= default.capacity_storage_methane_initial * default.capacity_storage_methane)):
+                fitting += 1
+
+        run_metrics.rows_add(len(configs) * len(load) * loops)
+
+    result_file.close()
+
+    run_metrics.stage("report")
+    duration = time.time() - time_start
+    print("%d of %d mixes get by with %.0fTWh of methane storage, %.0f%% full at the start." %
+          (fitting, len(grid), default.capacity_storage_methane / 1000000.0,
+           default.capacity_storage_methane_initial * 100.0))
+    print("Sized %d mixes in %.2fs (%.2f mixes/s)." % (len(grid), duration, len(grid) / duration))
@@ -10,163 +10,169 @@
 # We keep the generation information as a fraction of installed capacity for
 # ease of calculation.
 #
+# The hourly dispatch lives in run(), which works on preloaded arrays, so
+# that it can be imported and driven by other scripts as well:
+#
+#   import simulate
+#   import simulation_data
+#   config = simulate.simulation_config_create(1.0, 74.629, 11.676, 115.687, 500, 13, 40)
+#   forecast = simulation_data.simulation_data_load("simulation_data_forecast.csv")
+#   actual = simulation_data.simulation_data_load("simulation_data_actual.csv")
+#   result = simulate.run(config, actual['Load'], actual['Hydropower'],
+#                         actual['Wind onshore'], actual['Wind offshore'],
+#                         actual['Photovoltaics'],
+#                         simulate.forecast_deficit_create(config, forecast))
+#
 
 import sys
-import csv
 import math
+import dataclasses
+from dataclasses import dataclass
+
+import numpy
 
-if (len(sys.argv) != 10):
-    print("Error: Wrong number of arguments.")
-    print("%s <forecast data csv> <actual data csv>  <load factor> <onshore wind GW> <offshore wind GW> "
-          "<solar GW> <battery storage GWh> <biomethane GW> <methane GW>" %
-          (sys.argv[0]))
-    sys.exit()
-
-data_forecast_filename = sys.argv[1]
-data_actual_filename = sys.argv[2]
-
-load_factor = float(sys.argv[3])
-
-capacity_onshore = float(sys.argv[4]) * 1000.0
-capacity_offshore = float(sys.argv[5]) * 1000.0
-capacity_solar = float(sys.argv[6]) * 1000.0
-
-capacity_storage_battery = float(sys.argv[7]) * 1000.0
-capacity_storage_battery_charge_efficiency = 0.95
-capacity_storage_battery_discharge_efficiency = 0.95
-capacity_storage_battery_initial = 0.10
-capacity_storage_battery_minimum_target = 0.10
-storage_battery = capacity_storage_battery * capacity_storage_battery_initial
-
-capacity_biomethane = float(sys.argv[8]) * 1000.0
-capacity_biomethane_factor = 0.90
-capacity_storage_methane = 270000000.0 # 270TWht
-capacity_methane = float(sys.argv[9]) * 1000.0
-capacity_methane_efficiency = 0.45
-# give it a 40% full storage
-storage_methane = .4 * capacity_storage_methane
-
-forecast_load_variation = 1.10
-forecast_generation_variation = 0.90
-
-print("Simulating direct generation for:")
-print("")
-print("    %4.2fx grid load over historic data." % (load_factor))
-print("")
-print("    %5.1fGW  of onshore wind generation capacity," % (capacity_onshore / 1000))
-print("    %5.1fGW  of offshore wind generation capacity," % (capacity_offshore / 1000))
-print("    %5.1fGW  of photovoltaic generation capacity," % (capacity_solar / 1000))
-print("")
-print(" %8.1fGWh of grid level battery storage (efficiency: %4.2f%%/%4.2f%% Charge/Discharge)," %
-      (capacity_storage_battery / 1000, capacity_storage_battery_charge_efficiency * 100,
-       capacity_storage_battery_discharge_efficiency * 100))
-print(" %8.1fGWh stored initially (%4.2f%%)" % (storage_battery / 1000, capacity_storage_battery_initial * 100))
-print(" %8.1fGWh (%4.2f%%) 24h low battery target." %
-      (capacity_storage_battery * capacity_storage_battery_minimum_target / 1000, capacity_storage_battery_minimum_target * 100))
-print("")
-print("    %5.1fGW  of biomethane production (%4.2f%% capacity factor)," %
-      (capacity_biomethane / 1000, capacity_biomethane_factor * 100))
-print(" %8.1fGWh of geological methane storage capacity," % (capacity_storage_methane / 1000))
-print(" %8.1fGWh of methane stored initially (%4.2f%%)," % (storage_methane / 1000, 100 * storage_methane / capacity_storage_methane))
-print("    %5.1fGW  of methane electricity generation capacity (%4.2f%% electrical efficiency)," %
-      (capacity_methane / 1000, capacity_methane_efficiency * 100))
-print("")
-print("Retrieving forecast data from %s" % data_forecast_filename)
-print("Retrieving actual data from %s" % data_actual_filename)
-print("")
-
-data_forecast_file = open(data_forecast_filename, mode='r')
-data_forecast_reader = csv.DictReader(data_forecast_file)
-
-data_actual_file = open(data_actual_filename, mode='r')
-data_actual_reader = csv.DictReader(data_actual_file)
-
-average_difference = 0.0
-average_hours = 0
-wasted_total = 0.0
-missing_total = 0.0
-
-hours = 0
-load_yearly = 0.0
-hydro_yearly = 0.0
-onshore_yearly = 0.0
-offshore_yearly = 0.0
-solar_yearly = 0.0
-biomethane_yearly = 0.0
-biomethane_power_yearly = 0.0
-biomethane_burned_yearly = 0.0
-wasted_yearly = 0.0
-missing_yearly = 0.0
-
-#
-# Create a 24h forecast buffer
-#
-forecast_deficit_list = [0.0, ]
-def forecast_deficit_list_add():
-    global forecast_deficit_list
-
-    data_forecast = next(data_forecast_reader, None)
-    #print(data_forecast)
-
-    load = float(data_forecast['Load']) * load_factor * forecast_load_variation
-
-    generation = float(data_forecast['Hydropower']) * forecast_generation_variation
-    generation += capacity_onshore * float(data_forecast['Wind onshore']) * forecast_generation_variation
-    generation += capacity_offshore * float(data_forecast['Wind offshore']) * forecast_generation_variation
-    generation += capacity_solar * float(data_forecast['Photovoltaics']) * forecast_generation_variation
-
-    deficit = load - generation
-
-    #print("%s %s: %6.2fMWh vs %6.2fMWh: %6.2fMWh missing" %
-    #      (data_forecast['Date'], data_forecast['Time'], load, generation, deficit))
-
-    forecast_deficit_list.append(deficit)
-
-while (len(forecast_deficit_list) < 12):
-    forecast_deficit_list_add()
+import simulation_data
+import simulation_checkpoint
+import run_metrics
 
 #
-# Try to average so we have the battery above 5% in 24h time, without
-# a gap in between.
+# All parameters of a simulation run. Power is in MW, energy in MWh.
 #
-def biomethane_power_needed():
-    global storage_battery
-    global capacity_storage_battery_discharge_efficiency
-    global forecast_deficit_list
-    global capacity_storage_battery
-    global capacity_storage_battery_minimum_target
+@dataclass
+class SimulationConfig:
+    load_factor: float = 1.0
+
+    capacity_onshore: float = 0.0
+    capacity_offshore: float = 0.0
+    capacity_solar: float = 0.0
+
+    capacity_storage_battery: float = 0.0
+    capacity_storage_battery_charge_efficiency: float = 0.95
+    capacity_storage_battery_discharge_efficiency: float = 0.95
+    capacity_storage_battery_initial: float = 0.10
+    capacity_storage_battery_minimum_target: float = 0.10
+
+    capacity_biomethane: float = 0.0
+    capacity_biomethane_factor: float = 0.90
+    capacity_storage_methane: float = 270000000.0 # 270TWht
+    capacity_storage_methane_initial: float = 0.40
+    capacity_methane: float = 0.0
+    capacity_methane_efficiency: float = 0.45
+
+    forecast_load_variation: float = 1.10
+    forecast_generation_variation: float = 0.90
+    forecast_hours: int = 12
 
-    deficit_total = 0.0
-    time_total = 0
-    deficit_max = 0.0
-    time_max = 1.0
+#
+# Create a config from the command line style units: GW and GWh.
+#
+def simulation_config_create(load_factor, onshore, offshore, solar,
+                             battery, biomethane, methane):
+    return SimulationConfig(load_factor=float(load_factor),
+                            capacity_onshore=float(onshore) * 1000.0,
+                            capacity_offshore=float(offshore) * 1000.0,
+                            capacity_solar=float(solar) * 1000.0,
+                            capacity_storage_battery=float(battery) * 1000.0,
+                            capacity_biomethane=float(biomethane) * 1000.0,
+                            capacity_methane=float(methane) * 1000.0)
 
+#
+# The grid load deficit the forecast data predicts for every hour, with
+# some pessimism added to both load and generation.
+#
+def forecast_deficit_create(config, forecast):
+    load = forecast['Load'] * config.load_factor * config.forecast_load_variation
 
-    # make sure we never run out.
-    for deficit in forecast_deficit_list:
-        deficit_total += deficit
-        time_total += 1
+    generation = forecast['Hydropower'] * config.forecast_generation_variation
+    generation += config.capacity_onshore * forecast['Wind onshore'] * config.forecast_generation_variation
+    generation += config.capacity_offshore * forecast['Wind offshore'] * config.forecast_generation_variation
+    generation += config.capacity_solar * forecast['Photovoltaics'] * config.forecast_generation_variation
 
-        if (deficit_max <= deficit_total):
-            deficit_max = deficit_total
-            time_max = time_total
+    return load - generation
 
-    #print("Total deficit is %6.2fMWh in %dh (%6.2fMW)" %(deficit_total, time_total, deficit_total / time_total))
-    #print("Maximum deficit is %6.2fMWh after %dh (%6.2fMW needed)" % (deficit_max, time_max, deficit_max / time_max))
+#
+# The forecast window of every hour, computed once for the whole series.
+#
+# For hour i the window covers the forecast deficit of hours
+# [i, i + forecast_hours), clipped at the end of the forecast data. Returns
+# the total deficit of that window and its length, plus the maximum running
+# deficit inside the window and the number of hours until it is reached
+# (the latest hour if several hours reach the maximum).
+#
+# Running sums are differences of prefix sums, the maximum comes from a
+# sparse table which is built one doubling level at a time, and only the
+# level that answers the current window lengths is kept. This is
+# O(n log forecast_hours) in numpy, and independent of the window length
+# per simulated hour.
+#
+# The forecast deficit may have a second, scenario, axis. Then all results
+# but the window length get that axis as well.
+#
+def forecast_window_create(forecast_deficit, hours, forecast_hours):
+    deficit = numpy.asarray(forecast_deficit, dtype=numpy.float64)
+    if (len(deficit) < hours):
+        raise ValueError("forecast data (%dh) is shorter than actual data (%dh)" %
+                         (len(deficit), hours))
+
+    # turns per-hour index arrays into columns when there is a scenario axis.
+    column = (slice(None),) + (None,) * (deficit.ndim - 1)
+
+    prefix = numpy.zeros((len(deficit) + 1,) + deficit.shape[1:])
+    numpy.cumsum(deficit, axis=0, out=prefix[1:])
+
+    start = numpy.arange(hours)
+    end = numpy.minimum(start + forecast_hours, len(deficit))
+    time_total = end - start
+    deficit_total = prefix[end] - prefix[start]
+
+    # floor(log2(time_total)), the sparse table level to query
+    level = numpy.frexp(time_total)[1] - 1
+
+    deficit_max = numpy.zeros((hours,) + deficit.shape[1:])
+    time_max = numpy.ones((hours,) + deficit.shape[1:], dtype=numpy.int64)
+
+    value = prefix
+    index = numpy.arange(len(prefix))[column]
+    width = 1
+    j = 0
+    while True:
+        select = numpy.nonzero(level == j)[0]
+        if (len(select)):
+            left = start[select] + 1
+            right = end[select] - width + 1
+            # on a tie, the right block holds the latest maximum
+            take_right = value[right] >= value[left]
+            deficit_max[select] = numpy.where(take_right, value[right], value[left]) - prefix[start[select]]
+            time_max[select] = numpy.where(take_right, index[right], index[left]) - start[select][column]
+
+        if ((width * 2) > time_total.max()):
+            break
 
-    battery = storage_battery * capacity_storage_battery_discharge_efficiency
-    #print("battery energy available: %6.2fMWh" % (battery))
+        take_right = value[width:] >= value[:-width]
+        value = numpy.where(take_right, value[width:], value[:-width])
+        index = numpy.where(take_right, index[width:], index[:-width])
+        width *= 2
+        j += 1
 
-    battery_goal = capacity_storage_battery * capacity_storage_battery_minimum_target * capacity_storage_battery_discharge_efficiency
-    #print("battery energy goal: %6.2fMWh" % (battery_goal))
+    return deficit_total, time_total, deficit_max, time_max
 
+#
+# Try to average so we have the battery above 5% in 24h time, without
+# a gap in between.
+#
+def biomethane_power_needed(config, storage_battery, deficit_total, time_total,
+                            deficit_max, time_max):
     if (deficit_max <= 0.0): # both deficit and deficit max are below zero.
         return 0
 
+    battery = storage_battery * config.capacity_storage_battery_discharge_efficiency
+
+    battery_goal = (config.capacity_storage_battery * config.capacity_storage_battery_minimum_target *
+                    config.capacity_storage_battery_discharge_efficiency)
+
+    # make sure we never run out.
     methane_missing = (deficit_max - battery) / time_max
-    #print("Methane missing to not run out: %6.2fMW" % (methane_missing))
     methane_goal = (deficit_total + battery_goal - battery) / time_total
-    #print("Methane missing to keep battery useful: %6.2fMW" % (methane_goal))
 
     if (methane_missing > methane_goal):
         if (methane_missing > 0.0):
@@ -179,88 +185,400 @@ def biomethane_power_needed():
         else:
             return 0.0
 
-#print ("Biomethane needed %6.2fGW" % (biomethane_power_needed()))
-
-while True:
-    hours += 1
-
-    data_actual = next(data_actual_reader, None)
-    if (data_actual == None):
-        break
-    #print(data_actual)
-
-    date = data_actual['Date']
-    load = float(data_actual['Load']) * load_factor
-    hydro = float(data_actual['Hydropower'])
-    onshore = capacity_onshore * float(data_actual['Wind onshore'])
-    offshore = capacity_offshore * float(data_actual['Wind offshore'])
-    solar = capacity_solar * float(data_actual['Photovoltaics'])
-    biomethane = capacity_biomethane_factor * capacity_biomethane
-
-    load_yearly += load
-    hydro_yearly += hydro
-    onshore_yearly += onshore
-    offshore_yearly += offshore
-    solar_yearly += solar
-
-    forecast_deficit_list.pop(0)
-    forecast_deficit_list_add()
-    biomethane_power = biomethane_power_needed()
-    if (biomethane_power > capacity_methane):
-        biomethane_power = capacity_methane
-
-    biomethane_burned = biomethane_power / capacity_methane_efficiency
-
-    if (biomethane_burned):
-        if ((storage_methane + biomethane) < biomethane_burned):
-            biomethane_burned = storage_methane + biomethane
-            biomethane_power = biomethane_burned * capacity_methane_efficiency
-            storage_methane = 0
-        else:
-            storage_methane += biomethane - biomethane_burned
+#
+# Run the hourly dispatch. Takes the actual grid load and hydropower in MW,
+# the capacity factors of onshore wind, offshore wind and solar, and the
+# forecast deficit in MW, as created by forecast_deficit_create().
+#
+# The forecast deficit is aligned with the actual data, and should extend
+# forecast_hours - 1 hours past it. Otherwise the windows of the last hours
+# are shortened.
+#
+# Returns a dict of per-hour numpy arrays, and 'aborted'.
+#
+# When missing_limit (MWh) or missing_hours_limit is given, the run stops as
+# soon as the missing energy, or the number of hours with missing energy,
+# exceeds it. 'aborted' is then True, and the returned arrays end at that
+# hour, which may well be the last one.
+#
+# A run continues from an earlier one when given its state, as returned by
+# run_state(), and the arrays from the hour after. The stores of the state
+# are cut down to the capacities of config, which may be smaller than the
+# ones of the earlier run.
+#
+def run(config, load, hydro, onshore, offshore, solar, forecast_deficit,
+        missing_limit=None, missing_hours_limit=None, state=None):
+    load = numpy.asarray(load, dtype=numpy.float64) * config.load_factor
+    hydro = numpy.asarray(hydro, dtype=numpy.float64)
+    onshore = config.capacity_onshore * numpy.asarray(onshore, dtype=numpy.float64)
+    offshore = config.capacity_offshore * numpy.asarray(offshore, dtype=numpy.float64)
+    solar = config.capacity_solar * numpy.asarray(solar, dtype=numpy.float64)
+    renewable = hydro + onshore + offshore + solar
+
+    hours = len(load)
+    deficit_total, time_total, deficit_max, time_max = \
+        forecast_window_create(forecast_deficit, hours, config.forecast_hours)
+    deficit_total = deficit_total.tolist()
+    time_total = time_total.tolist()
+    deficit_max = deficit_max.tolist()
+    time_max = time_max.tolist()
+
+    capacity_storage_battery = config.capacity_storage_battery
+    charge_efficiency = config.capacity_storage_battery_charge_efficiency
+    discharge_efficiency = config.capacity_storage_battery_discharge_efficiency
+    capacity_storage_methane = config.capacity_storage_methane
+    capacity_methane = config.capacity_methane
+    capacity_methane_efficiency = config.capacity_methane_efficiency
+    biomethane = config.capacity_biomethane_factor * config.capacity_biomethane
+
+    if (state == None):
+        storage_battery = capacity_storage_battery * config.capacity_storage_battery_initial
+        storage_methane = config.capacity_storage_methane_initial * capacity_storage_methane
     else:
-        storage_methane += biomethane
-
-    if (storage_methane > capacity_storage_methane):
-        storage_methane = capacity_storage_methane
-
-    biomethane_yearly += biomethane
-    biomethane_power_yearly += biomethane_power
-    biomethane_burned_yearly += biomethane_burned
-
-    total = hydro + onshore + offshore + solar + biomethane_power
-    difference = total - load
-
-    average_difference += difference
-    average_hours += 1
-
-    battery_flow = 0.0
-    wasted = 0.0
-    missing = 0.0
-    if (difference >= 0):
-        if (storage_battery + (capacity_storage_battery_charge_efficiency * difference) > capacity_storage_battery):
-            battery_flow = (capacity_storage_battery - storage_battery) / capacity_storage_battery_charge_efficiency
-            storage_battery = capacity_storage_battery
-            wasted = difference - battery_flow
-            wasted_yearly += wasted
-            wasted_total += wasted
+        storage_battery = min(state['storage_battery'], capacity_storage_battery)
+        storage_methane = min(state['storage_methane'], capacity_storage_methane)
+
+    biomethane_power_list = [0.0] * hours
+    biomethane_burned_list = [0.0] * hours
+    battery_flow_list = [0.0] * hours
+    storage_battery_list = [0.0] * hours
+    storage_methane_list = [0.0] * hours
+    missing_list = [0.0] * hours
+    wasted_list = [0.0] * hours
+
+    load_list = load.tolist()
+    renewable_list = renewable.tolist()
+
+    if (missing_limit == None):
+        missing_limit = math.inf
+    if (missing_hours_limit == None):
+        missing_hours_limit = math.inf
+    missing_total = 0.0
+    missing_hours = 0
+    aborted = False
+
+    for i in range(hours):
+        biomethane_power = biomethane_power_needed(config, storage_battery,
+                                                   deficit_total[i], time_total[i],
+                                                   deficit_max[i], time_max[i])
+        if (biomethane_power > capacity_methane):
+            biomethane_power = capacity_methane
+
+        biomethane_burned = biomethane_power / capacity_methane_efficiency
+
+        if (biomethane_burned):
+            if ((storage_methane + biomethane) < biomethane_burned):
+                biomethane_burned = storage_methane + biomethane
+                biomethane_power = biomethane_burned * capacity_methane_efficiency
+                storage_methane = 0
+            else:
+                storage_methane += biomethane - biomethane_burned
         else:
-            battery_flow = capacity_storage_battery_charge_efficiency * difference
-            storage_battery += battery_flow
-    else:
-        if ((storage_battery * -capacity_storage_battery_discharge_efficiency) > difference):
-            battery_flow = -storage_battery * capacity_storage_battery_discharge_efficiency
-            missing = -(difference + battery_flow)
-            missing_yearly += missing
-            missing_total += missing
-            storage_battery = 0
+            storage_methane += biomethane
+
+        if (storage_methane > capacity_storage_methane):
+            storage_methane = capacity_storage_methane
+
+        difference = renewable_list[i] + biomethane_power - load_list[i]
+
+        battery_flow = 0.0
+        if (difference >= 0):
+            if (storage_battery + (charge_efficiency * difference) > capacity_storage_battery):
+                battery_flow = (capacity_storage_battery - storage_battery) / charge_efficiency
+                storage_battery = capacity_storage_battery
+                wasted_list[i] = difference - battery_flow
+            else:
+                battery_flow = charge_efficiency * difference
+                storage_battery += battery_flow
         else:
-            battery_flow = difference / capacity_storage_battery_discharge_efficiency
-            storage_battery += battery_flow
+            if ((storage_battery * -discharge_efficiency) > difference):
+                battery_flow = -storage_battery * discharge_efficiency
+                missing_list[i] = -(difference + battery_flow)
+                storage_battery = 0
+
+                missing_total += missing_list[i]
+                missing_hours += 1
+                if ((missing_total > missing_limit) or (missing_hours > missing_hours_limit)):
+                    aborted = True
+            else:
+                battery_flow = difference / discharge_efficiency
+                storage_battery += battery_flow
+
+        biomethane_power_list[i] = biomethane_power
+        biomethane_burned_list[i] = biomethane_burned
+        battery_flow_list[i] = battery_flow
+        storage_battery_list[i] = storage_battery
+        storage_methane_list[i] = storage_methane
+
+        if (aborted):
+            hours = i + 1
+            load = load[0:hours]
+            hydro = hydro[0:hours]
+            onshore = onshore[0:hours]
+            offshore = offshore[0:hours]
+            solar = solar[0:hours]
+            renewable = renewable[0:hours]
+            del biomethane_power_list[hours:]
+            del biomethane_burned_list[hours:]
+            del battery_flow_list[hours:]
+            del storage_battery_list[hours:]
+            del storage_methane_list[hours:]
+            del missing_list[hours:]
+            del wasted_list[hours:]
+            break
+
+    biomethane_power = numpy.array(biomethane_power_list, dtype=numpy.float64)
+
+    return {'load': load,
+            'hydro': hydro,
+            'onshore': onshore,
+            'offshore': offshore,
+            'solar': solar,
+            'biomethane': numpy.full(hours, biomethane),
+            'biomethane_power': biomethane_power,
+            'biomethane_burned': numpy.array(biomethane_burned_list, dtype=numpy.float64),
+            'difference': renewable + biomethane_power - load,
+            'battery_flow': numpy.array(battery_flow_list, dtype=numpy.float64),
+            'storage_battery': numpy.array(storage_battery_list, dtype=numpy.float64),
+            'storage_methane': numpy.array(storage_methane_list, dtype=numpy.float64),
+            'missing': numpy.array(missing_list, dtype=numpy.float64),
+            'wasted': numpy.array(wasted_list, dtype=numpy.float64),
+            'aborted': aborted}
+
+#
+# The state of a run after the given hour, to continue with the next hour.
+#
+def run_state(result, hour):
+    return {'storage_battery': float(result['storage_battery'][hour]),
+            'storage_methane': float(result['storage_methane'][hour])}
+
+#
+# Combine a list of configs into a single SimulationConfig, of which every
+# field is a numpy array with one entry per scenario.
+#
+def config_batch_create(configs):
+    forecast_hours = set([config.forecast_hours for config in configs])
+    if (len(forecast_hours) != 1):
+        raise ValueError("all scenarios of a batch need the same forecast_hours")
+
+    batch = SimulationConfig()
+    for field in dataclasses.fields(SimulationConfig):
+        if (field.name == 'forecast_hours'):
+            continue
+        setattr(batch, field.name,
+                numpy.array([getattr(config, field.name) for config in configs],
+                            dtype=numpy.float64))
+    batch.forecast_hours = forecast_hours.pop()
+
+    return batch
+
+#
+# The same dispatch as run(), but for many scenarios at once: all state is
+# held in arrays with one entry per scenario, and every hour is a handful of
+# numpy operations over all of them. The hours are processed in blocks, for
+# which load, generation and forecast windows are prepared up front, which
+# keeps memory bounded for large batches.
+#
+# Instead of a forecast deficit, this takes the forecast data itself, as the
+# deficit differs per scenario.
+#
+# As per-hour series for thousands of scenarios do not fit in memory, this
+# returns the per-scenario totals: missing, wasted and burned energy, the
+# number of hours with a shortage, and the minimum battery and methane
+# storage.
+#
+def run_batch(configs, load, hydro, onshore, offshore, solar, forecast, block_hours=0):
+    batch = config_batch_create(configs)
+    scenarios = len(configs)
+    hours = len(load)
+    forecast_hours = batch.forecast_hours
+
+    if (not block_hours):
+        block_hours = max(forecast_hours, 2000000 // scenarios)
+
+    charge_efficiency = batch.capacity_storage_battery_charge_efficiency
+    discharge_efficiency = batch.capacity_storage_battery_discharge_efficiency
+    capacity_storage_battery = batch.capacity_storage_battery
+    capacity_storage_methane = batch.capacity_storage_methane
+    capacity_methane = batch.capacity_methane
+    capacity_methane_efficiency = batch.capacity_methane_efficiency
+    biomethane = batch.capacity_biomethane_factor * batch.capacity_biomethane
+    battery_goal = (capacity_storage_battery * batch.capacity_storage_battery_minimum_target *
+                    discharge_efficiency)
+
+    storage_battery = capacity_storage_battery * batch.capacity_storage_battery_initial
+    storage_methane = batch.capacity_storage_methane_initial * capacity_storage_methane
+
+    missing_total = numpy.zeros(scenarios)
+    missing_hours = numpy.zeros(scenarios, dtype=numpy.int64)
+    wasted_total = numpy.zeros(scenarios)
+    biomethane_burned_total = numpy.zeros(scenarios)
+    storage_battery_min = numpy.full(scenarios, numpy.inf)
+    storage_methane_min = numpy.full(scenarios, numpy.inf)
+
+    forecast_columns = ['Load', 'Hydropower', 'Wind onshore', 'Wind offshore', 'Photovoltaics']
+
+    for block_start in range(0, hours, block_hours):
+        block_end = min(block_start + block_hours, hours)
+        forecast_end = min(block_end + forecast_hours - 1, len(forecast['Load']))
+
+        block_load = numpy.asarray(load[block_start:block_end])[:, None] * batch.load_factor
+        block_renewable = (numpy.asarray(hydro[block_start:block_end])[:, None] +
+                           batch.capacity_onshore * numpy.asarray(onshore[block_start:block_end])[:, None] +
+                           batch.capacity_offshore * numpy.asarray(offshore[block_start:block_end])[:, None] +
+                           batch.capacity_solar * numpy.asarray(solar[block_start:block_end])[:, None])
+
+        block_forecast = {}
+        for name in forecast_columns:
+            block_forecast[name] = numpy.asarray(forecast[name][block_start:forecast_end])[:, None]
+        deficit_total, time_total, deficit_max, time_max = \
+            forecast_window_create(forecast_deficit_create(batch, block_forecast),
+                                   block_end - block_start, forecast_hours)
+
+        for i in range(block_end - block_start):
+            # biomethane_power_needed(), for all scenarios
+            battery = storage_battery * discharge_efficiency
+            methane_missing = (deficit_max[i] - battery) / time_max[i]
+            methane_goal = (deficit_total[i] + battery_goal - battery) / time_total[i]
+            biomethane_power = numpy.where(methane_missing > methane_goal, methane_missing, methane_goal)
+            biomethane_power = numpy.where((deficit_max[i] > 0.0) & (biomethane_power > 0.0),
+                                           numpy.ceil(biomethane_power / 1000) * 1000, 0.0)
+            biomethane_power = numpy.minimum(biomethane_power, capacity_methane)
+
+            biomethane_burned = biomethane_power / capacity_methane_efficiency
+            methane_available = storage_methane + biomethane
+            methane_short = (biomethane_burned != 0.0) & (methane_available < biomethane_burned)
+            biomethane_burned = numpy.where(methane_short, methane_available, biomethane_burned)
+            biomethane_power = numpy.where(methane_short, biomethane_burned * capacity_methane_efficiency,
+                                           biomethane_power)
+            storage_methane = numpy.where(methane_short, 0.0,
+                                          storage_methane + (biomethane - biomethane_burned))
+            storage_methane = numpy.minimum(storage_methane, capacity_storage_methane)
+
+            difference = block_renewable[i] + biomethane_power - block_load[i]
+            charge = difference >= 0
+
+            # charging
+            battery_full = (storage_battery + (charge_efficiency * difference)) > capacity_storage_battery
+            charge_flow = numpy.where(battery_full,
+                                      (capacity_storage_battery - storage_battery) / charge_efficiency,
+                                      charge_efficiency * difference)
+            charge_storage = numpy.where(battery_full, capacity_storage_battery,
+                                         storage_battery + charge_flow)
+            wasted = numpy.where(charge & battery_full, difference - charge_flow, 0.0)
+
+            # discharging
+            battery_empty = (storage_battery * -discharge_efficiency) > difference
+            discharge_flow = numpy.where(battery_empty, -storage_battery * discharge_efficiency,
+                                         difference / discharge_efficiency)
+            discharge_storage = numpy.where(battery_empty, 0.0, storage_battery + discharge_flow)
+            missing = numpy.where(~charge & battery_empty, -(difference + discharge_flow), 0.0)
+
+            storage_battery = numpy.where(charge, charge_storage, discharge_storage)
+
+            missing_total += missing
+            missing_hours += missing != 0.0
+            wasted_total += wasted
+            biomethane_burned_total += biomethane_burned
+            numpy.minimum(storage_battery_min, storage_battery, out=storage_battery_min)
+            numpy.minimum(storage_methane_min, storage_methane, out=storage_methane_min)
+
+    return {'missing': missing_total,
+            'missing_hours': missing_hours,
+            'wasted': wasted_total,
+            'biomethane_burned': biomethane_burned_total,
+            'storage_battery_min': storage_battery_min,
+            'storage_methane_min': storage_methane_min}
+
+summary_fieldnames = ['Missing [TWh]',
+                      'Missing hours',
+                      'Wasted [TWh]',
+                      'Methane burned [TWh]',
+                      'Battery minimum [GWh]',
+                      'Methane minimum [TWh]',
+]
+
+def summary_create(missing, missing_hours, wasted, biomethane_burned,
+                   storage_battery_min, storage_methane_min):
+    return {'Missing [TWh]': round(float(missing) / 1000000.0, 4),
+            'Missing hours': int(missing_hours),
+            'Wasted [TWh]': round(float(wasted) / 1000000.0, 4),
+            'Methane burned [TWh]': round(float(biomethane_burned) / 1000000.0, 4),
+            'Battery minimum [GWh]': round(float(storage_battery_min) / 1000.0, 3),
+            'Methane minimum [TWh]': round(float(storage_methane_min) / 1000000.0, 4)}
+
+#
+# Condense a run into the numbers we compare scenarios by, keyed by
+# summary_fieldnames.
+#
+def result_summarize(result):
+    return summary_create(result['missing'].sum(),
+                          numpy.count_nonzero(result['missing']),
+                          result['wasted'].sum(),
+                          result['biomethane_burned'].sum(),
+                          result['storage_battery'].min(),
+                          result['storage_methane'].min())
+
+#
+# The same, for every scenario of a run_batch() result.
+#
+def result_batch_summarize(result):
+    return [summary_create(*values) for values in
+            zip(result['missing'], result['missing_hours'], result['wasted'],
+                result['biomethane_burned'], result['storage_battery_min'],
+                result['storage_methane_min'])]
+
+def config_print(config):
+    print("Simulating direct generation for:")
+    print("")
+    print("    %4.2fx grid load over historic data." % (config.load_factor))
+    print("")
+    print("    %5.1fGW  of onshore wind generation capacity," % (config.capacity_onshore / 1000))
+    print("    %5.1fGW  of offshore wind generation capacity," % (config.capacity_offshore / 1000))
+    print("    %5.1fGW  of photovoltaic generation capacity," % (config.capacity_solar / 1000))
+    print("")
+    print(" %8.1fGWh of grid level battery storage (efficiency: %4.2f%%/%4.2f%% Charge/Discharge)," %
+          (config.capacity_storage_battery / 1000, config.capacity_storage_battery_charge_efficiency * 100,
+           config.capacity_storage_battery_discharge_efficiency * 100))
+    print(" %8.1fGWh stored initially (%4.2f%%)" %
+          (config.capacity_storage_battery * config.capacity_storage_battery_initial / 1000,
+           config.capacity_storage_battery_initial * 100))
+    print(" %8.1fGWh (%4.2f%%) 24h low battery target." %
+          (config.capacity_storage_battery * config.capacity_storage_battery_minimum_target / 1000,
+           config.capacity_storage_battery_minimum_target * 100))
+    print("")
+    print("    %5.1fGW  of biomethane production (%4.2f%% capacity factor)," %
+          (config.capacity_biomethane / 1000, config.capacity_biomethane_factor * 100))
+    print(" %8.1fGWh of geological methane storage capacity," % (config.capacity_storage_methane / 1000))
+    print(" %8.1fGWh of methane stored initially (%4.2f%%)," %
+          (config.capacity_storage_methane * config.capacity_storage_methane_initial / 1000,
+           100 * config.capacity_storage_methane_initial))
+    print("    %5.1fGW  of methane electricity generation capacity (%4.2f%% electrical efficiency)," %
+          (config.capacity_methane / 1000, config.capacity_methane_efficiency * 100))
+    print("")
+    if (config.forecast_hours != 12):
+        print("    %5dh  of forecast used to dispatch methane." % (config.forecast_hours))
+        print("")
+
+#
+# Print the per-hour lines for hour i.
+#
+def hour_print(config, date, time, result, i):
+    load = result['load'][i]
+    hydro = result['hydro'][i]
+    onshore = result['onshore'][i]
+    offshore = result['offshore'][i]
+    solar = result['solar'][i]
+    biomethane_power = result['biomethane_power'][i]
+    battery_flow = result['battery_flow'][i]
+    storage_battery = result['storage_battery'][i]
+    storage_methane = result['storage_methane'][i]
+    missing = result['missing'][i]
+    wasted = result['wasted'][i]
 
     print("%s %s: Storage:  Battery: %4.2fTWh (%6.2f%%), Methane: %6.2fTWh (%6.2f%%)." %
-          (date, data_actual['Time'], storage_battery / 1000000, 100.0 * storage_battery / capacity_storage_battery,
-           storage_methane / 1000000, 100 * storage_methane / 270000000))
+          (date, time, storage_battery / 1000000, 100.0 * storage_battery / config.capacity_storage_battery,
+           storage_methane / 1000000, 100 * storage_methane / config.capacity_storage_methane))
 
     if (missing):
         print("\t%6.2fGW: %4.2fGW + %6.2fGW + %6.2fGW + %6.2fGW + %7.2fGW + %6.2fGW: %6.2fGW missing" %
@@ -275,41 +593,179 @@ while True:
               (load / 1000, hydro / 1000, onshore / 1000, offshore / 1000, solar / 1000,
                - battery_flow / 1000, biomethane_power / 1000))
 
-    if (date.endswith("-12-31") and data_actual['Time'] == "23:00"):
-        print("")
-        print("%s: %ddays" % (date[0:4], hours / 24))
-        print("%6.2fTWh total load, %6.2fGWh average daily load, %4.2fGWh average hourly load." %
-              (load_yearly / 1000000, 24 * load_yearly / hours / 1000, load_yearly / hours / 1000))
-        print("Missing %6.2fTWh, wasted %6.2fTWh" % (missing_yearly / 1000000.0, wasted_yearly / 1000000.0))
-        print("Hydro %6.2fTWh, Onshore %6.2fTWh, Offshore %6.2fTWh, Solar %6.2fTWh, Methane %6.2fTWh." %
-              (hydro_yearly / 1000000, onshore_yearly / 1000000, offshore_yearly / 1000000,
-               solar_yearly / 1000000, biomethane_power_yearly / 1000000))
-        print("Methane: %6.2fTWh (%6.2fGW) produced, %6.2fTWh (%6.2fGW) burned, current storage %6.2fTWh (%6.2f%%)." %
-              (biomethane_yearly / 1000000, biomethane_yearly / hours / 1000,
-               biomethane_burned_yearly / 1000000, biomethane_burned_yearly / hours / 1000,
-               storage_methane / 1000000, 100 * storage_methane / 270000000))
-
-
-        missing_yearly = 0.0
-        wasted_yearly = 0.0
-
-        print("")
-
-        load_yearly = 0.0
-        hydro_yearly = 0.0
-        onshore_yearly = 0.0
-        offshore_yearly = 0.0
-        solar_yearly = 0.0
-        biomethane_yearly = 0.0
-        biomethane_power_yearly = 0.0
-        biomethane_burned_yearly = 0.0
+#
+# Print the yearly summaries and the totals, and with verbose, every hour
+# as well.
+#
+def result_print(config, data, result, verbose=False):
+    hours = len(result['load'])
+
+    stamps = numpy.asarray(data['Hour'][0:hours]).astype('datetime64[h]')
+    years = stamps.astype('datetime64[Y]')
+    # the last hour of each year
+    year_ends = numpy.nonzero((stamps + 1).astype('datetime64[Y]') != years)[0].tolist()
+
+    if (verbose):
+        # the per-hour numbers are formatted from python floats, which is
+        # a lot faster than formatting numpy scalars.
+        result_lists = {}
+        for name, values in result.items():
+            result_lists[name] = values.tolist()
+        dates, times = simulation_data.epoch_hour_strings(data['Hour'][0:hours])
+
+    year_start = 0
+    hour_start = 0
+    for year_end in year_ends:
+        if (verbose):
+            for i in range(hour_start, year_end + 1):
+                hour_print(config, dates[i], times[i], result_lists, i)
+            hour_start = year_end + 1
+
+        year_print(config, str(years[year_end]), result, year_start, year_end + 1)
+        year_start = year_end + 1
+
+    if (verbose):
+        for i in range(hour_start, hours):
+            hour_print(config, dates[i], times[i], result_lists, i)
+
+    print("Totals:")
+    print("Average hourly difference between renewables and grid load is %6.2fGW" %
+          (result['difference'].mean()))
+    print("Missing %6.2fTWh, wasted %6.2fTWh" %
+          (result['missing'].sum() / 1000000.0, result['wasted'].sum() / 1000000.0))
 
-        hours = 0
+#
+# Write the hourly series as columns in an uncompressed .npz, next to the
+# epoch hours they belong to.
+#
+def result_write(filename, data, result):
+    hours = len(result['load'])
+    numpy.savez(filename, Hour=numpy.asarray(data['Hour'][0:hours]), **result)
 
-        # we will need forecast data soon.
-        if (date[0:4] == "2022"):
-            break
+#
+# Print the summary for the hours [start, end) of a single year.
+#
+def year_print(config, year, result, start, end):
+    hours = end - start
+
+    load_yearly = result['load'][start:end].sum()
+    hydro_yearly = result['hydro'][start:end].sum()
+    onshore_yearly = result['onshore'][start:end].sum()
+    offshore_yearly = result['offshore'][start:end].sum()
+    solar_yearly = result['solar'][start:end].sum()
+    biomethane_yearly = result['biomethane'][start:end].sum()
+    biomethane_power_yearly = result['biomethane_power'][start:end].sum()
+    biomethane_burned_yearly = result['biomethane_burned'][start:end].sum()
+    missing_yearly = result['missing'][start:end].sum()
+    wasted_yearly = result['wasted'][start:end].sum()
+    storage_methane = result['storage_methane'][end - 1]
+
+    print("")
+    print("%s: %ddays" % (year, hours / 24))
+    print("%6.2fTWh total load, %6.2fGWh average daily load, %4.2fGWh average hourly load." %
+          (load_yearly / 1000000, 24 * load_yearly / hours / 1000, load_yearly / hours / 1000))
+    print("Missing %6.2fTWh, wasted %6.2fTWh" % (missing_yearly / 1000000.0, wasted_yearly / 1000000.0))
+    print("Hydro %6.2fTWh, Onshore %6.2fTWh, Offshore %6.2fTWh, Solar %6.2fTWh, Methane %6.2fTWh." %
+          (hydro_yearly / 1000000, onshore_yearly / 1000000, offshore_yearly / 1000000,
+           solar_yearly / 1000000, biomethane_power_yearly / 1000000))
+    print("Methane: %6.2fTWh (%6.2fGW) produced, %6.2fTWh (%6.2fGW) burned, current storage %6.2fTWh (%6.2f%%)." %
+          (biomethane_yearly / 1000000, biomethane_yearly / hours / 1000,
+           biomethane_burned_yearly / 1000000, biomethane_burned_yearly / hours / 1000,
+           storage_methane / 1000000, 100 * storage_methane / config.capacity_storage_methane))
+    print("")
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    verbose = False
+    output_filename = None
+    checkpoint_filename = None
+    year_from = None
+
+    arguments = []
+    options = iter(sys.argv)
+    for argument in options:
+        if (argument == "--verbose"):
+            verbose = True
+        elif (argument == "--output"):
+            output_filename = next(options, None)
+        elif (argument == "--checkpoint"):
+            checkpoint_filename = next(options, None)
+        elif (argument == "--from"):
+            year_from = int(next(options, "0"))
+        else:
+            arguments.append(argument)
+    sys.argv = arguments
+
+    if (((len(sys.argv) != 10) and (len(sys.argv) != 11)) or
+        (output_filename == "") or (checkpoint_filename == "") or
+        ((year_from != None) and (checkpoint_filename == None))):
+        print("Error: Wrong number of arguments.")
+        print("%s [--verbose] [--output <hourly npz>] [--checkpoint <checkpoint npz> [--from <year>]] "
+              "<forecast data csv> <actual data csv>  <load factor> <onshore wind GW> <offshore wind GW> "
+              "<solar GW> <battery storage GWh> <biomethane GW> <methane GW> [forecast hours]" % (sys.argv[0]))
+        sys.exit()
+
+    data_forecast_filename = sys.argv[1]
+    data_actual_filename = sys.argv[2]
+
+    config = simulation_config_create(*sys.argv[3:10])
+    if (len(sys.argv) == 11):
+        config.forecast_hours = int(sys.argv[10])
+
+    config_print(config)
+    print("Retrieving forecast data from %s" % data_forecast_filename)
+    print("Retrieving actual data from %s" % data_actual_filename)
+    print("")
+
+    run_metrics.stage("parse")
+    data_forecast = simulation_data.simulation_data_load(data_forecast_filename)
+    data_actual = simulation_data.simulation_data_load(data_actual_filename)
+
+    run_metrics.stage("prepare")
+    forecast_deficit = forecast_deficit_create(config, data_forecast)
+
+    if (checkpoint_filename != None):
+        resume, result_checkpoint, segments_kept = \
+            simulation_checkpoint.checkpoint_resume(checkpoint_filename, config, data_actual,
+                                                    forecast_deficit, year_from)
+        if (resume):
+            state = run_state(result_checkpoint, resume - 1)
+        else:
+            state = None
+        print("Resuming from %s after %d hours, simulating the remaining %d hours." %
+              (checkpoint_filename, resume, len(data_actual['Load']) - resume))
+        print("")
+    else:
+        resume = 0
+        state = None
+
+    run_metrics.stage("dispatch")
+    run_metrics.rows_add(len(data_actual['Load']) - resume)
+    if (resume < len(data_actual['Load'])):
+        result = run(config, data_actual['Load'][resume:], data_actual['Hydropower'][resume:],
+                     data_actual['Wind onshore'][resume:], data_actual['Wind offshore'][resume:],
+                     data_actual['Photovoltaics'][resume:], forecast_deficit[resume:], state=state)
+        # without limits, the run never stops early, and the rest are arrays.
+        del result['aborted']
+    else:
+        result = {}
+
+    if (resume):
+        for name, values in result_checkpoint.items():
+            if (name in result):
+                result[name] = numpy.concatenate((values, result[name]))
+            else:
+                result[name] = values
+
+    run_metrics.stage("report")
+    if (checkpoint_filename != None):
+        simulation_checkpoint.checkpoint_write(checkpoint_filename, config, data_actual,
+                                               forecast_deficit, result, segments_kept)
+
+    if (output_filename != None):
+        print("Writing hourly data to %s" % output_filename)
+        print("")
+        result_write(output_filename, data_actual, result)
 
-print("Totals:")
-print("Average hourly difference between renewables and grid load is %6.2fGW" % (average_difference / average_hours))
-print("Missing %6.2fTWh, wasted %6.2fTWh" % (missing_total / 1000000.0, wasted_total / 1000000.0))
+    result_print(config, data_actual, result, verbose)
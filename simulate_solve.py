@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+#
+# Find the smallest battery, methane generation capacity or methane storage
+# that keeps the missing energy within a target.
+#
+# The parameter to solve for is given as a low:high range, all others as
+# plain values. For instance
+#
+#   ./simulate_solve.py simulation_data_forecast.csv simulation_data_actual.csv \
+#       1.0 110 20 230 0:5000 17 60 270 1.0
+#
+# finds the smallest battery, between 0 and 5000GWh, with which the alternate
+# scenario misses at most 1TWh over the whole period. An optional last
+# argument also limits the number of hours with missing energy, so a target
+# of 0 TWh and 0 hours asks for no shortage at all.
+#
+# More storage or backup capacity never makes the shortage worse, so this
+# bisects the range. Runs that break the target are aborted the moment they
+# do, so most of the ~12 runs needed only simulate part of the data.
+#
+
+import sys
+import time
+
+import simulate
+import simulation_data
+import run_metrics
+
+parameter_names = ['load factor',
+                   'onshore wind',
+                   'offshore wind',
+                   'solar',
+                   'battery storage',
+                   'biomethane',
+                   'methane',
+                   'methane storage',
+]
+
+parameter_units = ['x', 'GW', 'GW', 'GW', 'GWh', 'GW', 'GW', 'TWh']
+
+# parameters that can be solved for.
+parameter_solvable = [4, 6, 7]
+
+#
+# Run with the solved parameter set to value, and report whether the target
+# is met.
+#
+def scenario_feasible(parameters, solve, value, missing_limit, missing_hours_limit,
+                      data_forecast, data_actual):
+    parameters = list(parameters)
+    parameters[solve] = value
+
+    config = simulate.simulation_config_create(*parameters[0:7])
+    config.capacity_storage_methane = parameters[7] * 1000000.0
+
+    result = simulate.run(config, data_actual['Load'], data_actual['Hydropower'],
+                          data_actual['Wind onshore'], data_actual['Wind offshore'],
+                          data_actual['Photovoltaics'],
+                          simulate.forecast_deficit_create(config, data_forecast),
+                          missing_limit=missing_limit, missing_hours_limit=missing_hours_limit)
+
+    feasible = (not result['aborted'])
+    run_metrics.rows_add(len(result['missing']))
+
+    print("    %9.3f%s: %s after %5dh, %8.3fTWh missing in %5dh" %
+          (value, parameter_units[solve], ("met   " if feasible else "missed"),
+           len(result['missing']), result['missing'].sum() / 1000000.0,
+           (result['missing'] != 0.0).sum()))
+
+    return feasible
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    if ((len(sys.argv) != 12) and (len(sys.argv) != 13)):
+        print("Error: Wrong number of arguments.")
+        print("%s <forecast data csv> <actual data csv> <load factor> <onshore wind GW> <offshore wind GW> "
+              "<solar GW> <battery storage GWh> <biomethane GW> <methane GW> <methane storage TWh> "
+              "<maximum missing TWh> [maximum missing hours]" % (sys.argv[0]))
+        print("One of battery storage, methane or methane storage is given as low:high, and solved for.")
+        sys.exit()
+
+    data_forecast_filename = sys.argv[1]
+    data_actual_filename = sys.argv[2]
+
+    solve = None
+    parameters = []
+    for i, text in enumerate(sys.argv[3:11]):
+        if (":" in text):
+            if ((solve != None) or (i not in parameter_solvable)):
+                print("Error: Only one of battery storage, methane or methane storage can be solved for.")
+                sys.exit()
+            solve = i
+            low, high = [float(value) for value in text.split(":")]
+            parameters.append(high)
+        else:
+            parameters.append(float(text))
+
+    if (solve == None):
+        print("Error: No low:high range given to solve for.")
+        sys.exit()
+
+    missing_limit = float(sys.argv[11]) * 1000000.0
+    if (len(sys.argv) == 13):
+        missing_hours_limit = int(sys.argv[12])
+    else:
+        missing_hours_limit = None
+
+    # 0.1% of the range, or a tenth of a unit, whichever is larger.
+    tolerance = max((high - low) / 1000.0, 0.1)
+
+    print("Solving for the minimum %s between %.3f%s and %.3f%s," %
+          (parameter_names[solve], low, parameter_units[solve], high, parameter_units[solve]))
+    if (missing_hours_limit != None):
+        print("with at most %.3fTWh missing in at most %d hours." %
+              (missing_limit / 1000000.0, missing_hours_limit))
+    else:
+        print("with at most %.3fTWh missing." % (missing_limit / 1000000.0))
+    print("")
+
+    run_metrics.stage("parse")
+    data_forecast = simulation_data.simulation_data_load(data_forecast_filename)
+    data_actual = simulation_data.simulation_data_load(data_actual_filename)
+
+    run_metrics.stage("dispatch")
+    time_start = time.time()
+    runs = 1
+
+    if (not scenario_feasible(parameters, solve, high, missing_limit, missing_hours_limit,
+                              data_forecast, data_actual)):
+        print("")
+        print("Target cannot be met with %.3f%s of %s." %
+              (high, parameter_units[solve], parameter_names[solve]))
+        sys.exit()
+
+    runs += 1
+    if (scenario_feasible(parameters, solve, low, missing_limit, missing_hours_limit,
+                          data_forecast, data_actual)):
+        high = low
+    else:
+        while ((high - low) > tolerance):
+            middle = (low + high) / 2
+            runs += 1
+            if (scenario_feasible(parameters, solve, middle, missing_limit, missing_hours_limit,
+                                  data_forecast, data_actual)):
+                high = middle
+            else:
+                low = middle
+
+    run_metrics.stage("report")
+    print("")
+    print("Minimum %s: %.3f%s (%d runs, %.2fs)." %
+          (parameter_names[solve], high, parameter_units[solve], runs, time.time() - time_start))
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+
+#
+# Run simulate.py over a grid of scenarios, and write one summary row per
+# scenario.
+#
+# Every parameter takes either a single value, a comma separated list of
+# values, or a start:stop:step range (stop included). So
+#
+#   ./simulate_sweep.py simulation_data_forecast.csv simulation_data_actual.csv \
+#       sweep.csv 1.0 74.629 11.676 115.687 100:1000:100 13 20,40,60
+#
+# runs 30 battery/methane variations of the Altmaier scenario.
+#
+# The scenarios are spread in batches over a process pool, and each batch is
+# simulated in a single vectorized pass over the hours. The workers memory
+# map the cached simulation data (see simulation_data.py), so all of them
+# share a single read-only copy of the input.
+#
+
+import os
+import sys
+import csv
+import time
+import itertools
+import multiprocessing
+
+import simulate
+import simulation_data
+import run_metrics
+
+parameter_fieldnames = ['Load factor',
+                        'Onshore [GW]',
+                        'Offshore [GW]',
+                        'Solar [GW]',
+                        'Battery [GWh]',
+                        'Biomethane [GW]',
+                        'Methane [GW]',
+]
+
+#
+# Parse "value", "value,value,..." or "start:stop:step" into a list.
+#
+def parameter_range(text):
+    if (":" in text):
+        start, stop, step = [float(value) for value in text.split(":")]
+        if (step <= 0.0):
+            raise ValueError("step of range %s needs to be positive" % text)
+        # allow for floating point error on the stop value.
+        count = int((stop - start) / step + 1e-9) + 1
+        return [round(start + i * step, 6) for i in range(count)]
+
+    return [float(value) for value in text.split(",")]
+
+worker_forecast = None
+worker_actual = None
+
+def worker_init(forecast_filename, actual_filename):
+    global worker_forecast
+    global worker_actual
+
+    worker_forecast = simulation_data.simulation_data_load(forecast_filename)
+    worker_actual = simulation_data.simulation_data_load(actual_filename)
+
+#
+# The numpy overhead of every hour of simulate.run_batch() costs about as much
+# as simulating 30 scenarios one by one, while every scenario more in the
+# batch adds little. So only batch from about there on.
+#
+batch_minimum = 32
+
+#
+# Run a batch of scenarios in one pass over the data, see simulate.run_batch().
+#
+def scenario_batch_run(parameters_list):
+    configs = [simulate.simulation_config_create(*parameters) for parameters in parameters_list]
+
+    if (len(configs) >= batch_minimum):
+        result = simulate.run_batch(configs, worker_actual['Load'], worker_actual['Hydropower'],
+                                    worker_actual['Wind onshore'], worker_actual['Wind offshore'],
+                                    worker_actual['Photovoltaics'], worker_forecast)
+        summaries = simulate.result_batch_summarize(result)
+    else:
+        summaries = []
+        for config in configs:
+            result = simulate.run(config, worker_actual['Load'], worker_actual['Hydropower'],
+                                  worker_actual['Wind onshore'], worker_actual['Wind offshore'],
+                                  worker_actual['Photovoltaics'],
+                                  simulate.forecast_deficit_create(config, worker_forecast))
+            summaries.append(simulate.result_summarize(result))
+
+    rows = []
+    for parameters, summary in zip(parameters_list, summaries):
+        row = dict(zip(parameter_fieldnames, parameters))
+        row.update(summary)
+        rows.append(row)
+    return rows
+
+#
+# Split the scenario grid into batches.
+#
+def grid_batches(grid, batch_size):
+    while True:
+        batch = list(itertools.islice(grid, batch_size))
+        if (not batch):
+            break
+        yield batch
+
+if __name__ == "__main__":
+    run_metrics.setup(sys.argv)
+
+    if ((len(sys.argv) < 11) or (len(sys.argv) > 13)):
+        print("Error: Wrong number of arguments.")
+        print("%s <forecast data csv> <actual data csv> <result csv> <load factor> <onshore wind GW> "
+              "<offshore wind GW> <solar GW> <battery storage GWh> <biomethane GW> <methane GW> "
+              "[processes] [batch size]" % (sys.argv[0]))
+        sys.exit()
+
+    data_forecast_filename = sys.argv[1]
+    data_actual_filename = sys.argv[2]
+    result_filename = sys.argv[3]
+
+    ranges = [parameter_range(text) for text in sys.argv[4:11]]
+
+    if (len(sys.argv) >= 12):
+        processes = int(sys.argv[11])
+    else:
+        processes = os.cpu_count()
+
+    scenarios = 1
+    for values in ranges:
+        scenarios *= len(values)
+
+    if (len(sys.argv) == 13):
+        batch_size = int(sys.argv[12])
+    else:
+        # keep all processes busy, but with fewer batches if that is what it
+        # takes for them to reach batch_minimum, and at most 256 scenarios.
+        if (scenarios >= batch_minimum):
+            batch_count = max(min(processes, scenarios // batch_minimum), -(-scenarios // 256))
+        else:
+            batch_count = processes
+        batch_size = max(1, -(-scenarios // batch_count))
+
+    print("Sweeping %d scenarios over %d processes, in batches of %d." %
+          (scenarios, processes, batch_size))
+    for name, values in zip(parameter_fieldnames, ranges):
+        print("    %-16s %s" % (name + ":", ", ".join(["%g" % value for value in values])))
+    print("")
+    print("Writing results to %s" % result_filename)
+
+    time_start = time.time()
+
+    # make sure the cache is there before the workers go looking for it.
+    run_metrics.stage("parse")
+    worker_init(data_forecast_filename, data_actual_filename)
+
+    run_metrics.stage("dispatch")
+    result_file = open(result_filename, mode='w')
+    result_writer = csv.DictWriter(result_file,
+                                   fieldnames=parameter_fieldnames + simulate.summary_fieldnames,
+                                   lineterminator='\n')
+    result_writer.writeheader()
+
+    batches = grid_batches(itertools.product(*ranges), batch_size)
+
+    if (processes > 1):
+        pool = multiprocessing.Pool(processes, initializer=worker_init,
+                                    initargs=(data_forecast_filename, data_actual_filename))
+        results = pool.imap(scenario_batch_run, batches)
+    else:
+        pool = None
+        results = map(scenario_batch_run, batches)
+
+    for rows in results:
+        result_writer.writerows(rows)
+        run_metrics.rows_add(len(rows) * len(worker_actual['Load']))
+
+    if (pool != None):
+        pool.close()
+        pool.join()
+
+    result_file.close()
+
+    run_metrics.stage("report")
+    duration = time.time() - time_start
+    print("Simulated %d scenarios in %.2fs (%.2f scenarios/s)." %
+          (scenarios, duration, scenarios / duration))
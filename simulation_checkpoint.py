@@ -0,0 +1,135 @@
+#
+# Checkpoints for simulate.py, so that a run only re-simulates what changed.
+#
+# A checkpoint holds the hourly result series of a run, which includes the
+# battery and methane storage after every hour, and therefore the state to
+# continue from at any hour. It is split into segments: one per year, one
+# for the last hours of the run, whose forecast windows reach past the end
+# of the actual data and will change once more data arrives, and one per
+# earlier end of the data, from previous incremental runs.
+#
+# Every segment carries a digest of everything that went into it: the
+# config, the actual data of its hours and the forecast deficit its
+# forecast windows covered. When resuming, the segments are compared in
+# order, and the simulation continues from the start of the first segment
+# that no longer matches, with the state that the checkpoint recorded at
+# that hour.
+#
+# So appending a month of SMARD data costs a month of simulation, and a
+# change of parameters from a given year on (see checkpoint_resume())
+# costs the years from there.
+#
+
+import os
+import hashlib
+
+import numpy
+
+actual_fieldnames = ['Hour', 'Load', 'Hydropower', 'Wind onshore', 'Wind offshore', 'Photovoltaics']
+
+#
+# Indices of the first hour of every year after the first one.
+#
+def year_starts(data, hours):
+    years = numpy.asarray(data['Hour'][0:hours]).astype('datetime64[h]').astype('datetime64[Y]')
+    return (numpy.nonzero(years[1:] != years[:-1])[0] + 1).tolist()
+
+def segment_digest(config, data, forecast_deficit, start, end):
+    digest = hashlib.sha1(repr(config).encode())
+
+    for name in actual_fieldnames:
+        digest.update(numpy.ascontiguousarray(data[name][start:end]).tobytes())
+
+    forecast_end = min(end + config.forecast_hours - 1, len(forecast_deficit))
+    digest.update(numpy.ascontiguousarray(forecast_deficit[start:forecast_end]).tobytes())
+
+    return digest.hexdigest()
+
+#
+# Find where to continue a run from the checkpoint in filename, for the
+# given config and data.
+#
+# With year_from, the checkpoint is trusted for the hours before that year,
+# and the run continues from its start, to simulate changed parameters for
+# the later years only.
+#
+# Returns the hour to start simulating from, the result of the hours before
+# it, and the segments to keep. simulate.run_state() of that result gives
+# the state to continue with.
+#
+def checkpoint_resume(filename, config, data, forecast_deficit, year_from=None):
+    hours = len(data['Load'])
+
+    if (not os.path.isfile(filename)):
+        return 0, None, ([], [])
+
+    checkpoint = numpy.load(filename)
+    segment_start = checkpoint['segment_start'].tolist()
+    segment_end = checkpoint['segment_end'].tolist()
+    segment_digests = checkpoint['segment_digest'].tolist()
+
+    # the checkpoint has to be for the same hours.
+    checkpoint_hours = len(checkpoint['Hour'])
+    if ((checkpoint_hours > hours) or
+        (not numpy.array_equal(checkpoint['Hour'], data['Hour'][0:checkpoint_hours]))):
+        return 0, None, ([], [])
+
+    resume = 0
+    kept = 0
+    for start, end, digest in zip(segment_start, segment_end, segment_digests):
+        if (year_from != None):
+            year = str(numpy.asarray(data['Hour'][start]).astype('datetime64[h]').astype('datetime64[Y]'))
+            if (int(year) >= year_from):
+                break
+        elif (segment_digest(config, data, forecast_deficit, start, end) != digest):
+            break
+
+        resume = end
+        kept += 1
+
+    if (resume == 0):
+        return 0, None, ([], [])
+
+    result = {}
+    for name in checkpoint.files:
+        if ((name == 'Hour') or name.startswith('segment_')):
+            continue
+        result[name] = checkpoint[name][0:resume]
+
+    return resume, result, (list(zip(segment_start, segment_end))[0:kept], segment_digests[0:kept])
+
+#
+# Write a checkpoint for the full result. The kept segments, from
+# checkpoint_resume(), keep their digests, everything after them is split
+# into new segments.
+#
+def checkpoint_write(filename, config, data, forecast_deficit, result, segments_kept):
+    hours = len(result['load'])
+    segments, digests = segments_kept
+    segments = list(segments)
+    digests = list(digests)
+
+    if (segments):
+        resume = segments[-1][1]
+    else:
+        resume = 0
+
+    # the forecast windows of these hours reach past the actual data.
+    provisional = max(hours - (config.forecast_hours - 1), resume)
+
+    boundaries = [resume]
+    for boundary in year_starts(data, hours) + [provisional, hours]:
+        if (boundary > boundaries[-1]):
+            boundaries.append(boundary)
+
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        segments.append((start, end))
+        digests.append(segment_digest(config, data, forecast_deficit, start, end))
+
+    filename_temp = "%s.%d.npz" % (filename, os.getpid())
+    numpy.savez(filename_temp, Hour=numpy.asarray(data['Hour'][0:hours]),
+                segment_start=numpy.array([start for start, end in segments], dtype=numpy.int64),
+                segment_end=numpy.array([end for start, end in segments], dtype=numpy.int64),
+                segment_digest=numpy.array(digests),
+                **result)
+    os.replace(filename_temp, filename)
@@ -0,0 +1,392 @@
+#!/usr/bin/python
+
+#
+# Read the csv files created by simulation_data_prepare.py.
+#
+# Parsing 70k rows of text on every run, and in every worker, is wasted
+# work, so the numeric columns are converted once into a directory of .npy
+# files next to the csv, one file per column, with the Date and Time
+# replaced by hours since the unix epoch. Later runs, and parallel workers,
+# memory map those read-only, without copying.
+#
+# The cache remembers size and modification time of the csv it was created
+# from, and is rebuilt when either changes.
+#
+# Running this script directly (re)creates the cache for the given files.
+#
+
+import os
+import sys
+import csv
+import time
+import shutil
+import datetime
+import zoneinfo
+
+import numpy
+
+simulation_data_fieldnames = ['Load',
+                              'Hydropower',
+                              'Wind onshore',
+                              'Wind offshore',
+                              'Photovoltaics',
+]
+
+epoch_ordinal = datetime.date(1970, 1, 1).toordinal()
+
+#
+# Hours since the unix epoch for a SMARD style date and time.
+#
+def epoch_hour(date, time):
+    ordinal = datetime.date.fromisoformat(date).toordinal()
+    return (ordinal - epoch_ordinal) * 24 + int(time[0:2])
+
+#
+# Turn an array of epoch hours back into lists of Date and Time strings.
+#
+def epoch_hour_strings(hours):
+    stamps = numpy.datetime_as_string(numpy.asarray(hours, dtype='datetime64[h]'), unit='h')
+    return ([stamp[0:10] for stamp in stamps.tolist()],
+            [stamp[11:13] + ":00" for stamp in stamps.tolist()])
+
+#
+# SMARD dates and times are German local time, so every spring one hour is
+# missing and every autumn one hour is there twice. The epoch hours of
+# epoch_hour() are local ones. Joining files needs real, UTC, epoch hours.
+#
+timezone = zoneinfo.ZoneInfo("Europe/Berlin")
+
+def utc_offset(hour):
+    return int(datetime.datetime.fromtimestamp(hour * 3600, timezone).utcoffset().total_seconds()) // 3600
+
+#
+# The UTC offsets of local time around an array of epoch hours, as the UTC
+# epoch hours each offset starts at and the offsets. The offset changes at
+# most once a month, so every month it does is bisected for the hour.
+#
+def utc_offset_changes(hours):
+    bounds = numpy.array([numpy.min(hours) - 48, numpy.max(hours) + 48]).astype('datetime64[h]')
+    months = numpy.arange(bounds[0].astype('datetime64[M]'), bounds[1].astype('datetime64[M]') + 2)
+    starts = months.astype('datetime64[h]').astype(numpy.int64).tolist()
+    offsets = [utc_offset(hour) for hour in starts]
+
+    changes = ([starts[0]], [offsets[0]])
+    for i in range(len(starts) - 1):
+        if (offsets[i] != offsets[i + 1]):
+            low = starts[i]
+            high = starts[i + 1]
+            while ((high - low) > 1):
+                middle = (low + high) // 2
+                if (utc_offset(middle) == offsets[i]):
+                    low = middle
+                else:
+                    high = middle
+            changes[0].append(high)
+            changes[1].append(offsets[i + 1])
+
+    return numpy.array(changes[0]), numpy.array(changes[1])
+
+def utc_offsets_at(changes, hours):
+    starts, offsets = changes
+    return offsets[numpy.maximum(numpy.searchsorted(starts, hours, side='right') - 1, 0)]
+
+#
+# Local epoch hours of UTC epoch hours.
+#
+def epoch_hours_local(hours):
+    hours = numpy.asarray(hours, dtype=numpy.int64)
+    if (len(hours) == 0):
+        return hours.copy()
+
+    return hours + utc_offsets_at(utc_offset_changes(hours), hours)
+
+#
+# The local epoch hours from first up to last that do not exist, as the
+# clocks skip them in spring.
+#
+def epoch_hours_skipped(first, last):
+    starts, offsets = utc_offset_changes([first, last])
+
+    skipped = numpy.concatenate([numpy.arange(start + before, start + after) for start, before, after in
+                                 zip(starts[1:].tolist(), offsets[:-1].tolist(), offsets[1:].tolist())] +
+                                [numpy.zeros(0, dtype=numpy.int64)])
+    return skipped[(skipped >= first) & (skipped < last)]
+
+#
+# UTC epoch hours of local epoch hours, in the order of the file they are
+# from: of an hour that is there twice, the first one is the earlier. An
+# hour that does not exist, in spring, ends up the same as the one after.
+#
+def epoch_hours_utc(hours):
+    hours = numpy.asarray(hours, dtype=numpy.int64)
+    if (len(hours) == 0):
+        return hours.copy()
+
+    changes = utc_offset_changes(hours)
+    offsets = numpy.unique(changes[1])[::-1]
+
+    # the offsets that lead back to the local hour, earliest UTC hour first.
+    valid = numpy.array([utc_offsets_at(changes, hours - offset) == offset for offset in offsets.tolist()])
+    hour_offsets = offsets[numpy.argmax(valid, axis=0)]
+
+    repeated = numpy.flatnonzero(valid.sum(axis=0) > 1)
+    if (len(repeated) > 0):
+        again = numpy.ones(len(repeated), dtype=bool)
+        again[numpy.unique(hours[repeated], return_index=True)[1]] = False
+        later = offsets[len(offsets) - 1 - numpy.argmax(valid[::-1], axis=0)]
+        hour_offsets[repeated[again]] = later[repeated[again]]
+
+    missing = ~valid.any(axis=0)
+    hour_offsets[missing] = utc_offsets_at(changes, hours[missing] - offsets[0])
+
+    return hours - hour_offsets
+
+#
+# The number written by each of an array of digit strings of equal length,
+# taken from their code points, which is a lot faster than numpy's string
+# conversion.
+#
+def digits_value(texts):
+    texts = numpy.ascontiguousarray(texts)
+    digits = texts.view(numpy.uint32).reshape(len(texts), -1).astype(numpy.int64) - ord("0")
+    if ((digits < 0).any() or (digits > 9).any()):
+        return texts.astype(numpy.int64)
+    return digits @ (10 ** numpy.arange(digits.shape[1] - 1, -1, -1))
+
+#
+# Days since the unix epoch of an array of "YYYY-MM-DD" strings.
+#
+def epoch_days(dates):
+    if ((len(dates) == 0) or (dates.dtype != numpy.dtype('U10'))):
+        return dates.astype('datetime64[D]').astype(numpy.int64)
+
+    dates = numpy.ascontiguousarray(dates)
+    characters = dates.view(numpy.uint32).reshape(len(dates), 10)
+    if ((characters[:, 4] != ord("-")).any() or (characters[:, 7] != ord("-")).any()):
+        return dates.astype('datetime64[D]').astype(numpy.int64)
+
+    text = dates.view('U1').reshape(len(dates), 10)
+    years = digits_value(numpy.ascontiguousarray(text[:, 0:4]).view('U4').ravel())
+    months = digits_value(numpy.ascontiguousarray(text[:, 5:7]).view('U2').ravel())
+    days = digits_value(numpy.ascontiguousarray(text[:, 8:10]).view('U2').ravel())
+    if ((months < 1).any() or (months > 12).any()):
+        return dates.astype('datetime64[D]').astype(numpy.int64)
+
+    # numpy complains about impossible days, like the 30th of February.
+    months = ((years - 1970) * 12 + months - 1).astype('datetime64[M]')
+    firsts = months.astype('datetime64[D]').astype(numpy.int64)
+    lengths = (months + 1).astype('datetime64[D]').astype(numpy.int64) - firsts
+    if ((days < 1).any() or (days > lengths).any()):
+        return dates.astype('datetime64[D]').astype(numpy.int64)
+
+    return firsts + days - 1
+
+#
+# Floats of a column of csv text, with NaN for the "-" and empty values
+# that SMARD uses for hours it has no data for.
+#
+def column_float(texts):
+    try:
+        return texts.astype(numpy.float64)
+    except ValueError:
+        pass
+
+    values = numpy.empty(len(texts), dtype=numpy.float64)
+    for i, text in enumerate(texts.tolist()):
+        try:
+            values[i] = float(text)
+        except ValueError:
+            values[i] = numpy.nan
+    return values
+
+#
+# Offset of a line shortly before the first line of a csv, sorted by date,
+# whose date is not before the given date, found by bisecting the file.
+#
+def hourly_csv_offset(filename, date_column, date):
+    with open(filename, mode='rb') as data_file:
+        data_file.readline()
+        low = data_file.tell()
+        high = data_file.seek(0, os.SEEK_END)
+        target = date.encode()
+
+        # only bisect down to a block, which the parser skips quickly.
+        while ((high - low) > 65536):
+            middle = (low + high) // 2
+            data_file.seek(middle)
+            data_file.readline()
+            line = data_file.readline()
+            if ((not line) or (line.split(b",")[date_column] >= target)):
+                high = middle
+            else:
+                low = middle
+
+        # to the start of the line low is in, or the first line.
+        data_file.seek(low - 1)
+        data_file.readline()
+        return data_file.tell()
+
+#
+# Parse an hourly csv with a Date column and the given time column into a
+# dict of numpy arrays: 'Hour' holds epoch hours, the other keys are the
+# given columns, in file order.
+#
+# With hour_from, only the rows from about a day before that hour on are
+# parsed, for files sorted by date.
+#
+# numpy parses the columns we need straight into typed arrays. Only a file
+# with values missing is parsed as text first.
+#
+def hourly_csv_read(filename, time_fieldname, fieldnames, hour_from=None):
+    with open(filename, mode='r') as data_file:
+        header = next(csv.reader([data_file.readline()]))
+        columns = [header.index(name) for name in ['Date', time_fieldname] + fieldnames]
+
+        if (hour_from != None):
+            dates, times = epoch_hour_strings([hour_from - 24])
+            data_file.seek(hourly_csv_offset(filename, columns[0], dates[0]))
+        start = data_file.tell()
+
+        # the hour of "HH:MM" is the U2.
+        try:
+            rows = numpy.loadtxt(data_file, delimiter=',', quotechar='"', usecols=columns, ndmin=1,
+                                 dtype=([('Date', 'U10'), ('Time', 'U2')] +
+                                        [('f%d' % i, numpy.float64) for i in range(len(fieldnames))]))
+            dates = rows['Date']
+            times = rows['Time']
+            values = [rows['f%d' % i] for i in range(len(fieldnames))]
+        except ValueError:
+            data_file.seek(start)
+            rows = numpy.loadtxt(data_file, delimiter=',', quotechar='"', usecols=columns, ndmin=2,
+                                 dtype=str)
+            dates = rows[:, 0].astype('U10')
+            times = rows[:, 1].astype('U2')
+            values = [column_float(rows[:, i + 2]) for i in range(len(fieldnames))]
+
+    data = {'Hour': epoch_days(dates) * 24 + digits_value(times)}
+    for name, column in zip(fieldnames, values):
+        data[name] = column
+
+    return data
+
+#
+# Parse the csv into a dict of numpy arrays: 'Hour' holds epoch hours, the
+# other keys are the columns in simulation_data_fieldnames.
+#
+def simulation_data_read(filename):
+    return hourly_csv_read(filename, 'Time', simulation_data_fieldnames)
+
+def cache_dirname(filename):
+    return filename + ".cache"
+
+def cache_stamp(filename):
+    status = os.stat(filename)
+    return "%d %d\n" % (status.st_size, status.st_mtime_ns)
+
+def cache_valid(filename):
+    stamp_filename = os.path.join(cache_dirname(filename), "source")
+    if (not os.path.isfile(stamp_filename)):
+        return False
+
+    with open(stamp_filename, mode='r') as stamp_file:
+        return (stamp_file.read() == cache_stamp(filename))
+
+#
+# Write the cache directory. It is assembled under a temporary name and
+# renamed into place, so a concurrent reader never sees half a cache.
+#
+def cache_write(filename, data):
+    dirname = cache_dirname(filename)
+    dirname_temp = "%s.%d" % (dirname, os.getpid())
+
+    shutil.rmtree(dirname_temp, ignore_errors=True)
+    os.mkdir(dirname_temp)
+
+    for name, values in data.items():
+        numpy.save(os.path.join(dirname_temp, name + ".npy"), values)
+
+    # stamp last, so that it only exists for a complete cache.
+    with open(os.path.join(dirname_temp, "source"), mode='w') as stamp_file:
+        stamp_file.write(cache_stamp(filename))
+
+    # someone else just put a valid cache in place, which readers may be
+    # using already.
+    if (cache_valid(filename)):
+        shutil.rmtree(dirname_temp, ignore_errors=True)
+        return
+
+    # a stale cache is moved aside and removed after the swap, so that its
+    # files never disappear from under a reader that is opening them.
+    dirname_old = "%s.old.%d" % (dirname, os.getpid())
+    try:
+        os.rename(dirname, dirname_old)
+    except OSError:
+        dirname_old = None
+
+    try:
+        os.rename(dirname_temp, dirname)
+    except OSError:
+        # someone else just put a cache in place.
+        shutil.rmtree(dirname_temp, ignore_errors=True)
+
+    if (dirname_old != None):
+        shutil.rmtree(dirname_old, ignore_errors=True)
+
+#
+# Memory map the given columns of the cache, all of them by default. The
+# stamp is read before and after, and has to be the one of the csv both
+# times, so that all columns come from the same complete cache of the
+# current csv. Returns None if they do not, or if the cache is missing,
+# as it is for a moment while cache_write() swaps it.
+#
+def cache_read(filename, fieldnames=simulation_data_fieldnames):
+    dirname = cache_dirname(filename)
+    stamp_filename = os.path.join(dirname, "source")
+
+    try:
+        with open(stamp_filename, mode='r') as stamp_file:
+            stamp = stamp_file.read()
+
+        data = {}
+        for name in ['Hour'] + fieldnames:
+            data[name] = numpy.load(os.path.join(dirname, name + ".npy"), mmap_mode='r')
+
+        with open(stamp_filename, mode='r') as stamp_file:
+            if ((stamp_file.read() != stamp) or (stamp != cache_stamp(filename))):
+                return None
+    except FileNotFoundError:
+        return None
+
+    return data
+
+cache_tries = 20
+
+#
+# Load the simulation data, through the cache. Returns the same dict as
+# simulation_data_read(), but with read-only memory mapped arrays.
+#
+# While other processes keep replacing the cache, it is tried again a few
+# times, before giving up on it and parsing the csv.
+#
+def simulation_data_load(filename):
+    for attempt in range(cache_tries):
+        if (attempt > 0):
+            time.sleep(0.01 * attempt)
+        if (not cache_valid(filename)):
+            cache_write(filename, simulation_data_read(filename))
+
+        data = cache_read(filename)
+        if (data != None):
+            return data
+
+    return simulation_data_read(filename)
+
+if __name__ == "__main__":
+    if (len(sys.argv) < 2):
+        print("Error: Wrong number of arguments.")
+        print("%s <simulation data csv> [simulation data csv ...]" % (sys.argv[0]))
+        sys.exit()
+
+    for filename in sys.argv[1:]:
+        print("Caching %s in %s" % (filename, cache_dirname(filename)))
+        cache_write(filename, simulation_data_read(filename))
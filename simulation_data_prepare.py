@@ -10,27 +10,67 @@
 # We keep the generation information as a fraction of installed capacity for
 # ease of calculation.
 #
+# The inputs are joined by hour, not by row: every file is parsed into
+# arrays keyed by epoch hour, and looked up on a common hourly timeline.
+# SMARD's German local time is turned into UTC hours for that, so that the
+# hour autumn has twice counts twice, and the one spring skips not at all.
+# The results are written in local time again. Duplicated hours keep their
+# first row. Hours that a file lacks, or has no value for, are reported,
+# and then handled according to --holes=<policy>:
+#
+#   interpolate   linearly interpolate the missing values (default).
+#   skip          leave out the hour, from both outputs.
+#   abort         stop without writing anything.
+#
+# With --append, the results are continued after the last hour they have,
+# and only the input rows from there on are parsed and written. The hours
+# after the actual data, which only have forecasts, are cut off the
+# forecast results and written again.
+#
 #
 # Data for new capacity for 2022 is still preliminary: 7200.0 of solar,
 # 2000.0 for onshore wind. Offshore wind is already known at a total of 8129MW
 
+import os
 import sys
 import csv
+import operator
+
+import numpy
 
-if (len(sys.argv) != 8):
+import simulation_data
+import run_metrics
+
+run_metrics.setup(sys.argv)
+
+hole_policies = ['interpolate', 'skip', 'abort']
+hole_policy = 'interpolate'
+append = False
+
+arguments = []
+for argument in sys.argv:
+    if (argument.startswith("--holes=")):
+        hole_policy = argument[len("--holes="):]
+    elif (argument == "--append"):
+        append = True
+    else:
+        arguments.append(argument)
+
+if ((len(arguments) != 8) or (hole_policy not in hole_policies)):
     print("Error: Wrong number of arguments.")
     print("%s <consumption forecast csv> <consumption actual csv> <generation "
           "forecast csv> <generation actual csv> <generation capacity csv> "
-          "<output forecast csv> <output actual csv>" % (sys.argv[0]))
+          "<output forecast csv> <output actual csv> [--holes=%s] [--append]" %
+          (arguments[0], "|".join(hole_policies)))
     sys.exit()
 
-load_forecast_filename = sys.argv[1]
-load_actual_filename = sys.argv[2]
-capacity_filename = sys.argv[3]
-forecast_filename = sys.argv[4]
-actual_filename = sys.argv[5]
-result_forecast_filename = sys.argv[6]
-result_actual_filename = sys.argv[7]
+load_forecast_filename = arguments[1]
+load_actual_filename = arguments[2]
+capacity_filename = arguments[3]
+forecast_filename = arguments[4]
+actual_filename = arguments[5]
+result_forecast_filename = arguments[6]
+result_actual_filename = arguments[7]
 
 #print("Reading grid load forecast data from %s" % load_forecast_filename)
 #print("Reading actual grid load data from %s" % load_actual_filename)
@@ -40,67 +80,239 @@ result_actual_filename = sys.argv[7]
 print("Writing resulting forecast data to %s" % result_forecast_filename)
 print("Writing resulting actual data to %s" % result_actual_filename)
 
-year_start = 10000
-year_end = 0
+#
+# Date and Time of the last row of a result file, read from its end, and
+# whether it is the second row of an hour that is there twice.
+#
+def result_last_stamp(filename):
+    with open(filename, mode='rb') as result_file:
+        size = result_file.seek(0, os.SEEK_END)
+        result_file.seek(max(0, size - 4096))
+        stamps = [",".join(line.decode().split(",")[0:2]) for line in result_file.read().splitlines()[-2:]]
+
+    if (stamps[-1] == "Date,Time"):
+        return None, False
+    return stamps[-1], ((len(stamps) == 2) and (stamps[0] == stamps[1]))
+
+#
+# Offset just after the row of a result file for the given Date and Time,
+# searched for from the end of the file. Of an hour that is there twice,
+# the first row is the one unless again is set.
+#
+def result_offset_after(filename, stamp, again):
+    pattern = ("\n%s," % stamp).encode()
+    block = 65536
+
+    with open(filename, mode='rb') as result_file:
+        size = result_file.seek(0, os.SEEK_END)
+        while True:
+            start = max(0, size - block)
+            result_file.seek(start)
+            text = result_file.read()
+
+            position = text.rfind(pattern)
+            if ((position >= 0) and (not again)):
+                previous = text.rfind(pattern, 0, position)
+                if ((previous >= 0) and (text.index(b"\n", previous + 1) == position)):
+                    position = previous
+            if (position >= 0):
+                return start + text.index(b"\n", position + 1) + 1
+            if (start == 0):
+                return None
+            block *= 4
+
+hour_from = None
+forecast_offset = None
+if (append and os.path.isfile(result_actual_filename) and os.path.isfile(result_forecast_filename)):
+    stamp, again = result_last_stamp(result_actual_filename)
+    if (stamp != None):
+        forecast_offset = result_offset_after(result_forecast_filename, stamp, again)
+        if (forecast_offset == None):
+            print("Error: %s has no row for %s, which %s ends with." %
+                  (result_forecast_filename, stamp, result_actual_filename))
+            sys.exit()
+
+        date, time = stamp.split(",")
+        hour = simulation_data.epoch_hour(date, time)
+        hour_from = simulation_data.epoch_hours_utc([hour, hour])[1 if (again) else 0] + 1
+        print("Appending after %s %s." % (date, time))
 
 #
 # SMARD installed capacity data is not granular. It mostly gets updated
-# once a year. So first create dict with yearly capacity numbers, then
-# calculate the linear interpolation per day.
+# once a year. So first collect the capacity at the start of every year,
+# then calculate the linear interpolation per day.
 #
 
-capacity_yearly = {}
+run_metrics.stage("parse")
+capacity_fieldnames = ['Photovoltaics', 'Wind onshore', 'Wind offshore']
+capacity_yearly = {'Day': []}
+for fieldname in capacity_fieldnames:
+    capacity_yearly[fieldname] = []
+
 with open(capacity_filename, mode='r') as capacity_file:
-    capacity_reader = csv.DictReader(capacity_file)
+    # only the first hour of every year is used, skip parsing the rest.
+    header = capacity_file.readline()
+    lines = [line for line in capacity_file if ("-01-01," in line)]
+    capacity_reader = csv.DictReader([header] + lines)
     for row in capacity_reader:
         if (row['Date'].endswith("-01-01") and
             row['Time'] == "00:00"):
-            year = int(row['Date'][0:4])
-            if (year < year_start):
-                year_start = year
-            if (year > year_end):
-                year_end = year
-            capacity = {'Year' : year,
-                        'Photovoltaics' : float(row['Photovoltaics [MW]']),
-                        'Wind onshore' : float(row['Wind onshore [MW]']),
-                        'Wind offshore' : float(row['Wind offshore [MW]'])}
-            capacity_yearly[year] = (capacity)
-
-year_end = 2023
-
-capacity_interpolated = {}
-
-for year in range(year_start, year_end):
-    current = capacity_yearly[year]
-    future = capacity_yearly[year + 1]
-
-    if ((year % 4) == 0):
-        days = 366
-    else:
-        days = 365
+            capacity_yearly['Day'].append(simulation_data.epoch_hour(row['Date'], row['Time']) // 24)
+            for fieldname in capacity_fieldnames:
+                capacity_yearly[fieldname].append(float(row[fieldname + ' [MW]']))
+
+if (not capacity_yearly['Day']):
+    print("Error: No capacity for the start of any year in %s." % (capacity_filename))
+    sys.exit()
+
+order = numpy.argsort(capacity_yearly['Day'])
+for name, values in capacity_yearly.items():
+    capacity_yearly[name] = numpy.array(values)[order]
+
+#
+# The hourly inputs: file, time column, and the columns we use.
+#
+sources = {
+    'load_forecast': (load_forecast_filename, 'Start', ['Total (grid load) [MWh]']),
+    'load_actual': (load_actual_filename, 'Time', ['Total (grid load) [MWh]']),
+    'forecast': (forecast_filename, 'Start',
+                 ['Photovoltaics [MWh]', 'Wind onshore [MWh]', 'Wind offshore [MWh]']),
+    'actual': (actual_filename, 'Start',
+               ['Hydropower [MWh]', 'Photovoltaics [MWh]', 'Wind onshore [MWh]', 'Wind offshore [MWh]']),
+}
+
+#
+# Parse an hourly source, sorted by UTC hour, with duplicated hours reduced
+# to their first row.
+#
+def source_read(name):
+    filename, time_fieldname, fieldnames = sources[name]
+    data = simulation_data.hourly_csv_read(filename, time_fieldname, fieldnames, hour_from=hour_from)
 
-    current['Photovoltaics growth'] = (future['Photovoltaics'] - current['Photovoltaics']) / days
-    current['Wind onshore growth'] = (future['Wind onshore'] - current['Wind onshore']) / days
-    current['Wind offshore growth'] = (future['Wind offshore'] - current['Wind offshore']) / days
+    hours, first = numpy.unique(simulation_data.epoch_hours_utc(data['Hour']), return_index=True)
+    duplicates = len(data['Hour']) - len(hours)
+    if (duplicates):
+        print("%s: %d duplicated hours, keeping the first of each." % (filename, duplicates))
 
-    #print(current)
-    capacity_interpolated[year] = current
+    source = {'Hour': hours}
+    for fieldname in fieldnames:
+        source[fieldname] = data[fieldname][first]
+    return source
 
+data = {}
+for name in sources:
+    data[name] = source_read(name)
+
+run_metrics.stage("prepare")
 
 #
-# Now run through the data, and calculated the percentage
+# The common timeline: every hour that all inputs cover is actual data,
+# the hours after that which both forecasts still cover are forecast only.
+# When appending, it starts right after the existing results.
 #
-load_forecast_file = open(load_forecast_filename, mode='r')
-load_forecast_reader = csv.DictReader(load_forecast_file)
+if (hour_from != None):
+    hour_first = hour_from
+else:
+    hour_first = max([source['Hour'][0] for source in data.values()])
+hour_actual_end = max(min([source['Hour'][-1] for source in data.values()]) + 1, hour_first)
+hour_forecast_end = max(min(data['load_forecast']['Hour'][-1], data['forecast']['Hour'][-1]) + 1,
+                        hour_actual_end)
 
-load_actual_file = open(load_actual_filename, mode='r')
-load_actual_reader = csv.DictReader(load_actual_file)
+hours = numpy.arange(hour_first, hour_forecast_end, dtype=numpy.int64)
+actual_hours = hour_actual_end - hour_first
 
-forecast_file = open(forecast_filename, mode='r')
-forecast_reader = csv.DictReader(forecast_file)
+#
+# Look the values of a source up on the timeline, with NaN where it has
+# none.
+#
+def source_align(source, hours):
+    index = numpy.minimum(numpy.searchsorted(source['Hour'], hours), len(source['Hour']) - 1)
+    found = (source['Hour'][index] == hours)
 
-actual_file = open(actual_filename, mode='r')
-actual_reader = csv.DictReader(actual_file)
+    aligned = {}
+    for fieldname, values in source.items():
+        if (fieldname != 'Hour'):
+            aligned[fieldname] = numpy.where(found, values[index], numpy.nan)
+    return aligned
+
+def hour_string(hour):
+    dates, times = simulation_data.epoch_hour_strings(simulation_data.epoch_hours_local([hour]))
+    return "%s %s" % (dates[0], times[0])
+
+#
+# Print the holes of a source, as ranges of consecutive missing hours.
+#
+def holes_report(filename, missing, hours):
+    missing_index = numpy.nonzero(missing)[0]
+    if (len(missing_index) == 0):
+        return
+
+    breaks = numpy.nonzero(numpy.diff(missing_index) != 1)[0]
+    starts = numpy.concatenate(([missing_index[0]], missing_index[breaks + 1]))
+    ends = numpy.concatenate((missing_index[breaks], [missing_index[-1]]))
+
+    print("%s: %d hours missing, in %d holes:" % (filename, len(missing_index), len(starts)))
+    for start, end in list(zip(starts, ends))[0:10]:
+        print("  %s - %s" % (hour_string(hours[start]), hour_string(hours[end])))
+    if (len(starts) > 10):
+        print("  ...")
+
+aligned = {}
+missing = numpy.zeros(len(hours), dtype=bool)
+for name, (filename, time_fieldname, fieldnames) in sources.items():
+    aligned[name] = source_align(data[name], hours)
+
+    # the actual data only needs to cover the actual hours.
+    source_missing = numpy.zeros(len(hours), dtype=bool)
+    for fieldname in fieldnames:
+        source_missing |= numpy.isnan(aligned[name][fieldname])
+    if (name in ['load_actual', 'actual']):
+        source_missing[actual_hours:] = False
+
+    holes_report(filename, source_missing, hours)
+    missing |= source_missing
+
+if (missing.any()):
+    if (hole_policy == 'abort'):
+        print("Error: Missing hours, aborting.")
+        sys.exit()
+
+    if (hole_policy == 'interpolate'):
+        for name, (filename, time_fieldname, fieldnames) in sources.items():
+            end = len(hours)
+            if (name in ['load_actual', 'actual']):
+                end = actual_hours
+
+            for fieldname in fieldnames:
+                values = aligned[name][fieldname][0:end]
+                present = ~numpy.isnan(values)
+                values[~present] = numpy.interp(hours[0:end][~present], hours[0:end][present],
+                                                values[present])
+
+        print("Interpolated %d hours." % (missing.sum()))
+        missing[:] = False
+    else:
+        print("Skipping %d hours." % (missing.sum()))
+
+#
+# Installed capacity of every local day of the timeline, linearly
+# interpolated between the start of the years before and after it. Before
+# the first and after the last year we have, the capacity stays as it is.
+#
+local_hours = simulation_data.epoch_hours_local(hours)
+local_bounds = simulation_data.epoch_hours_local([hour_first, max(hour_forecast_end - 1, hour_first)])
+day_first = local_bounds[0] // 24
+day_index = local_hours // 24 - day_first
+days = numpy.arange(day_first, local_bounds[1] // 24 + 1)
+
+capacity_daily = {}
+for fieldname in capacity_fieldnames:
+    capacity_daily[fieldname] = numpy.interp(days, capacity_yearly['Day'], capacity_yearly[fieldname])
+
+#
+# Now calculate the fraction of installed capacity, and write the results.
+#
+run_metrics.stage("write")
 
 result_fieldnames = ['Date',
                      'Time',
@@ -111,138 +323,102 @@ result_fieldnames = ['Date',
                      'Photovoltaics',
 ]
 
-result_forecast_file = open(result_forecast_filename, mode='w')
-result_forecast_writer = csv.DictWriter(result_forecast_file,
-                                        fieldnames=result_fieldnames,
-                                        lineterminator='\n')
-result_forecast_writer.writeheader()
-
-result_actual_file = open(result_actual_filename, mode='w')
-result_actual_writer = csv.DictWriter(result_actual_file,
-                                      fieldnames=result_fieldnames,
-                                      lineterminator='\n')
-result_actual_writer.writeheader()
-
-photovoltaics_capacity = 0.0
-wind_onshore_capacity = 0.0
-wind_offshore_capacity = 0.0
-photovoltaics_growth = 0.0
-wind_onshore_growth = 0.0
-wind_offshore_growth = 0.0
-
-while True:
-    load_actual = next(load_actual_reader, None)
-    if (load_actual == None):
-        break
-    #print(load_actual)
-
-    actual = next(actual_reader, None)
-    if (actual == None):
-        break
-    #print(actual)
-
-    load_forecast = next(load_forecast_reader, None)
-    if (load_forecast == None):
-        break
-    #print(load_forecast)
-
-    forecast = next(forecast_reader, None)
-    if (forecast == None):
-        break
-    #print(forecast)
-
-    if ((load_forecast['Date'] != load_actual['Date']) or
-        (load_forecast['Start'] != load_actual['Time']) or
-        (load_forecast['Date'] != actual['Date']) or
-        (load_forecast['Start'] != actual['Start']) or
-        (forecast['Date'] != actual['Date']) or
-        (forecast['Start'] != actual['Start'])):
-        print("Error: mismatched rows:")
-        print("  load_forecast: %s %s" % (load_forecast['Date'], load_forecast['Start']))
-        print("  load_actual: %s %s" % (load_actual['Date'], load_actual['Time']))
-        print("  forecast: %s %s" % (forecast['Date'], forecast['Start']))
-        print("  actual: %s %s" % (actual['Date'], actual['Start']))
-        sys.exit()
-
-    if (forecast['Start'] == "00:00"):
-        if (forecast['Date'].endswith("-01-01")):
-            year = int(forecast['Date'][0:4])
-            capacity = capacity_interpolated[year]
-            photovoltaics_capacity = capacity['Photovoltaics']
-            wind_onshore_capacity = capacity['Wind onshore']
-            wind_offshore_capacity = capacity['Wind offshore']
-            photovoltaics_growth = capacity['Photovoltaics growth']
-            wind_onshore_growth = capacity['Wind onshore growth']
-            wind_offshore_growth = capacity['Wind offshore growth']
-
-            #print("%d: Photovoltaics %f + %f, Wind onshore %f + %f, Wind offshore %f + %f" %
-            #      (year, photovoltaics_capacity, photovoltaics_growth, wind_onshore_capacity,
-            #       wind_onshore_growth, wind_offshore_capacity, wind_offshore_growth))
-        else:
-            photovoltaics_capacity += photovoltaics_growth
-            wind_onshore_capacity += wind_onshore_growth
-            wind_offshore_capacity += wind_offshore_growth
-
-    result_forecast = {'Date': forecast['Date'],
-                       'Time': forecast['Start'],
-                       'Load' : round(float(load_forecast['Total (grid load) [MWh]']), 2),
-                       'Hydropower' : actual['Hydropower [MWh]'], # no forecase data available
-                       'Photovoltaics': round((float(forecast['Photovoltaics [MWh]']) / photovoltaics_capacity), 4),
-                       'Wind onshore': round((float(forecast['Wind onshore [MWh]']) / wind_onshore_capacity), 4),
-                       'Wind offshore': round((float(forecast['Wind offshore [MWh]']) / wind_offshore_capacity), 4),
-    }
-    result_forecast_writer.writerow(result_forecast)
-
-    result = {'Date': forecast['Date'],
-              'Time': forecast['Start'],
-              'Load' : round(float(load_actual['Total (grid load) [MWh]']), 2),
-              'Hydropower' : actual['Hydropower [MWh]'],
-              'Photovoltaics': round((float(actual['Photovoltaics [MWh]']) / photovoltaics_capacity), 4),
-              'Wind onshore': round((float(actual['Wind onshore [MWh]']) / wind_onshore_capacity), 4),
-              'Wind offshore': round((float(actual['Wind offshore [MWh]']) / wind_offshore_capacity), 4),
-    }
-
-    #print(result)
-    result_actual_writer.writerow(result)
-
-
-#
-# Now we need several further days of forecasts.
-#
-if (load_forecast == None):
-    sys.exit()
-if (load_forecast['Start'] == "23:00"):
-    load_forecast = next(load_forecast_reader, None)
-    if (load_forecast == None):
-        sys.exit()
-
-print("Load_forecast:")
-#print(load_forecast)
-
-if (forecast == None):
-    sys.exit()
-if (forecast['Start'] == "23:00"):
-    forecast = next(forecast_reader, None)
-    if (forecast == None):
-        sys.exit()
-print("Forecast")
-#print(forecast)
-
-while True:
-    result_forecast = {'Date': forecast['Date'],
-                       'Time': forecast['Start'],
-                       'Load' : round(float(load_forecast['Total (grid load) [MWh]']), 2),
-                       'Hydropower' : "1250.00", # no forecase data available
-                       'Photovoltaics': round((float(forecast['Photovoltaics [MWh]']) / photovoltaics_capacity), 4),
-                       'Wind onshore': round((float(forecast['Wind onshore [MWh]']) / wind_onshore_capacity), 4),
-                       'Wind offshore': round((float(forecast['Wind offshore [MWh]']) / wind_offshore_capacity), 4),
-    }
-    result_forecast_writer.writerow(result_forecast)
-
-    load_forecast = next(load_forecast_reader, None)
-    if (load_forecast == None):
-        break
-
-    forecast = next(forecast_reader, None)
-    if (forecast == None):
-        break
+#
+# Text of the values as csv.writer would write them, the repr of the value
+# rounded to digits. That is the correctly rounded "%.<digits>f" without
+# its trailing zeros, which is a lot cheaper to get at. With zeros, it is
+# just "%.<digits>f".
+#
+# Cheaper still is rounding the values scaled to whole numbers, and looking
+# up the text of the fraction, and of the whole number if it is small. Only
+# values too close to half a digit for that to be exact, and negative or
+# huge ones, go through "%.<digits>f".
+#
+fraction_texts = {}
+
+def column_text(values, digits, zeros=False):
+    if ((digits, zeros) not in fraction_texts):
+        fractions = ["%0*d" % (digits, fraction) for fraction in range(10 ** digits)]
+        if (not zeros):
+            fractions = [fraction.rstrip("0") or "0" for fraction in fractions]
+        fraction_texts[(digits, zeros)] = numpy.array(["." + fraction for fraction in fractions], dtype=object)
+
+    values = numpy.asarray(values, dtype=numpy.float64)
+    scaled = values * (10 ** digits)
+    rounded = numpy.rint(scaled)
+    with numpy.errstate(invalid='ignore'):
+        exact = ((scaled >= 0.0) & (scaled < 1e9) & ~numpy.signbit(values) &
+                 (numpy.abs(scaled - rounded) < 0.5 - 1e-6))
+
+    units = numpy.where(exact, rounded, 0.0).astype(numpy.int64)
+    wholes = units // (10 ** digits)
+    fractions = fraction_texts[(digits, zeros)][units % (10 ** digits)]
+    if ((len(units) > 0) and (wholes.max() < len(units))):
+        # fractions of capacity are 0 or 1, so look the whole numbers up as well.
+        whole_texts = numpy.array(list(map(str, range(wholes.max() + 1))), dtype=object)
+        texts = (whole_texts[wholes] + fractions).tolist()
+    else:
+        texts = list(map(operator.add, map(str, wholes.tolist()), fractions.tolist()))
+
+    value_format = "%%.%df" % digits
+    for i in numpy.flatnonzero(~exact).tolist():
+        text = value_format % values[i]
+        if (not zeros):
+            text = text.rstrip("0")
+            text = (text + "0") if text.endswith(".") else text
+        texts[i] = text
+    return texts
+
+def result_lines(stamps, load, hydropower, generation, keep):
+    keep_index = numpy.nonzero(keep)[0]
+    columns = [stamps[keep_index].tolist(),
+               column_text(load[keep_index], 2),
+               hydropower[keep_index].tolist()]
+    for fieldname, capacity_fieldname in [('Wind onshore [MWh]', 'Wind onshore'),
+                                          ('Wind offshore [MWh]', 'Wind offshore'),
+                                          ('Photovoltaics [MWh]', 'Photovoltaics')]:
+        capacity = capacity_daily[capacity_fieldname][day_index[keep_index]]
+        columns.append(column_text(generation[fieldname][keep_index] / capacity, 4))
+
+    columns[-1] = [text + "\n" for text in columns[-1]]
+    return list(map(",".join, zip(*columns)))
+
+# the Date and Time of every hour, from the texts of its day and its hour.
+day_texts = numpy.datetime_as_string(days.astype('datetime64[D]')).astype(object)
+hour_texts = numpy.array([",%02d:00" % hour for hour in range(24)], dtype=object)
+stamps = day_texts[day_index] + hour_texts[local_hours % 24]
+keep = ~missing
+
+hydropower = numpy.empty(len(hours), dtype=object)
+hydropower[0:actual_hours] = column_text(aligned['actual']['Hydropower [MWh]'][0:actual_hours], 2, zeros=True)
+# no forecast data available
+hydropower[actual_hours:] = "1250.00"
+
+forecast_lines = result_lines(stamps, aligned['load_forecast']['Total (grid load) [MWh]'],
+                              hydropower, aligned['forecast'], keep)
+
+keep[actual_hours:] = False
+lines = result_lines(stamps, aligned['load_actual']['Total (grid load) [MWh]'],
+                     hydropower, aligned['actual'], keep)
+
+if (forecast_offset == None):
+    with open(result_forecast_filename, mode='w') as result_forecast_file:
+        result_forecast_file.write(",".join(result_fieldnames) + "\n")
+        result_forecast_file.writelines(forecast_lines)
+
+    with open(result_actual_filename, mode='w') as result_actual_file:
+        result_actual_file.write(",".join(result_fieldnames) + "\n")
+        result_actual_file.writelines(lines)
+else:
+    with open(result_forecast_filename, mode='r+') as result_forecast_file:
+        result_forecast_file.seek(forecast_offset)
+        result_forecast_file.truncate()
+        result_forecast_file.writelines(forecast_lines)
+
+    with open(result_actual_filename, mode='a') as result_actual_file:
+        result_actual_file.writelines(lines)
+
+    print("Appended %d hours of actual data, and %d hours of forecasts." %
+          (len(lines), len(forecast_lines)))
+
+run_metrics.rows_add(len(lines))
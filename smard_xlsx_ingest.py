@@ -0,0 +1,340 @@
+#!/usr/bin/python
+
+#
+# Convert a SMARD XLSX download into the csv format the other scripts read:
+# ISO dates, 24 hour times, and numbers without thousands separators.
+#
+#   ./smard_xlsx_ingest.py Actual_consumption_201501010000_202301010000_Hour.xlsx \
+#       smard_consumption.csv --time=Time
+#
+# SMARD stores dates and times as text, US style ("1/1/2015", "12:00 AM"),
+# and the numbers as text with comma thousands separators ("1,234.25").
+# Numbers that are real numbers in the sheet, and dates that are Excel day
+# numbers, are understood as well. Hours without data stay '-', for
+# forecast_fixup.py or simulation_data_prepare.py to deal with.
+#
+# The first sheet is streamed row by row out of the zip file, and every row
+# is written as soon as it is parsed, so memory does not grow with the
+# number of rows. Only the shared strings table, which XLSX keeps apart
+# from the sheet, is held in memory.
+#
+# --time=<name> renames the time column, SMARD calls it Start, some of our
+# files call it Time. An End column, if there is one, is dropped.
+#
+
+import re
+import sys
+import csv
+import zipfile
+import datetime
+import xml.etree.ElementTree
+
+import run_metrics
+
+run_metrics.setup(sys.argv)
+
+time_fieldname = None
+
+arguments = []
+for argument in sys.argv:
+    if (argument.startswith("--time=")):
+        time_fieldname = argument[len("--time="):]
+    else:
+        arguments.append(argument)
+
+if (len(arguments) != 3):
+    print("Error: Wrong number of arguments.")
+    print("%s <smard xlsx> <output csv> [--time=<time column name>]" % (arguments[0]))
+    sys.exit()
+
+filename_input = arguments[1]
+filename_output = arguments[2]
+
+namespace = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+namespace_relationships = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+namespace_package = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+date_us = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})$")
+date_month = re.compile(r"([A-Za-z]{3})[a-z]* (\d{1,2}), (\d{4})$")
+date_iso = re.compile(r"(\d{4})-(\d{2})-(\d{2})$")
+time_clock = re.compile(r"(\d{1,2}):(\d{2})(?::\d{2})?(?: ?([AaPp])\.?[Mm]\.?)?$")
+number_text = re.compile(r"-?[\d,]*\.?\d*$")
+
+months = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+          'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+excel_epoch = datetime.datetime(1899, 12, 30)
+
+column_indices = {}
+
+#
+# Column index of a cell reference like "AB12".
+#
+def cell_column(reference):
+    letters = reference.rstrip("0123456789")
+    column = column_indices.get(letters)
+    if (column != None):
+        return column
+
+    column = 0
+    for character in letters:
+        column = column * 26 + (ord(character.upper()) - ord('A') + 1)
+    column_indices[letters] = column - 1
+    return column - 1
+
+#
+# The worksheet of the first sheet in the workbook.
+#
+def sheet_filename(workbook):
+    names = workbook.namelist()
+
+    try:
+        with workbook.open("xl/workbook.xml") as workbook_file:
+            sheet = xml.etree.ElementTree.parse(workbook_file).getroot().find(namespace + "sheets")[0]
+        relationship = sheet.get(namespace_relationships + "id")
+
+        with workbook.open("xl/_rels/workbook.xml.rels") as relationships_file:
+            for entry in xml.etree.ElementTree.parse(relationships_file).getroot():
+                if (entry.get("Id") == relationship):
+                    target = entry.get("Target").lstrip("/")
+                    if (not target.startswith("xl/")):
+                        target = "xl/" + target
+                    if (target in names):
+                        return target
+    except (KeyError, IndexError, TypeError):
+        pass
+
+    return "xl/worksheets/sheet1.xml"
+
+def shared_strings_read(workbook):
+    strings = []
+    if ("xl/sharedStrings.xml" not in workbook.namelist()):
+        return strings
+
+    with workbook.open("xl/sharedStrings.xml") as strings_file:
+        for event, element in xml.etree.ElementTree.iterparse(strings_file):
+            if (element.tag == namespace + "si"):
+                # rich text is split into runs, join all their texts.
+                strings.append("".join([text.text or "" for text in element.iter(namespace + "t")]))
+                element.clear()
+
+    return strings
+
+#
+# Parser target that turns the cells of a worksheet into rows of cell
+# texts, without building a tree. Numbers become floats.
+#
+class SheetRows:
+    def __init__(self, strings):
+        self.strings = strings
+        self.rows = []
+        self.row = []
+        self.column = 0
+        self.cell_type = None
+        self.texts = []
+        self.text = False
+
+    def start(self, tag, attributes):
+        if (tag == namespace + "c"):
+            self.column = cell_column(attributes.get("r", ""))
+            if (self.column < 0):
+                self.column = len(self.row)
+            self.cell_type = attributes.get("t")
+            self.texts = []
+        elif ((tag == namespace + "v") or (tag == namespace + "t")):
+            self.text = True
+        elif (tag == namespace + "row"):
+            self.row = []
+
+    def data(self, text):
+        if (self.text):
+            self.texts.append(text)
+
+    def end(self, tag):
+        if ((tag == namespace + "v") or (tag == namespace + "t")):
+            self.text = False
+        elif (tag == namespace + "c"):
+            value = "".join(self.texts)
+            if (self.cell_type == "s"):
+                value = self.strings[int(value)]
+            elif ((self.cell_type in [None, "n"]) and value):
+                value = float(value)
+
+            while (len(self.row) < self.column):
+                self.row.append("")
+            self.row.append(value)
+        elif (tag == namespace + "row"):
+            self.rows.append(self.row)
+
+    def close(self):
+        pass
+
+#
+# Stream the rows of a worksheet, feeding the parser a block at a time.
+#
+def sheet_rows(workbook, filename, strings):
+    target = SheetRows(strings)
+    parser = xml.etree.ElementTree.XMLParser(target=target)
+
+    with workbook.open(filename) as sheet_file:
+        while True:
+            block = sheet_file.read(1 << 20)
+            if (not block):
+                break
+            parser.feed(block)
+
+            rows = target.rows
+            target.rows = []
+            yield from rows
+
+    parser.close()
+    yield from target.rows
+
+date_cache = {}
+time_cache = {}
+
+#
+# ISO date of a SMARD date cell, which can also carry a time.
+#
+def date_parse(value):
+    if (isinstance(value, float)):
+        return (excel_epoch + datetime.timedelta(days=value)).strftime("%Y-%m-%d")
+
+    date = date_cache.get(value)
+    if (date != None):
+        return date
+
+    text = value.strip().lstrip("'").split(" ")
+    if ((len(text) > 1) and time_clock.match(" ".join(text[-2:]))):
+        text = text[:-2]
+    elif ((len(text) > 1) and time_clock.match(text[-1])):
+        text = text[:-1]
+    text = " ".join(text)
+
+    match = date_us.match(text)
+    if (match):
+        date = "%s-%02d-%02d" % (match.group(3), int(match.group(1)), int(match.group(2)))
+    else:
+        match = date_month.match(text)
+        if (match):
+            date = "%s-%02d-%02d" % (match.group(3), months[match.group(1).lower()], int(match.group(2)))
+        else:
+            match = date_iso.match(text)
+            if (not match):
+                raise ValueError("unknown date format: %s" % value)
+            date = text
+
+    date_cache[value] = date
+    return date
+
+#
+# 24 hour HH:MM of a SMARD time cell, or of the time in a date cell.
+#
+def time_parse(value):
+    if (isinstance(value, float)):
+        minutes = round((value % 1.0) * 24 * 60)
+        return "%02d:%02d" % (minutes // 60 % 24, minutes % 60)
+
+    time = time_cache.get(value)
+    if (time != None):
+        return time
+
+    text = value.strip().lstrip("'").split(" ")
+    match = time_clock.match(" ".join(text[-2:]))
+    if (not match):
+        match = time_clock.match(text[-1])
+    if (not match):
+        raise ValueError("unknown time format: %s" % value)
+
+    hour = int(match.group(1))
+    if (match.group(3) != None):
+        # 12:00 AM is midnight, 12:00 PM is noon.
+        hour = hour % 12
+        if (match.group(3).lower() == "p"):
+            hour += 12
+
+    time = "%02d:%s" % (hour, match.group(2))
+    time_cache[value] = time
+    return time
+
+def number_parse(value):
+    if (isinstance(value, float)):
+        return "%.2f" % value
+
+    text = value.strip().lstrip("'")
+    if ((text in ["-", ""]) or (not number_text.match(text))):
+        return "-"
+    return text.replace(",", "")
+
+#
+# Column names without the resolution SMARD appends to them.
+#
+def fieldname_clean(name):
+    name = " ".join(str(name).split())
+    for suffix in [" Original resolutions", " Calculated resolutions"]:
+        if (name.endswith(suffix)):
+            name = name[:-len(suffix)]
+    return name
+
+print("Reading SMARD data from %s" % filename_input)
+print("Writing csv data to %s" % filename_output)
+
+run_metrics.stage("parse")
+workbook = zipfile.ZipFile(filename_input)
+strings = shared_strings_read(workbook)
+rows = sheet_rows(workbook, sheet_filename(workbook), strings)
+
+# skip the title rows, up to the header with the date.
+header = None
+for row in rows:
+    names = [fieldname_clean(value) for value in row]
+    if (("Date" in names) or ("Start date" in names)):
+        header = names
+        break
+
+if (header == None):
+    print("Error: No header row with a Date column in %s." % (filename_input))
+    sys.exit()
+
+if ("Date" in header):
+    date_column = header.index("Date")
+else:
+    date_column = header.index("Start date")
+
+time_column = None
+for name in ["Start", "Time", "Time of day"]:
+    if (name in header):
+        time_column = header.index(name)
+        break
+
+skipped = [date_column, time_column]
+if ("End" in header):
+    skipped.append(header.index("End"))
+if ("End date" in header):
+    skipped.append(header.index("End date"))
+value_columns = [column for column in range(len(header)) if ((column not in skipped) and header[column])]
+
+if (time_fieldname == None):
+    if (time_column != None):
+        time_fieldname = header[time_column]
+    else:
+        time_fieldname = "Start"
+
+run_metrics.stage("dispatch")
+with open(filename_output, mode='w') as output_file:
+    output_writer = csv.writer(output_file, lineterminator='\n')
+    output_writer.writerow(["Date", time_fieldname] + [header[column] for column in value_columns])
+
+    for row in rows:
+        if ((len(row) <= date_column) or (row[date_column] == "")):
+            continue
+        row += [""] * (len(header) - len(row))
+
+        date = date_parse(row[date_column])
+        if (time_column != None):
+            time = time_parse(row[time_column])
+        else:
+            time = time_parse(row[date_column])
+
+        output_writer.writerow([date, time] + [number_parse(row[column]) for column in value_columns])
+        run_metrics.rows_add(1)
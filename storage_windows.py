@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+#
+# Storage needed to flatten the hourly load within windows, as used by
+# consumption_cycles.py and intraday_storage.py.
+#
+# Windows are given as start rows and lengths, and are calculated together,
+# in blocks of about a million values, with a window per row of a 2d array.
+# The hours past the end of a shorter window are masked out.
+#
+# window_storage() is the area above the average of the window, the load
+# that has to be shifted. That is more than a store has to hold, as hours
+# above the average that follow hours below it are served from what was
+# stored in those.
+#
+# window_storage_exact() is what a store has to hold: generation is flat
+# over the window, and the store takes up the difference to the load. The
+# energy it needs is the range of the cumulative difference, its power the
+# largest hourly difference. With a round trip efficiency below 1, the
+# generation is raised just enough to cover the losses of the window.
+#
+
+import numpy
+
+#
+# The load of the windows, block by block, as the rows of the block, the
+# mask of the hours past the end of each window, and the rows of the
+# windows in the block.
+#
+def window_blocks(load, starts, lengths):
+    offsets = numpy.arange(lengths.max())
+    block = max(1, (1 << 20) // len(offsets))
+
+    for first in range(0, len(starts), block):
+        rows = slice(first, first + block)
+        indices = numpy.minimum(starts[rows, None] + offsets, len(load) - 1)
+        yield rows, load[indices], (offsets >= lengths[rows, None])
+
+#
+# Total, average and area above the average of the load in the windows
+# that start at the rows in starts and are lengths rows long.
+#
+def window_storage(load, starts, lengths):
+    cumulative = numpy.concatenate([[0.0], numpy.cumsum(load)])
+    totals = cumulative[starts + lengths] - cumulative[starts]
+    averages = totals / lengths
+    storages = numpy.empty(len(starts))
+
+    for rows, values, past in window_blocks(load, starts, lengths):
+        above = values - averages[rows, None]
+        # Compared to average, only one side is needed
+        above[(above < 0) | past] = 0.0
+        storages[rows] = above.sum(axis=1)
+
+    return totals, averages, storages
+
+#
+# Flat generation that covers the load of each window of a block, when
+# what is stored in between comes back at the given round trip efficiency:
+# where efficiency * (generation above the load) == (load above generation).
+#
+# Both sides are linear in the generation between two sorted load values,
+# so the prefix sums of the sorted load give the generation exactly, once
+# the pair of values it falls between is known.
+#
+def window_generation(values, past, lengths, totals, efficiency):
+    ordered = numpy.sort(numpy.where(past, numpy.inf, values), axis=1)
+    ordered[past] = 0.0
+    below = numpy.cumsum(ordered, axis=1) - ordered
+    counts = numpy.arange(values.shape[1])
+
+    # surplus at each sorted load value, it grows with the value.
+    surplus = (efficiency * (counts * ordered - below) -
+               ((totals[:, None] - below) - (lengths[:, None] - counts) * ordered))
+    count = numpy.sum((surplus < 0) & ~past, axis=1)
+
+    below = numpy.take_along_axis(below, numpy.minimum(count, values.shape[1] - 1)[:, None], axis=1)[:, 0]
+    return ((efficiency * below + totals - below) /
+            (efficiency * count + lengths - count))
+
+#
+# Total, average, storage energy and storage power needed to flatten the
+# load in the windows that start at the rows in starts and are lengths
+# rows long, with a store of the given round trip efficiency.
+#
+def window_storage_exact(load, starts, lengths, efficiency=1.0):
+    cumulative = numpy.concatenate([[0.0], numpy.cumsum(load)])
+    totals = cumulative[starts + lengths] - cumulative[starts]
+    averages = totals / lengths
+    energies = numpy.empty(len(starts))
+    powers = numpy.empty(len(starts))
+
+    for rows, values, past in window_blocks(load, starts, lengths):
+        if (efficiency < 1.0):
+            generation = window_generation(values, past, lengths[rows], totals[rows], efficiency)
+        else:
+            generation = averages[rows]
+
+        surplus = generation[:, None] - values
+        surplus[past] = 0.0
+        stored = numpy.cumsum(numpy.where(surplus > 0, efficiency * surplus, surplus), axis=1)
+
+        # the store starts the window at 0, and must hold the whole range.
+        energies[rows] = (numpy.maximum(stored.max(axis=1), 0.0) -
+                          numpy.minimum(stored.min(axis=1), 0.0))
+        powers[rows] = numpy.abs(surplus).max(axis=1)
+
+    return totals, averages, energies, powers